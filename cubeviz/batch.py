@@ -0,0 +1,245 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Headless batch processing of data cubes: ``cubeviz-batch`` loads each cube
+with the cubeviz data configurations and writes collapsed, moment and
+smoothed products to FITS files, using the same code as the cubeviz tools.
+The cubes are processed in a pool of processes and a JSON summary of the
+timings and failures is written at the end.
+
+Example::
+
+    cubeviz-batch --collapse Median:100:200 --moment 0 --moment 1 \\
+        --smooth gaussian:spatial:2 --output-dir products/ --workers 16 cubes/*.fits
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+__all__ = ['main', 'process_file']
+
+logger = logging.getLogger('cubeviz_batch')
+
+# Set in each worker process by _init_worker
+_data_configs = None
+
+
+def _init_worker(data_configs, lazy):
+    """
+    Register the data configurations with glue in a worker process.
+    """
+    global _data_configs
+
+    # Nothing is ever shown, but the cubeviz modules import Qt
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    from .data_factories import DataFactoryConfiguration
+    _data_configs = DataFactoryConfiguration(data_configs, remove_defaults=True, lazy=lazy)
+
+
+def _parse_collapse(text):
+    """
+    OPERATION[:START:END] -> (operation, start, end)
+    """
+    from .tools.collapse_cube import operations
+
+    parts = text.split(':')
+    if parts[0] not in operations:
+        raise argparse.ArgumentTypeError('Unknown collapse operation "{}", use one of: {}'.format(
+            parts[0], ', '.join(operations)))
+    if len(parts) == 1:
+        return parts[0], None, None
+    if len(parts) == 3:
+        return (parts[0], int(parts[1]) if parts[1] else None, int(parts[2]) if parts[2] else None)
+    raise argparse.ArgumentTypeError('Expected OPERATION or OPERATION:START:END, got "{}"'.format(text))
+
+
+def _parse_smooth(text):
+    """
+    KERNEL:AXIS:SIZE -> (kernel_type, axis, size)
+    """
+    from .tools.smoothing import SmoothCube
+
+    try:
+        kernel_type, axis, size = text.split(':')
+        size = float(size)
+    except ValueError:
+        raise argparse.ArgumentTypeError('Expected KERNEL:AXIS:SIZE, got "{}"'.format(text))
+
+    registry = SmoothCube.load_kernel_registry()
+    if kernel_type not in registry or axis not in registry[kernel_type]['axis']:
+        raise argparse.ArgumentTypeError('Unknown kernel "{}" for the {} axis'.format(kernel_type, axis))
+
+    return kernel_type, axis, int(size) if size.is_integer() else size
+
+
+def _write(filename, array, header):
+    from astropy.io import fits
+    import numpy as np
+
+    fits.writeto(filename, np.asarray(array), header, overwrite=True)
+
+
+def process_file(filename, component=None, collapse=(), moments=(), smooth=(), output_dir='.'):
+    """
+    Load one cube and write its products. Runs in a worker process.
+
+    :param filename: str: The data file (or comma-separated files)
+    :param component: str: Label of the component to process, defaults to the first one
+    :param collapse: list of (operation, start, end)
+    :param moments: list of int: Orders of the moment maps
+    :param smooth: list of (kernel_type, axis, size)
+    :param output_dir: str: Directory the products are written to
+    :return: dict: Summary of the file, see main
+    """
+    from glue.core.data_factories import find_factory
+
+    from .tools.collapse_cube import collapse_cube
+    from .tools.moment_maps import moment_map
+    from .tools.smoothing import SmoothCube
+
+    summary = {'filename': filename, 'status': 'ok', 'products': []}
+    start_time = time.time()
+
+    try:
+        factory = find_factory(filename)
+        if factory is None:
+            raise IOError('No cubeviz data configuration matches {}'.format(filename))
+        data = factory(filename)
+    except Exception as e:
+        summary.update(status='failed', error=repr(e), traceback=traceback.format_exc(),
+                       time=time.time() - start_time)
+        return summary
+
+    summary['load_time'] = time.time() - start_time
+
+    if component is None:
+        component = data.main_components[0].label
+    summary['component'] = component
+
+    wcs = data.coords.wcs
+    base = os.path.splitext(os.path.basename(filename.split(',')[0]))[0]
+    if base.endswith('.fits'):
+        base = base[:-len('.fits')]
+
+    def product(name, function):
+        product_start = time.time()
+        output = os.path.join(output_dir, '{}_{}.fits'.format(base, name))
+        entry = {'product': name, 'filename': output}
+        try:
+            function(output)
+        except Exception as e:
+            entry.update(status='failed', error=repr(e), traceback=traceback.format_exc())
+            summary['status'] = 'failed'
+        else:
+            entry['status'] = 'ok'
+        entry['time'] = time.time() - product_start
+        summary['products'].append(entry)
+
+    for operation, start, end in collapse:
+        def write_collapse(output, operation=operation, start=start, end=end):
+            _, calculated = collapse_cube(data[component], data.label, wcs, operation, start, end)
+            _write(output, calculated, wcs.celestial.to_header())
+
+        name = 'collapse-{}'.format(operation.replace(' ', '').replace('(', '-').replace(')', ''))
+        if start is not None or end is not None:
+            name += '-{}-{}'.format('' if start is None else start, '' if end is None else end)
+        product(name, write_collapse)
+
+    for order in moments:
+        def write_moment(output, order=order):
+            _write(output, moment_map(data[component], wcs, order), wcs.celestial.to_header())
+
+        product('moment-{}'.format(order), write_moment)
+
+    for kernel_type, axis, size in smooth:
+        def write_smoothed(output, kernel_type=kernel_type, axis=axis, size=size):
+            smoothed = SmoothCube(data=data, smoothing_axis=axis, kernel_type=kernel_type,
+                                  kernel_size=size, component_id=component).smooth_cube()
+            _write(output, smoothed[component], wcs.to_header())
+
+        product('smooth-{}-{}-{}'.format(kernel_type, axis, size), write_smoothed)
+
+    summary['time'] = time.time() - start_time
+    return summary
+
+
+def main(argv=sys.argv):
+    """
+    Entry point of cubeviz-batch.
+
+    :param argv:
+    :return: int: 0 if all files were processed, 1 if any failed
+    """
+    # Nothing is ever shown, but the cubeviz modules import Qt
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    parser = argparse.ArgumentParser(prog='cubeviz-batch', description=__doc__.split('\n\n')[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-configs", help="Directory or file for data configuration YAML files",
+                        action='append', default=[])
+    parser.add_argument("--component", help="Component to process, defaults to the first one of each cube",
+                        default=None)
+    parser.add_argument("--collapse", help="Collapse the cube with OPERATION (e.g. Median), optionally only "
+                        "the slices START:END", metavar='OPERATION[:START:END]', type=_parse_collapse,
+                        action='append', default=[])
+    parser.add_argument("--moment", help="Moment map of ORDER", metavar='ORDER', type=int,
+                        action='append', default=[])
+    parser.add_argument("--smooth", help="Smooth with KERNEL (e.g. gaussian) along AXIS (spatial or spectral)",
+                        metavar='KERNEL:AXIS:SIZE', type=_parse_smooth, action='append', default=[])
+    parser.add_argument("--output-dir", help="Directory to write the products to", default='.')
+    parser.add_argument("--workers", help="Number of processes, defaults to the number of CPUs",
+                        type=int, default=None)
+    parser.add_argument("--lazy-load", help="Memory-map the cubes", action="store_true", default=False)
+    parser.add_argument("--summary", help="JSON file to write the summary to, defaults to the output directory",
+                        default=None)
+    parser.add_argument('data_files', nargs='+')
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    summary_filename = args.summary or os.path.join(args.output_dir, 'cubeviz-batch-summary.json')
+
+    start_time = time.time()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.data_configs, args.lazy_load)) as executor:
+        futures = {executor.submit(process_file, filename, args.component, args.collapse,
+                                   args.moment, args.smooth, args.output_dir): filename
+                   for filename in args.data_files}
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself failed
+                result = {'filename': futures[future], 'status': 'failed', 'error': repr(e), 'products': []}
+            results.append(result)
+            logger.info('[{}/{}] {} {}'.format(len(results), len(futures), result['status'], result['filename']))
+
+    results.sort(key=lambda result: args.data_files.index(result['filename']))
+    failed = [result['filename'] for result in results if result['status'] != 'ok']
+
+    summary = {
+        'files': len(results),
+        'failed': failed,
+        'time': time.time() - start_time,
+        'results': results
+    }
+    with open(summary_filename, 'w') as fp:
+        json.dump(summary, fp, indent=2)
+
+    logger.info('Processed {} files in {:.1f}s, {} failed. Summary written to {}'.format(
+        len(results), summary['time'], len(failed), summary_filename))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,27 @@
+import math
+import time
+
 import numpy as np
+from qtpy.QtCore import QTimer
 from specviz.third_party.glue.data_viewer import dispatch as specviz_dispatch
 
+from ..image_viewer import CubevizImageLayerArtist
+
 RED_BACKGROUND = "background-color: rgba(255, 0, 0, 128);"
 
+# Maximum rate at which the viewers are redrawn while the slider is dragged
+RENDER_FPS = 30
+
+# Maximum rate at which specviz's position marker follows the slider while
+# it is dragged
+SPECVIZ_POSITION_FPS = 10
+
+# Default frame rate of the playback
+DEFAULT_PLAYBACK_FPS = 15
+
+# During playback the slices shown in this many seconds are read ahead
+PLAYBACK_PREFETCH_SECONDS = 1
+
 
 class SliceController:
 
@@ -25,6 +44,27 @@ class SliceController:
         self._slice_slider.sliderReleased.connect(self._on_slider_released)
         self._slider_flag = False
 
+        # While the slider is dragged, slider events only record the latest
+        # index and the viewers are redrawn by this timer at up to RENDER_FPS
+        self._pending_index = None
+        self._last_render_time = 0
+        self._last_position_time = 0
+        self._render_timer = QTimer()
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._render_pending_index)
+
+        # Playback: the timer ticks at the target frame rate and each tick
+        # draws the slice that is due at that time, so slow frames are
+        # dropped instead of the animation lagging behind
+        self._playback_timer = QTimer()
+        self._playback_timer.timeout.connect(self._on_playback_tick)
+        self._playback_range = None
+        self._playback_fps = DEFAULT_PLAYBACK_FPS
+        self._playback_loop = True
+        self._playback_offset = 0
+        self._playback_start_time = 0
+        self._playback_frame = None
+
         self._slice_textbox.returnPressed.connect(self._on_text_slice_change)
         self._wavelength_textbox.returnPressed.connect(self._on_text_wavelength_change)
 
@@ -102,14 +142,133 @@ class SliceController:
         self._slice_slider.setValue(new_index)
         specviz_dispatch.changed_dispersion_position.emit(pos=new_index)
 
-    def _on_slider_change(self, event):
-        """
-        Callback for change in slider value.
+    @property
+    def is_playing(self):
+        return self._playback_timer.isActive()
 
-        :param event:
+    def play(self, start=None, stop=None, fps=DEFAULT_PLAYBACK_FPS, loop=True):
+        """
+        Animate the viewers through a range of slices. The playback starts at
+        the current slice if it is in the range, and stops when the slider,
+        text boxes or specviz change the slice.
+
+        :param start: int: First slice, defaults to the first slice of the cube
+        :param stop: int: Slice after the last one, defaults to the number of slices
+        :param fps: float: Target number of frames per second
+        :param loop: bool: Start again from the first slice at the end of the range
         :return:
         """
+        if self._wavelengths is None or not self._slice_slider.isEnabled():
+            return
+
+        self.stop_playback(redraw=False)
+
+        start = 0 if start is None else max(0, start)
+        stop = len(self._wavelengths) if stop is None else min(stop, len(self._wavelengths))
+        if start >= stop:
+            return
+
         index = self._slice_slider.value()
+        self._playback_range = (start, stop)
+        self._playback_offset = index - start if start <= index < stop - 1 else 0
+        self._playback_fps = fps
+        self._playback_loop = loop
+        self._playback_frame = None
+        self._playback_start_time = time.perf_counter()
+
+        self._set_prefetch_slices(int(math.ceil(fps * PLAYBACK_PREFETCH_SECONDS)))
+        self._playback_timer.start(max(1, int(1000 / fps)))
+
+    def stop_playback(self, redraw=True):
+        """
+        Stop the playback.
+
+        :param redraw: bool: Do the full redraw of the slice that is shown,
+                       the playback only blits the images
+        :return:
+        """
+        if not self.is_playing:
+            return
+
+        self._playback_timer.stop()
+        self._set_prefetch_slices(None)
+
+        if redraw:
+            index = self._slice_slider.value()
+            self._draw_slice(index, fast=False)
+            specviz_dispatch.changed_dispersion_position.emit(pos=index)
+
+    def toggle_playback(self):
+        if self.is_playing:
+            self.stop_playback()
+        else:
+            self.play()
+
+    def _set_prefetch_slices(self, n_slices):
+        """
+        Change the number of slices the image layers read ahead.
+
+        :param n_slices: int: Number of slices, None to restore the layer setting
+        """
+        for view in self._cv_layout.cube_views:
+            for layer in view._widget.layers:
+                if not isinstance(layer, CubevizImageLayerArtist) or layer.state.prefetch_slices == 0:
+                    continue
+                default = layer.state.prefetch_slices
+                layer.state.slice_cache.prefetch_slices = default if n_slices is None else max(default, n_slices)
+
+    def _on_playback_tick(self):
+        """
+        Callback of the playback timer: blit the slice that is due now.
+        """
+        start, stop = self._playback_range
+        n_frames = stop - start
+
+        elapsed = time.perf_counter() - self._playback_start_time
+        frame = self._playback_offset + int(elapsed * self._playback_fps)
+        if frame >= n_frames:
+            if not self._playback_loop:
+                self._show_playback_index(stop - 1)
+                self.stop_playback()
+                return
+            frame %= n_frames
+
+        # Nothing new is due yet
+        if frame == self._playback_frame:
+            return
+        self._playback_frame = frame
+
+        index = start + frame
+        self._show_playback_index(index)
+        self._last_render_time = time.perf_counter()
+        self._draw_slice(index, fast=True)
+        self._emit_position(index)
+
+    def _show_playback_index(self, index):
+        # Move the slider without its callback, which would stop the playback
+        self._slice_slider.blockSignals(True)
+        self._slice_slider.setValue(index)
+        self._slice_slider.blockSignals(False)
+        self._update_slice_textboxes(index)
+
+    def _emit_position(self, index):
+        """
+        Move specviz's position marker if it has not been moved for
+        1 / SPECVIZ_POSITION_FPS seconds.
+        """
+        if self._last_render_time - self._last_position_time >= 1.0 / SPECVIZ_POSITION_FPS:
+            self._last_position_time = self._last_render_time
+            specviz_dispatch.changed_dispersion_position.emit(pos=index)
+
+    def _draw_slice(self, index, fast):
+        """
+        Show a slice in the active viewer, or in all synced viewers if the
+        active viewer is synced.
+
+        :param index: int: Slice index
+        :param fast: bool: Only blit the images (fast_draw_slice_at_index)
+                     instead of a full redraw (update_slice_index)
+        """
         cube_views = self._cv_layout.cube_views
         active_cube = self._cv_layout._active_cube
         active_widget = active_cube._widget
@@ -119,32 +278,79 @@ class SliceController:
         #       cause a crash
 
         # If the active widget is synced then we need to update the image
-        # in all the other synced views.
+        # in all the other synced views. Viewers showing the same component
+        # share the extracted slice.
         if active_widget.synced and not self._cv_layout._single_viewer_mode:
-            for view in cube_views:
-                if view._widget.synced:
-                    if self._slider_flag:
+            with self._cv_layout.slice_service.sync_update():
+                for view in cube_views:
+                    if not view._widget.synced:
+                        continue
+                    if fast:
                         view._widget.fast_draw_slice_at_index(index)
                     else:
                         view._widget.update_slice_index(index)
             self._cv_layout.synced_index = index
         else:
             # Update the image displayed in the slice in the active view
-            if self._slider_flag:
+            if fast:
                 active_widget.fast_draw_slice_at_index(index)
             else:
                 active_widget.update_slice_index(index)
 
+    def _on_slider_change(self, event):
+        """
+        Callback for change in slider value.
+
+        While the slider is dragged the redraw is scheduled rather than done
+        here, so the slider stays responsive however many viewers are synced:
+        only the latest index is drawn, at most RENDER_FPS times a second.
+
+        :param event:
+        :return:
+        """
+        index = self._slice_slider.value()
+
+        # Any other change of the slice ends the playback
+        self.stop_playback(redraw=False)
+
         # Now update the slice and wavelength text boxes
         self._update_slice_textboxes(index)
 
+        if self._slider_flag:
+            self._pending_index = index
+            if not self._render_timer.isActive():
+                elapsed = time.perf_counter() - self._last_render_time
+                delay = max(0.0, 1.0 / RENDER_FPS - elapsed)
+                self._render_timer.start(int(delay * 1000))
+            return
+
+        self._draw_slice(index, fast=False)
+
         specviz_dispatch.changed_dispersion_position.emit(pos=index)
 
+    def _render_pending_index(self):
+        """
+        Callback of the render timer: blit the latest slider index in the
+        viewers, and move specviz's position marker if it has not been moved
+        for 1 / SPECVIZ_POSITION_FPS seconds.
+        """
+        index = self._pending_index
+        self._pending_index = None
+        if index is None:
+            return
+
+        self._last_render_time = time.perf_counter()
+        self._draw_slice(index, fast=True)
+        self._emit_position(index)
+
     def _on_slider_pressed(self):
         """
         Callback for slider pressed.
         activates fast_draw_slice_at_index flags
         """
+        # The slider is taken over from the playback
+        self.stop_playback(redraw=False)
+
         # This flag will activate fast_draw_slice_at_index
         # Which will redraw sliced images quickly
         self._slider_flag = True
@@ -162,21 +368,12 @@ class SliceController:
         # This flag will deactivate fast_draw_slice_at_index
         self._slider_flag = False
 
-        index = self._slice_slider.value()
-        cube_views = self._cv_layout.cube_views
-        active_cube = self._cv_layout._active_cube
-        active_widget = active_cube._widget
+        # Drop any scheduled blit, the full redraw replaces it
+        self._render_timer.stop()
+        self._pending_index = None
 
-        # If the active widget is synced then we need to update the image
-        # in all the other synced views.
-        if active_widget.synced and not self._cv_layout._single_viewer_mode:
-            for view in cube_views:
-                if view._widget.synced:
-                    view._widget.update_slice_index(index)
-            self._cv_layout.synced_index = index
-        else:
-            # Update the image displayed in the slice in the active view
-            active_widget.update_slice_index(index)
+        index = self._slice_slider.value()
+        self._draw_slice(index, fast=False)
 
         # Now update the slice and wavelength text boxes
         self._update_slice_textboxes(index)
@@ -322,3 +322,62 @@ def test_multiple_unsynced_viewers(qtbot, cubeviz_layout):
     left_click(qtbot, checkbox2)
     assert_slice_text(cubeviz_layout, str(synced_index))
     assert_all_viewer_indices(cubeviz_layout, synced_index)
+
+def test_slider_drag_coalesces_redraws(qtbot, cubeviz_layout):
+    controller = cubeviz_layout._slice_controller
+
+    drawn = []
+    widget = cubeviz_layout._active_cube._widget
+    fast_draw = widget.fast_draw_slice_at_index
+    widget.fast_draw_slice_at_index = lambda index: (drawn.append(index), fast_draw(index))
+
+    try:
+        controller._on_slider_pressed()
+        for index in range(100, 150):
+            set_slider_index(cubeviz_layout, index)
+
+        # The slider events are only recorded, the latest one is drawn later
+        assert_slice_text(cubeviz_layout, 149)
+        qtbot.waitUntil(lambda: 149 in drawn)
+        assert len(drawn) < 50
+
+        controller._on_slider_released()
+    finally:
+        del widget.fast_draw_slice_at_index
+
+    # The release does the final full redraw
+    assert_all_viewer_indices(cubeviz_layout, 149)
+
+def test_playback_drops_frames(qtbot, cubeviz_layout):
+    controller = cubeviz_layout._slice_controller
+    set_slider_index(cubeviz_layout, 100)
+
+    drawn = []
+    widget = cubeviz_layout._active_cube._widget
+    fast_draw = widget.fast_draw_slice_at_index
+    widget.fast_draw_slice_at_index = lambda index: (drawn.append(index), fast_draw(index))
+
+    try:
+        # Far faster than the viewers can draw, so most frames are dropped
+        controller.play(start=100, stop=400, fps=1000, loop=False)
+        assert controller.is_playing
+        qtbot.waitUntil(lambda: not controller.is_playing, timeout=10000)
+    finally:
+        del widget.fast_draw_slice_at_index
+
+    assert 0 < len(drawn) < 300
+    assert drawn == sorted(drawn)
+
+    # The playback ends with a full redraw of the last slice
+    assert_all_viewer_indices(cubeviz_layout, 399)
+    assert_slice_text(cubeviz_layout, 399)
+
+def test_slider_stops_playback(qtbot, cubeviz_layout):
+    controller = cubeviz_layout._slice_controller
+
+    controller.play(fps=5)
+    assert controller.is_playing
+
+    set_slider_index(cubeviz_layout, 42)
+    assert not controller.is_playing
+    assert_all_viewer_indices(cubeviz_layout, 42)
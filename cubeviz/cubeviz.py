@@ -4,18 +4,7 @@ import os
 import argparse
 import os
 
-from glue.app.qt import GlueApplication
-from glue.main import restore_session, get_splash, load_data_files, load_plugins
-from qtpy.QtCore import QTimer
-from qtpy import QtGui, QtWidgets
-
-try:
-    from glue.utils.qt.decorators import die_on_error
-except ImportError:
-    from glue.utils.decorators import die_on_error
-
 from .version import version as cubeviz_version
-from .data_factories import DataFactoryConfiguration
 
 CUBEVIZ_ICON_PATH = os.path.abspath(
     os.path.join(
@@ -41,9 +30,100 @@ def setup():
 
     from . import layout  # noqa
     from . import startup  # noqa
+    register_keyboard_shortcuts()
+
+
+def register_keyboard_shortcuts():
+    """
+    Register the cubeviz keyboard shortcuts with glue. They are not registered
+    when the package is imported, as that imports glue, Qt and pyplot before
+    main can start timing the imports (see --profile-startup).
+    """
+    from . import keyboard_shortcuts  # noqa
+
+
+def parse_cutout(spectral_range, wavelength_range, spatial_bbox):
+    """
+    Build the cutout to load from the command line arguments.
+
+    :param spectral_range: str: START:STOP or None
+    :param wavelength_range: str: MIN:MAX or None
+    :param spatial_bbox: str: XMIN:XMAX,YMIN:YMAX or None
+    :return: Cutout or None if no cutout was asked for
+    """
+    from .data_factories.cutout import Cutout, parse_range
+
+    if spectral_range is None and wavelength_range is None and spatial_bbox is None:
+        return None
+
+    if spectral_range is not None:
+        spectral_range = parse_range(spectral_range, int)
+
+    if wavelength_range is not None:
+        wavelength_range = parse_range(wavelength_range, float)
+
+    if spatial_bbox is not None:
+        try:
+            x_range, y_range = spatial_bbox.split(',')
+        except ValueError:
+            raise ValueError('Expected the bounding box as XMIN:XMAX,YMIN:YMAX, got "{}"'.format(spatial_bbox))
+        spatial_bbox = parse_range(x_range, int) + parse_range(y_range, int)
+
+    return Cutout(spectral_range, wavelength_range, spatial_bbox)
+
+
+def start_data_loader(ga, data_collection, datafiles, lazy=False):
+    """
+    Load the data files in a DataLoaderThread. Each data set is added to the
+    data collection as soon as its metadata has been read, and unless lazy is
+    set its components are swapped for in-memory copies as they are read. A
+    progress dialog allows the reading to be cancelled.
+
+    :param ga: GlueApplication
+    :param data_collection: The DataCollection to add the data to
+    :param datafiles: list of str: The data files
+    :param lazy: bool: Keep the components memory-mapped (--lazy-load)
+    :return: DataLoaderThread
+    """
+    from qtpy.QtCore import Qt
+    from qtpy import QtWidgets
+
+    from .loader import DataLoaderThread
+
+    progress = QtWidgets.QProgressDialog("Loading data...", "Cancel", 0, 0, ga)
+    progress.setWindowTitle("Cubeviz")
+    progress.setWindowModality(Qt.NonModal)
+    progress.setMinimumDuration(500)
+
+    loader = DataLoaderThread(datafiles, lazy=lazy, parent=ga)
+
+    def add_data(data):
+        ga.add_datasets(data_collection, [data], auto_merge=False)
+
+    def update_component(data, cid, array):
+        data.update_components({cid: array})
+
+    def update_progress(message, value, maximum):
+        progress.setLabelText(message)
+        progress.setMaximum(maximum)
+        progress.setValue(value)
+
+    def show_error(exception):
+        progress.close()
+        QtWidgets.QMessageBox.critical(ga, "Error loading data", str(exception))
+
+    loader.data_signal.connect(add_data)
+    loader.component_signal.connect(update_component)
+    loader.progress_signal.connect(update_progress)
+    loader.error_signal.connect(show_error)
+    loader.finished.connect(progress.close)
+    progress.canceled.connect(loader.abort)
+
+    loader.start()
+
+    return loader
 
 
-@die_on_error("Error starting up Cubeviz")
 def main(argv=sys.argv):
     """
     The majority of the code in this function was taken from start_glue() in main.py after a discussion with
@@ -58,12 +138,54 @@ def main(argv=sys.argv):
     parser = argparse.ArgumentParser()
     parser.add_argument("--data-configs", help="Directory or file for data configuration YAML files", action='append', default=[])
     parser.add_argument("--data-configs-show", help="Show the matching info", action="store_true", default=False)
+    parser.add_argument("--lazy-load", help="Memory-map data cubes and only read slices when they are displayed",
+                        action="store_true", default=False)
+    parser.add_argument("--cache-dir", help="Directory to cache decoded data cubes in, so they load faster next time",
+                        default=None)
+    parser.add_argument("--spectral-range", help="Only load the spectral slices START:STOP (indices)", default=None)
+    parser.add_argument("--wavelength-range", help="Only load the spectral slices with wavelengths MIN:MAX, "
+                        "in the spectral units of the cube", default=None)
+    parser.add_argument("--spatial-bbox", help="Only load the spaxels in the pixel bounding box XMIN:XMAX,YMIN:YMAX",
+                        default=None)
+    parser.add_argument("--profile-startup", help="Print how long each module took to import once the window is shown",
+                        action="store_true", default=False)
     parser.add_argument('data_files', nargs=argparse.REMAINDER)
     args = parser.parse_known_args(argv[1:])
 
+    # Start timing imports before anything heavy is imported
+    import_profiler = None
+    if args[0].profile_startup:
+        from .utils.import_profiler import ImportProfiler
+        import_profiler = ImportProfiler().install()
+
+    try:
+        from glue.utils.qt.decorators import die_on_error
+    except ImportError:
+        from glue.utils.decorators import die_on_error
+
+    die_on_error("Error starting up Cubeviz")(start_cubeviz)(args, import_profiler)
+
+
+def start_cubeviz(args, import_profiler=None):
+    """
+    Start the application with the parsed command line arguments.
+
+    :param args: (namespace, unknown arguments) from the argument parser of main
+    :param import_profiler: ImportProfiler timing the imports, or None
+    """
+    from glue.app.qt import GlueApplication
+    from glue.main import get_splash, load_plugins
+    from qtpy.QtCore import QTimer
+    from qtpy import QtGui, QtWidgets
+
+    from .data_factories import DataFactoryConfiguration
+
     # Store the args for each ' --data-configs' found on the commandline
     data_configs = args[0].data_configs
     data_configs_show = args[0].data_configs_show
+    lazy_load = args[0].lazy_load
+    cache_dir = args[0].cache_dir
+    cutout = parse_cutout(args[0].spectral_range, args[0].wavelength_range, args[0].spatial_bbox)
 
     import glue
     from glue.utils.qt import get_qapp
@@ -79,8 +201,11 @@ def main(argv=sys.argv):
     # plugins.
     load_plugins(splash=splash)
 
+    # The cubeviz plugin may be disabled in the glue configuration
+    register_keyboard_shortcuts()
+
     # Load the
-    DataFactoryConfiguration(data_configs, data_configs_show, remove_defaults=True)
+    DataFactoryConfiguration(data_configs, data_configs_show, remove_defaults=True, lazy=lazy_load, cache_dir=cache_dir, cutout=cutout)
 
     datafiles = args[0].data_files
 
@@ -111,10 +236,29 @@ def main(argv=sys.argv):
 
     ga.run_startup_action('cubeviz')
 
-    # Load the data files.
+    # Load the data files in the background so the window shows up straight away.
+    loader = None
     if datafiles:
-        datasets = load_data_files(datafiles)
-        ga.add_datasets(data_collection, datasets, auto_merge=False)
+        # The thread is parented to the application, which keeps it alive
+        loader = start_data_loader(ga, data_collection, datafiles, lazy=lazy_load)
+
+    # Report the imports once the event loop runs (the window is up), before the warm up starts
+    if import_profiler is not None:
+        def report_startup():
+            import_profiler.uninstall()
+            import_profiler.report()
+        QTimer.singleShot(0, report_startup)
+
+    # Then import the tools in the background rather than when they are first
+    # used, once the data is loaded so the first draw is not slowed down.
+    from .tools import warm_up, WARM_UP_DELAY
+
+    def start_warm_up():
+        QTimer.singleShot(WARM_UP_DELAY, warm_up)
 
+    if loader is not None:
+        loader.finished.connect(start_warm_up)
+    else:
+        start_warm_up()
 
     sys.exit(ga.start(maximized=True))
@@ -4,8 +4,9 @@ import yaml
 import os
 import glob
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from glue.core import Data, Subset
+from glue.core import Data, Subset, Component
 from glue.core.coordinates import coordinates_from_header
 from glue.config import data_factory, data_exporter
 from glue.core.data_exporters.gridded_fits import fits_writer
@@ -13,6 +14,13 @@ from astropy.io import fits
 import numpy as np
 
 from ..listener import CUBEVIZ_LAYOUT
+from .asdf_cube import is_asdf, open_asdf, asdf_cube_arrays, asdf_wcs_header
+from .cache import DecodedCubeCache
+from .compressed import CompressedCubeArray
+from .cutout import Cutout
+from .fits_export import ExportDescriptor, write_fits
+from .header_scan import scan_headers
+from .match_rules import compile_rule, ConfigurationIndex, RULE_TYPES
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger('cubeviz_data_configuration')
@@ -21,6 +29,9 @@ logger.setLevel(logging.INFO)
 DEFAULT_DATA_CONFIGS = os.path.join(os.path.dirname(__file__), 'configurations')
 CUBEVIZ_DATA_CONFIGS = 'CUBEVIZ_DATA_CONFIGS'
 
+# Number of files read at once when several comma-separated files are loaded
+DEFAULT_LOAD_WORKERS = min(8, os.cpu_count() or 1)
+
 
 class DataConfiguration:
     """
@@ -28,15 +39,22 @@ class DataConfiguration:
 
     """
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, lazy=False, cache=None, cutout=None):
         """
         Given the configuration file, save it and grab the name and priority
         :param config_file:
+        :param lazy: If True, cube components are memory-mapped and only read
+                     from disk when a slice of them is accessed.
+        :param cache: DecodedCubeCache to read decoded components from and store them in, or None
+        :param cutout: Cutout of the cubes to load by default, or None to load the full cubes
         """
         self._config_file = config_file
+        self._lazy = lazy
+        self._cache = cache
+        self._cutout = cutout
 
         with open(self._config_file, 'r') as ymlfile:
-            cfg = yaml.load(ymlfile)
+            cfg = yaml.safe_load(ymlfile)
 
             self._name = cfg['name']
             self._type = cfg['type']
@@ -49,8 +67,17 @@ class DataConfiguration:
 
             self._configuration = cfg['match']
 
+            # Compile the match tree once, rather than interpreting the YAML for every file.
+            self._rule = compile_rule('all', self._configuration['all'])
+
+            # Set by DataFactoryConfiguration so only plausible configurations are evaluated.
+            self._index = None
+
             self._data = cfg.get('data', None)
 
+            # Storage dtype of the extensions, if given in the data section
+            self._dtypes = self._parse_dtypes(self._data)
+
             if 'flux_unit_replacements' in cfg:
                 self.flux_unit_replacements = cfg['flux_unit_replacements']
             else:
@@ -64,6 +91,14 @@ class DataConfiguration:
     def type(self):
         return self._type
 
+    @property
+    def priority(self):
+        return self._priority
+
+    @property
+    def rule(self):
+        return self._rule
+
     def get_units(self, header):
         """
         Extract BUNIT from header.
@@ -95,174 +130,350 @@ class DataConfiguration:
                 units = units.replace(key, self.flux_unit_replacements[key])
         return units
 
-    def load_data(self, data_filenames):
+    @staticmethod
+    def _parse_dtypes(data_config):
         """
-        Load the data based on the extensions defined in the matching YAML file.  THen
-        create the datacube and return it.
+        Get the storage dtype of each extension from the data section of the
+        YAML file. An entry of the data section is either just the extension
+        (name or index), or a dictionary giving the extension and its dtype:
 
-        :param data_filename:
-        :return:
-        """
+            data:
+                FLUX:
+                    extension: SCI
+                    dtype: float32
+                DQ:
+                    extension: DQ
+                    dtype: native
 
-        label = None
-        data = None
+        where ``native`` keeps the dtype the data has in the file.
 
-        for data_filename in data_filenames.split(','):
+        :param data_config: The data section of the YAML file
+        :return: dict: extension name (upper case) or index -> np.dtype or None for native
+        """
+        dtypes = {}
 
-            hdulist = fits.open(data_filename)
+        if not data_config:
+            return dtypes
 
-            if not label:
-                label = "{}: {}".format(self._name, splitext(basename(data_filename))[0])
-                data = Data(label=label)
+        for entry in data_config.values():
+            if not isinstance(entry, dict) or entry.get('extension') is None:
+                continue
 
-                # this attribute is used to indicate to the cubeviz layout that
-                # this is a cubeviz-specific data component.
-                data.meta[CUBEVIZ_LAYOUT] = self._name
+            extension = entry['extension']
+            if not isinstance(extension, int):
+                extension = str(extension).strip().upper()
 
-            data_coords_set = False
-            for ii, hdu in enumerate(hdulist):
-                if 'NAXIS' in hdu.header and hdu.header['NAXIS'] == 3:
+            dtype = entry.get('dtype', 'native')
+            dtypes[extension] = None if dtype in (None, 'native') else np.dtype(dtype)
 
-                    # Set the coords based on the first 3D HDU
-                    if not data_coords_set:
-                        data.coords = coordinates_from_header(hdu.header)
-                        data_coords_set = True
+        return dtypes
 
-                    component_name = str(ii)
-                    if 'EXTNAME' in hdu.header:
-                        component_name = hdu.header['EXTNAME']
+    def _storage_dtype(self, hdu, index):
+        """
+        The dtype a cube HDU is stored with, as defined in the YAML file.
 
-                        # The data must be floating point as spectralcube is expecting floating point data
-                        data.add_component(component=hdu.data.astype(np.float), label=component_name)
+        :param hdu: The 3D HDU
+        :param index: int: Index of the HDU in the file
+        :return: np.dtype or None if the dtype in the file should be kept
+        """
+        extension = str(hdu.header.get('EXTNAME', '')).strip().upper()
+        if extension in self._dtypes:
+            return self._dtypes[extension]
+        return self._dtypes.get(index, None)
 
-                        if 'BUNIT' in hdu.header:
-                            c = data.get_component(component_name)
-                            c.units = self.get_units(hdu.header)
-                    else:
-                        component_name = os.path.basename(data_filename)
-                        data.add_component(component=hdu.data.astype(np.float), label=component_name)
+    def _component_array(self, hdu, index, lazy, hdulist=None, slices=None):
+        """
+        Get the array that is stored as the component for a cube HDU.
 
-            # For the purposes of exporting, we keep a reference to the original HDUList object
-            data._cubeviz_hdulist = hdulist
+        The array is converted to the dtype declared for the extension in the
+        YAML file. Extensions without a declared dtype keep the dtype of the
+        file (e.g. float32 science data and integer DQ planes are not upcast);
+        the tools upcast where the math needs floating point data.
 
-        return data
+        In lazy mode the data is kept as the memory-mapped array returned by
+        astropy when it already has the requested dtype, so pages are only
+        read from disk when a slice is accessed. Compressed (e.g. gzipped)
+        files and scaled data (BSCALE/BZERO) can not be memory-mapped and are
+        read in full by astropy.
 
-    def matches(self, filename):
-        """
-        Main call to which we pass in the file to see if it matches based
-        on the criteria in the config file.
+        Tile-compressed cubes are never decompressed in full, only the tiles
+        covering the slices and spectra that are accessed are, see
+        :class:`~cubeviz.data_factories.compressed.CompressedCubeArray`.
 
-        :param filename:
-        :return:
+        :param hdu: The 3D HDU
+        :param index: int: Index of the HDU in the file
+        :param lazy: bool: Use the memory-mapped data if possible
+        :param hdulist: The HDUList of the HDU, kept open by compressed cubes
+        :param slices: The (spectral, y, x) slices of a cutout to read, or None for the full cube
+        :return: np.ndarray, np.memmap or CompressedCubeArray
         """
+        if slices is not None:
+            compressed_file = getattr(hdu.fileinfo()['file'], 'compression', None) is not None
 
-        # Check the "first filename in the list" which might be the "only filename" in the list.
-        filename = filename.split(',')[0]
-        self._fits = fits.open(filename)
+            if lazy and not compressed_file and not isinstance(hdu, fits.CompImageHDU):
+                # A view of the memory-mapped cube
+                array = hdu.data[slices]
+            else:
+                # Only the bytes (or tiles) covering the cutout are read
+                array = hdu.section[slices]
+                lazy = False
 
-        # Now call the internal processing.
-        matches = self._process('all', self._configuration['all'])
+            dtype = self._storage_dtype(hdu, index)
+            if dtype is None:
+                dtype = array.dtype.newbyteorder('=')
 
-        if matches:
-            logger.debug('{} matches {}'.format(self._config_file, filename))
-        else:
-            logger.debug('{} does not match {}'.format(self._config_file, filename))
+            if lazy and array.dtype.newbyteorder('=') == dtype:
+                return array
 
-        return matches
+            return array.astype(dtype, copy=False)
 
-    def _process(self, key, conditional):
-        """
-        Internal processing. This will get called numerous times recursively.
+        if isinstance(hdu, fits.CompImageHDU):
+            dtype = self._storage_dtype(hdu, index)
+            if dtype is None:
+                # Decompressing the first slice gives the dtype astropy returns the data with
+                dtype = hdu.section[0].dtype.newbyteorder('=')
+            return CompressedCubeArray(hdu, dtype, hdulist=hdulist)
 
-        :param key: The type of check we want to do
-        :param conditional: The thing we are checking
-        :return:
-        """
+        array = hdu.data
 
-        if 'all' == key:
-            return self._all(conditional)
-        elif 'any' == key:
-            return self._any(conditional)
-        elif 'equal' == key:
-            return self._equal(conditional)
-        elif 'startswith' == key:
-            return self._startswith(conditional)
-        elif 'extension_names' == key:
-            return self._extension_names(conditional)
-
-    #
-    # Branch processing
-    #
-
-    def _all(self, conditionals):
-        """
-        All conditions must be met
+        dtype = self._storage_dtype(hdu, index)
+        if dtype is None:
+            dtype = array.dtype.newbyteorder('=')
 
-        :param conditionals:
-        :return:
-        """
-        logger.debug('\tall: {}'.format(conditionals))
-        for key, conditional in conditionals.items():
-            ret = self._process(key, conditional)
-            if not ret:
-                return False
-        return True
-
-    def _any(self, conditionals):
+        if lazy and array.dtype.newbyteorder('=') == dtype:
+            return array
+
+        return array.astype(dtype)
+
+    def _read_asdf_file(self, data_filename, lazy, progress=None, cutout=None):
         """
-        Any condition can be met
+        Read the cube arrays of an ASDF file (e.g. a JWST IFUCubeModel). The
+        arrays named as extensions in the YAML file are used, in that order, or
+        all 3D arrays of the tree if none are. In lazy mode the arrays are
+        memory-mapped, and the WCS comes from the tree's ``meta.wcsinfo``.
 
-        :param conditionals:
-        :return:
+        :param data_filename: str: The file to read
+        :param lazy: bool: Memory-map the cube components
+        :param progress: Callable called as progress(data_filename, arrays_read, total_arrays)
+        :param cutout: Cutout to read, or None to read the full cubes
+        :return: (None, list of (component_name, array, header) in file order)
         """
+        asdf_file = open_asdf(data_filename, lazy=lazy)
+
+        names = [entry['extension'] for entry in (self._data or {}).values()
+                 if isinstance(entry, dict) and isinstance(entry.get('extension'), str)]
+
+        arrays = asdf_cube_arrays(asdf_file, names or None)
+        wcs_header = asdf_wcs_header(asdf_file)
+        meta = asdf_file.tree.get('meta', {})
+
+        if cutout and arrays:
+            slices = cutout.slices(wcs_header, arrays[0][1].shape)
+            wcs_header = Cutout.header(wcs_header, slices)
+            arrays = [(name, array[slices]) for name, array in arrays]
+
+        components = []
+        for count, (name, array) in enumerate(arrays):
+
+            dtype = self._dtypes.get(name.upper(), None)
+            if dtype is None:
+                dtype = array.dtype.newbyteorder('=')
 
-        logger.debug('\tany: {}'.format(conditionals))
-        for key, conditional in conditionals.items():
-            # process conditional
-            ret = self._process(key, conditional)
-            if ret:
-                return ret
+            # Keep memory-mapped arrays that already have the dtype, but don't copy in-memory ones either
+            if not lazy or array.dtype.newbyteorder('=') != dtype:
+                array = array.astype(dtype, copy=False)
 
-        return False
+            header = wcs_header.copy()
+            header['EXTNAME'] = name
+            if 'bunit_' + name in meta:
+                header['BUNIT'] = meta['bunit_' + name]
 
-    #
-    # Leaf processing
-    #
+            components.append((name, array, header))
 
-    def _equal(self, value):
+            if progress is not None:
+                progress(data_filename, count + 1, len(arrays))
+
+        # Memory-mapped arrays need the file, which is closed once they are no longer used
+        if not lazy:
+            asdf_file.close()
+
+        # The FITS exporter can't copy HDUs from an ASDF file
+        return None, components
+
+    def _read_file(self, data_filename, lazy, progress=None, cutout=None):
         """
-        The value at the header_key must equal the value
+        Open one data file and read (or memory-map) all of its cube HDUs. This
+        is run in a worker thread when several files are loaded at once.
 
-        :param value:
-        :return:
+        :param data_filename: str: The file to read
+        :param lazy: bool: Memory-map the cube components
+        :param progress: Callable called as progress(data_filename, hdus_read, total_hdus)
+        :param cutout: Cutout to read, or None to read the full cubes
+        :return: (ExportDescriptor or None, list of (component_name, array, header) in file order)
         """
-        logger.debug('\tequality: {} = {} ?'.format(self._fits[0].header.get(value['header_key'], False), value['value']))
-        return self._fits[0].header.get(value['header_key'], False) == value['value']
+        if is_asdf(data_filename):
+            return self._read_asdf_file(data_filename, lazy, progress, cutout)
+
+        # Cutouts are not cached, as the cache holds full cubes
+        if self._cache is not None and not cutout:
+            components = self._cache.get(data_filename, self._name, mmap=lazy, dtypes=self._dtypes)
+            if components is not None:
+                if progress is not None:
+                    progress(data_filename, len(components), len(components))
+                with fits.open(data_filename, memmap=True) as hdulist:
+                    return ExportDescriptor.from_hdulist(hdulist), components
+
+        hdulist = fits.open(data_filename, memmap=True if lazy else None)
+
+        cube_hdus = [(ii, hdu) for ii, hdu in enumerate(hdulist)
+                     if 'NAXIS' in hdu.header and hdu.header['NAXIS'] == 3]
+
+        # The region of the cutout is worked out from the first cube, the shape is read from the header
+        slices = cutout.slices(cube_hdus[0][1].header, cube_hdus[0][1].shape) if cutout and cube_hdus else None
+
+        components = []
+        for count, (ii, hdu) in enumerate(cube_hdus):
+
+            if 'EXTNAME' in hdu.header:
+                component_name = hdu.header['EXTNAME']
+            else:
+                component_name = os.path.basename(data_filename)
+
+            array = self._component_array(hdu, ii, lazy, hdulist, slices)
+            header = Cutout.header(hdu.header, slices) if slices is not None else hdu.header
+
+            components.append((component_name, array, header))
 
-    def _startswith(self, value):
+            logger.debug('Read HDU {} of {} from {}'.format(count + 1, len(cube_hdus), data_filename))
+            if progress is not None:
+                progress(data_filename, count + 1, len(cube_hdus))
+
+        if self._cache is not None and not cutout:
+            self._cache.put(data_filename, self._name, components, dtypes=self._dtypes)
+
+        # Only keep what the exporter needs rather than the HDUList, whose arrays
+        # would otherwise stay in memory next to the converted components.
+        # Memory-mapped components keep the file mapped after it is closed.
+        # Compressed cubes read their tiles from the file as needed so keep it open for them.
+        # The HDUs of the file can't be copied on export when only a cutout of them was loaded.
+        descriptor = ExportDescriptor.from_hdulist(hdulist) if slices is None else None
+        if not any(isinstance(array, CompressedCubeArray) for _, array, _ in components):
+            hdulist.close()
+
+        return descriptor, components
+
+    def load_data(self, data_filenames, lazy=None, progress=None, max_workers=None,
+                  spectral_range=None, wavelength_range=None, spatial_bbox=None):
         """
-        The value at the header_key must start with the value
+        Load the data based on the extensions defined in the matching YAML file.  THen
+        create the datacube and return it.
+
+        When several (comma-separated) files are given they are read in a pool
+        of threads, since reading and decoding the HDUs mostly releases the GIL,
+        and the components are then added to the data in the order of the files.
 
-        :param value:
+        :param data_filename:
+        :param lazy: Memory-map the cube components instead of reading them
+                     in full. Defaults to the value given to the constructor.
+        :param progress: Callable called as progress(data_filename, hdus_read, total_hdus)
+                         after each HDU is read. It is called from the worker threads.
+        :param max_workers: Maximum number of files read at once. Defaults to DEFAULT_LOAD_WORKERS.
+        :param spectral_range: (start, stop) indices of the spectral slices to load
+        :param wavelength_range: (min, max) wavelengths of the spectral slices to load,
+                                 in the spectral units of the WCS
+        :param spatial_bbox: (xmin, xmax, ymin, ymax) pixel bounding box to load
         :return:
+
+        If any of the ranges are given only that cutout of the cubes is read,
+        and the WCS is adjusted to it. Otherwise the cutout given to the
+        constructor, if any, is used.
         """
-        logger.debug('\tstartswith: {} starswith {} ?'.format(self._fits[0].header.get(value['header_key'], False), value['value']))
-        return self._fits[0].header.get(value['header_key'], '').startswith(value['value'])
 
-    def _extension_names(self, value):
+        if lazy is None:
+            lazy = self._lazy
+
+        cutout = Cutout(spectral_range, wavelength_range, spatial_bbox)
+        if not cutout:
+            cutout = self._cutout
+
+        data_filenames = data_filenames.split(',')
+
+        if len(data_filenames) == 1:
+            files = [self._read_file(data_filenames[0], lazy, progress, cutout)]
+        else:
+            max_workers = min(len(data_filenames), max_workers or DEFAULT_LOAD_WORKERS)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # map returns the results in the order of the files, whatever order they finish in
+                files = list(executor.map(lambda filename: self._read_file(filename, lazy, progress, cutout),
+                                          data_filenames))
+
+        label = "{}: {}".format(self._name, splitext(basename(data_filenames[0]))[0])
+        data = Data(label=label)
+
+        # this attribute is used to indicate to the cubeviz layout that
+        # this is a cubeviz-specific data component.
+        data.meta[CUBEVIZ_LAYOUT] = self._name
+
+        for descriptor, components in files:
+
+            for ii, (component_name, array, header) in enumerate(components):
+
+                # Set the coords based on the first 3D HDU
+                if ii == 0:
+                    data.coords = coordinates_from_header(header)
+
+                # Compressed cubes are stored as they are rather than converted to a numpy array
+                if isinstance(array, CompressedCubeArray):
+                    array = Component(array)
+
+                data.add_component(component=array, label=component_name)
+
+                if 'EXTNAME' in header and 'BUNIT' in header:
+                    c = data.get_component(component_name)
+                    c.units = self.get_units(header)
+
+            # For the purposes of exporting, we keep a description of the original file
+            if descriptor is not None:
+                data._cubeviz_export = descriptor
+
+        return data
+
+    def matches(self, filename, **kwargs):
         """
-        All extensions must exist in the file
+        Main call to which we pass in the file to see if it matches based
+        on the criteria in the config file.
+
+        The headers are read through :func:`scan_headers`, which opens the file
+        once, only reads the headers and shares them between all the data
+        configurations. If this configuration is part of a ConfigurationIndex,
+        the compiled rule is only evaluated when the header values the index is
+        keyed on make a match possible.
 
-        :param value:
+        :param filename:
+        :param kwargs: Loading options (e.g. a cutout) that glue also passes to the identifiers, not used here
         :return:
         """
-        logger.debug('\tcontains extension: {} in {} ?'.format(value,
-                                                               [x.header['EXTNAME'] for x in self._fits if 'EXTNAME' in x.header]))
 
-        if isinstance(value, str):
-            return value in self._fits
-        else:
-            return all([v in self._fits for v in value])
+        # Check the "first filename in the list" which might be the "only filename" in the list.
+        filename = filename.split(',')[0]
+        header_scan = scan_headers(filename)
+
+        if header_scan is None:
+            logger.debug('{} is not a readable FITS file'.format(filename))
+            return False
+
+        if self._index is not None and self not in self._index.candidates(header_scan):
+            return False
+
+        matches = self._rule(header_scan)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            if matches:
+                logger.debug('{} matches {}'.format(self._config_file, filename))
+            else:
+                logger.debug('{} does not match {}'.format(self._config_file, filename))
+
+        return matches
 
     def summarize(self):
         """
@@ -292,7 +503,7 @@ class DataConfiguration:
         else:
             for k, v in d.items():
 
-                func = eval('self._{}'.format(k))
+                func = RULE_TYPES[k]
                 print('{}* {}:'.format('  '*level, self._get_func_docstring(func)))
 
                 if isinstance(v, dict):
@@ -302,7 +513,7 @@ class DataConfiguration:
 
     def _get_func_docstring(self, func):
         """
-        Given the string representation of one of the functions, get the
+        Given one of the match rule classes, get the first line of the
         docstring and return it to be used in the markup.
         """
         ds = func.__doc__
@@ -357,12 +568,16 @@ class DataFactoryConfiguration:
             dc = DataConfiguration(config_file)
             print(dc.summarize())
 
-    def __init__(self, in_configs=[], show_only=False, remove_defaults=False):
+    def __init__(self, in_configs=[], show_only=False, remove_defaults=False, lazy=False, cache_dir=None,
+                 cutout=None):
         """
         The IFC takes either a directory (that contains YAML files), a list of directories (each of which contain
         YAML files) or a list of YAML files.  Each YAML file defines requirements
 
         :param in_configs: Directory, list of directories, or list of files.
+        :param lazy: Memory-map cube components so they are only read from disk when they are displayed.
+        :param cache_dir: Directory to cache decoded cubes in, or None to not cache them.
+        :param cutout: Cutout of the cubes to load, or None to load the full cubes.
         """
 
         # Remove all pre-defined data configuration loaders in Glue. Then, if a user tries to open an IFU FITS
@@ -392,64 +607,45 @@ class DataFactoryConfiguration:
         logger.debug(
             'YAML data configuration files: {}'.format('\n'.join(self._config_files)))
 
-        for config_file in self._config_files:
-
-            # Load the YAML file and get the name, priority and create the data factory wrapper
-            with open(config_file, 'r') as yamlfile:
-                cfg = yaml.load(yamlfile)
+        # Index of the configurations on the header values they require, shared by all of them
+        self._index = ConfigurationIndex()
 
-            name = cfg['name']
+        self._cache = DecodedCubeCache(cache_dir) if cache_dir is not None else None
 
-            try:
-                priority = int(cfg.get('priority', 0))
-            except:
-                priority = 0
+        for config_file in self._config_files:
 
             # The code below instantiates a data configuration object based on the config file and is
             # therefore dependent on the type of data file.  The data configuration object defines two functions
             # 'matches' and 'load_data' that are used.  We needed a way to call Glue's data_factory and be able
             # to pass in functions that have state information.
-            dc = DataConfiguration(config_file)
-            wrapper = data_factory(name, dc.matches, priority=priority)
+            dc = DataConfiguration(config_file, lazy=lazy, cache=self._cache, cutout=cutout)
+            dc._index = self._index
+            self._index.add(dc, dc.rule)
+
+            wrapper = data_factory(dc.name, dc.matches, priority=dc.priority)
             wrapper(dc.load_data)
 
 
 @data_exporter('CubeViz FITS exporter', extension=['fits', 'fit'])
-def cubeviz_fits_exporter(filename, data, components=None):
+def cubeviz_fits_exporter(filename, data, components=None, progress=None):
+    """
+    Export the data to FITS. Data loaded by cubeviz is written with the HDUs
+    of the original file that hold exported components copied unchanged,
+    see :func:`~cubeviz.data_factories.fits_export.write_fits`.
+
+    :param filename: str: Output filename
+    :param data: Data to export
+    :param components: ComponentIDs to export, defaults to the visible components
+    :param progress: Callable called as progress(bytes_written, total_bytes)
+    """
 
     if isinstance(data, Subset):
         raise NotImplementedError("Can't export subsets yet")
 
-    if not hasattr(data, '_cubeviz_hdulist'):
+    if not hasattr(data, '_cubeviz_export'):
         return fits_writer(filename, data, components=components)
 
     if components is None:
         components = data.visible_components
 
-    hdulist = fits.HDUList(data._cubeviz_hdulist.copy())
-
-    component_labels = [cid.label for cid in components]
-
-    # Remove any HDUs with data that don't have a matching component
-    for hdu in hdulist[::-1]:
-        if hdu.data is not None and hdu.name not in component_labels:
-            hdulist.remove(hdu)
-
-    # Add any other components
-    for cid in components:
-
-        if cid.label in hdulist:
-            continue
-
-        comp = data.get_component(cid)
-
-        if comp.categorical:
-            raise NotImplementedError()
-
-        hdu = fits.ImageHDU(comp.data, data.coords.wcs.to_header(), name=cid.label)
-        hdulist.append(hdu)
-
-    try:
-        hdulist.writeto(filename, overwrite=True)
-    except TypeError:
-        hdulist.writeto(filename, clobber=True)
+    write_fits(filename, data, data._cubeviz_export, components, progress=progress)
@@ -0,0 +1,139 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Reading of ASDF cube products, such as JWST IFUCubeModel files. The tree is
+read without reading any of the array blocks, the arrays are memory-mapped
+when possible, and the WCS is built from the FITS-like ``meta.wcsinfo``
+section of the tree.
+"""
+import numpy as np
+from astropy.io import fits
+
+__all__ = ['is_asdf', 'open_asdf', 'asdf_headers', 'asdf_wcs_header', 'asdf_cube_arrays']
+
+ASDF_MAGIC = b'#ASDF'
+
+# FITS keywords that are filled from the ASDF metadata, so the same match
+# rules can be written for FITS and ASDF products.
+FITS_KEYWORDS = {
+    'TELESCOP': 'telescope',
+    'INSTRUME': 'instrument.name',
+    'DATAMODL': 'model_type',
+}
+
+# Keywords of meta.wcsinfo that are copied to the WCS header
+WCS_KEYWORDS = ('wcsaxes', 'crpix', 'crval', 'cdelt', 'ctype', 'cunit', 'pc', 'cd', 'ra_ref',
+                'dec_ref', 'v2_ref', 'v3_ref', 'roll_ref', 'radesys', 'specsys', 'equinox')
+
+
+def is_asdf(filename):
+    """
+    Check whether the file is an ASDF file.
+
+    :param filename: str: Path to the file
+    :return: bool
+    """
+    try:
+        with open(filename, 'rb') as fp:
+            return fp.read(len(ASDF_MAGIC)) == ASDF_MAGIC
+    except OSError:
+        return False
+
+
+def open_asdf(filename, lazy=True):
+    """
+    Open an ASDF file, reading only the tree. The arrays are read when they
+    are accessed, and memory-mapped if lazy is set and the block is not
+    compressed.
+
+    The file must be kept open while memory-mapped arrays from it are used.
+
+    :param filename: str: Path to the file
+    :param lazy: bool: Memory-map the arrays
+    :return: asdf.AsdfFile
+    """
+    # asdf is only needed for ASDF files, so it is imported when one is opened
+    import asdf
+
+    try:
+        return asdf.open(filename, lazy_load=True, memmap=lazy)
+    except TypeError:
+        # Older versions of asdf use copy_arrays, and memory-map by default
+        return asdf.open(filename, lazy_load=True, copy_arrays=not lazy)
+
+
+def _flatten(tree, prefix=''):
+    """
+    Scalar values of a nested dict, keyed on their dotted path.
+    """
+    flat = {}
+    for key, value in tree.items():
+        path = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + '.'))
+        elif isinstance(value, (str, int, float, bool)):
+            flat[path] = value
+    return flat
+
+
+def _is_array(value):
+    return hasattr(value, 'shape') and hasattr(value, 'dtype')
+
+
+def asdf_headers(asdf_file):
+    """
+    Header-like view of the tree that the data configurations match against.
+    The first "header" holds every scalar in ``meta`` under its dotted path
+    (e.g. ``telescope``, ``instrument.name``) plus the FITS keywords in
+    FITS_KEYWORDS; each top-level array follows as an "extension" named after
+    its key.
+
+    :param asdf_file: asdf.AsdfFile
+    :return: list of dict
+    """
+    meta = _flatten(asdf_file.tree.get('meta', {}))
+    for keyword, path in FITS_KEYWORDS.items():
+        if path in meta:
+            meta.setdefault(keyword, meta[path])
+
+    headers = [meta]
+    for key, value in asdf_file.tree.items():
+        if _is_array(value):
+            headers.append({'EXTNAME': key, 'NAXIS': len(value.shape)})
+    return headers
+
+
+def asdf_wcs_header(asdf_file):
+    """
+    FITS WCS header built from ``meta.wcsinfo``, which JWST products carry
+    next to the full (gwcs) WCS.
+
+    :param asdf_file: asdf.AsdfFile
+    :return: fits.Header
+    """
+    wcsinfo = asdf_file.tree.get('meta', {}).get('wcsinfo', {})
+
+    header = fits.Header()
+    for key, value in wcsinfo.items():
+        if key.startswith(WCS_KEYWORDS) and isinstance(value, (str, int, float)):
+            header[key.upper()] = value
+    return header
+
+
+def asdf_cube_arrays(asdf_file, names=None):
+    """
+    The 3D arrays at the top level of the tree, without reading them.
+
+    :param asdf_file: asdf.AsdfFile
+    :param names: list of str: Keys of the arrays to get, defaults to all 3D arrays
+    :return: list of (name, array)
+    """
+    if names is None:
+        names = [key for key, value in asdf_file.tree.items() if _is_array(value)]
+
+    arrays = []
+    for name in names:
+        value = asdf_file.tree.get(name, None)
+        if _is_array(value) and len(value.shape) == 3:
+            # For memory-mapped blocks this is a view of the file, not a copy
+            arrays.append((name, np.asarray(value)))
+    return arrays
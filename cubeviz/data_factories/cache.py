@@ -0,0 +1,242 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+An on-disk cache of decoded data cubes, so reopening the same file does not
+pay again for decompression, BSCALE/BZERO scaling and dtype conversion.
+
+Each cached file is a directory holding one ``.npy`` file per component, in
+native byte order so it can be memory-mapped with ``np.load(mmap_mode='r')``,
+and a ``manifest.json`` with the component names, headers and sizes. Entries
+are written in a background thread, a chunk of slices at a time, so storing a
+memory-mapped or tile-compressed cube neither blocks the loading nor reads the
+whole cube into memory.
+
+The components are stored slice-major only, the layout glue and the image
+viewers read; there is no spaxel-major copy for spectra, which are read from
+the page cache once the entry is warm.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ['DecodedCubeCache']
+
+logger = logging.getLogger('cubeviz_data_configuration')
+
+# Default maximum size of the cache directory, in bytes
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+
+MANIFEST = 'manifest.json'
+
+# Number of bytes of a component read from the source and written at a time
+WRITE_CHUNK_BYTES = 64 * 1024 ** 2
+
+
+class DecodedCubeCache:
+    """
+    Cache of the decoded components of data files, keyed on the path and
+    modification time of the file and the name of the data configuration that
+    loaded it, and the storage dtypes of that configuration. When the cache
+    directory grows beyond ``max_bytes`` the least recently used entries are
+    removed.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_SIZE):
+        """
+        :param cache_dir: str: Directory to store the cache in, created if needed
+        :param max_bytes: int: Maximum size of the cache directory
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}  # entry directory -> Future of the entry being written
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _dtypes_key(dtypes):
+        """
+        A stable string of a storage dtype policy, see DataConfiguration._parse_dtypes.
+        """
+        if not dtypes:
+            return ''
+        return ';'.join(sorted('{}={}'.format(extension, 'native' if dtype is None else np.dtype(dtype).str)
+                               for extension, dtype in dtypes.items()))
+
+    def _entry_dir(self, data_filename, config_name, dtypes=None):
+        """
+        Directory of the entry for the file, or None if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(data_filename)
+        except OSError:
+            return None
+
+        key = '{}\0{}\0{}\0{}\0{}'.format(os.path.abspath(data_filename), stat.st_mtime_ns,
+                                          stat.st_size, config_name, self._dtypes_key(dtypes))
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, data_filename, config_name, mmap=True, dtypes=None):
+        """
+        Get the cached components of a file.
+
+        :param data_filename: str: The data file
+        :param config_name: str: Name of the data configuration loading the file
+        :param mmap: bool: Memory-map the arrays rather than reading them in full
+        :param dtypes: dict: Storage dtype policy of the configuration, extension -> dtype or None
+        :return: list of (component_name, array, header) or None if not cached
+        """
+        entry_dir = self._entry_dir(data_filename, config_name, dtypes)
+        if entry_dir is None:
+            return None
+
+        try:
+            with open(os.path.join(entry_dir, MANIFEST), 'r') as fp:
+                manifest = json.load(fp)
+
+            components = []
+            for component in manifest['components']:
+                array = np.load(os.path.join(entry_dir, component['file']),
+                                mmap_mode='r' if mmap else None)
+                header = fits.Header.fromstring(component['header'])
+                components.append((component['name'], array, header))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # The modification time of the manifest is used as the last access time for eviction
+        try:
+            os.utime(os.path.join(entry_dir, MANIFEST))
+        except OSError:
+            pass
+
+        logger.debug('Read {} from the cache {}'.format(data_filename, entry_dir))
+        return components
+
+    def put(self, data_filename, config_name, components, dtypes=None):
+        """
+        Store the components of a file in the cache in the background, then
+        evict entries if the cache is too big.
+
+        :param data_filename: str: The data file
+        :param config_name: str: Name of the data configuration loading the file
+        :param components: list of (component_name, array, header), the arrays
+                           may be memory-mapped or CompressedCubeArray
+        :param dtypes: dict: Storage dtype policy of the configuration, see get
+        :return: Future of the write, or None if the entry exists or is being written
+        """
+        entry_dir = self._entry_dir(data_filename, config_name, dtypes)
+        if entry_dir is None or os.path.isdir(entry_dir):
+            return None
+
+        with self._lock:
+            if entry_dir in self._pending:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cubeviz-cache')
+            future = self._executor.submit(self._write, entry_dir, data_filename, config_name, components)
+            self._pending[entry_dir] = future
+        return future
+
+    def wait(self):
+        """
+        Wait for the entries being written.
+        """
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _save(filename, array):
+        """
+        Write an array to a .npy file a chunk of slices at a time, so only one
+        chunk of a memory-mapped or compressed cube is in memory at once.
+        """
+        dtype = np.dtype(array.dtype).newbyteorder('=')
+        shape = tuple(array.shape)
+        out = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=shape)
+        try:
+            if len(shape) == 0 or shape[0] == 0:
+                out[...] = np.asarray(array)
+                return
+            slice_bytes = max(1, int(np.prod(shape[1:])) * dtype.itemsize)
+            chunk_slices = max(1, WRITE_CHUNK_BYTES // slice_bytes)
+            for start in range(0, shape[0], chunk_slices):
+                out[start:start + chunk_slices] = np.asarray(array[start:start + chunk_slices])
+            out.flush()
+        finally:
+            del out
+
+    def _write(self, entry_dir, data_filename, config_name, components):
+        # Write to a temporary directory first so a partly written entry is never read
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp')
+        try:
+            manifest = {'filename': os.path.abspath(data_filename), 'config': config_name,
+                        'components': []}
+            for ii, (component_name, array, header) in enumerate(components):
+                self._save(os.path.join(tmp_dir, '{}.npy'.format(ii)), array)
+                manifest['components'].append({'name': component_name, 'file': '{}.npy'.format(ii),
+                                               'header': header.tostring()})
+
+            with open(os.path.join(tmp_dir, MANIFEST), 'w') as fp:
+                json.dump(manifest, fp)
+
+            os.rename(tmp_dir, entry_dir)
+        except Exception as e:
+            logger.warning('Could not cache {}: {}'.format(data_filename, e))
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        finally:
+            with self._lock:
+                self._pending.pop(entry_dir, None)
+
+        self.evict()
+
+    def _entries(self):
+        """
+        The entries in the cache.
+
+        :return: list of (last access time, size in bytes, directory)
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            try:
+                atime = os.path.getmtime(os.path.join(entry_dir, MANIFEST))
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir))
+            except OSError:
+                # Temporary directory of an entry being written
+                continue
+            entries.append((atime, size, entry_dir))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, entry_dir in entries:
+                if total <= self.max_bytes:
+                    break
+                logger.debug('Evicting {} from the cache'.format(entry_dir))
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+
+    def clear(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            for _, _, entry_dir in self._entries():
+                shutil.rmtree(entry_dir, ignore_errors=True)
@@ -0,0 +1,102 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Access to tile-compressed (``CompImageHDU``) cubes without decompressing the
+whole cube. Only the tiles covering the requested slice or spaxel are
+decompressed, and the most recently used slices are kept in a bounded cache
+so moving the slice slider back and forth does not decompress them again.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ['CompressedCubeArray']
+
+# Maximum number of bytes of decompressed slices kept per cube
+DEFAULT_SLICE_CACHE_BYTES = 256 * 1024 ** 2
+
+
+class CompressedCubeArray:
+    """
+    Array-like view of a tile-compressed cube HDU. It is stored as the data of
+    a glue Component, which indexes it when a view of the data is requested;
+    converting it to a numpy array decompresses the full cube.
+    """
+
+    def __init__(self, hdu, dtype, hdulist=None, cache_bytes=DEFAULT_SLICE_CACHE_BYTES):
+        """
+        :param hdu: CompImageHDU holding the cube
+        :param dtype: The dtype the data is returned as
+        :param hdulist: The HDUList the HDU is from, kept open while the cube is used
+        :param cache_bytes: int: Maximum number of bytes of decompressed slices kept
+        """
+        self._hdu = hdu
+        self._hdulist = hdulist
+        self._section = hdu.section
+        self.shape = tuple(hdu.shape)
+        self.dtype = np.dtype(dtype)
+        self.ndim = len(self.shape)
+
+        self._slice_bytes = int(np.prod(self.shape[1:])) * self.dtype.itemsize
+        self._cache_size = max(1, cache_bytes // max(1, self._slice_bytes))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return '<CompressedCubeArray shape={} dtype={}>'.format(self.shape, self.dtype)
+
+    def get_slice(self, index):
+        """
+        Get one slice along the first (spectral) axis, decompressing only the
+        tiles that cover it unless it is in the cache.
+
+        :param index: int: Slice index
+        :return: 2D np.ndarray, which must not be modified
+        """
+        if index < 0:
+            index += self.shape[0]
+
+        with self._lock:
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+
+        plane = np.asarray(self._section[index], dtype=self.dtype)
+        plane.flags.writeable = False
+
+        with self._lock:
+            self._cache[index] = plane
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+        return plane
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        # A single slice (e.g. the image viewers) goes through the slice cache
+        if len(key) > 0 and isinstance(key[0], (int, np.integer)):
+            return self.get_slice(int(key[0]))[key[1:]]
+
+        # Anything else (e.g. a spectrum) decompresses just the tiles it covers
+        try:
+            return np.asarray(self._section[key], dtype=self.dtype)
+        except (IndexError, TypeError, ValueError):
+            # Fancy indexing is not supported by the section
+            return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        array = np.asarray(self._section[...], dtype=self.dtype)
+        return array if dtype is None else array.astype(dtype, copy=False)
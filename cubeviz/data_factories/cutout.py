@@ -0,0 +1,132 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Loading only part of a cube: a range of spectral slices, given as indices or
+as wavelengths, and/or a spatial bounding box in pixels.
+"""
+import numpy as np
+from astropy import units as u
+from astropy.wcs import WCS
+
+__all__ = ['Cutout', 'parse_range']
+
+
+def parse_range(text, dtype=float):
+    """
+    Parse a range given on the command line as ``start:stop``. Either end can
+    be left out, e.g. ``100:`` or ``:1.6``.
+
+    :param text: str: The range
+    :param dtype: Type of the values
+    :return: (start, stop), where a missing end is None
+    """
+    try:
+        start, stop = text.split(':')
+        return (dtype(start) if start.strip() else None,
+                dtype(stop) if stop.strip() else None)
+    except ValueError:
+        raise ValueError('Expected a range as start:stop, got "{}"'.format(text))
+
+
+class Cutout:
+    """
+    Region of a cube to load. Ranges follow python slicing: the start is
+    included and the stop is not.
+    """
+
+    def __init__(self, spectral_range=None, wavelength_range=None, spatial_bbox=None):
+        """
+        :param spectral_range: (start, stop) slice indices along the spectral axis
+        :param wavelength_range: (min, max) wavelengths, in the spectral units of the
+                                 cube's WCS. Slices with a wavelength in the range are kept.
+        :param spatial_bbox: (xmin, xmax, ymin, ymax) pixel bounding box, x being the first FITS axis
+        """
+        self.spectral_range = spectral_range
+        self.wavelength_range = wavelength_range
+        self.spatial_bbox = spatial_bbox
+
+    def __bool__(self):
+        return any(r is not None for r in (self.spectral_range, self.wavelength_range, self.spatial_bbox))
+
+    def __repr__(self):
+        return '<Cutout spectral_range={} wavelength_range={} spatial_bbox={}>'.format(
+            self.spectral_range, self.wavelength_range, self.spatial_bbox)
+
+    @staticmethod
+    def _wavelengths(header, n_slices):
+        """
+        World coordinate of each slice along the spectral (third) axis, in
+        the units given in the header.
+        """
+        wcs = WCS(header)
+        spectral_axis = wcs.wcs.spec if wcs.wcs.spec >= 0 else 2
+        spectral_wcs = wcs.sub([spectral_axis + 1])
+        wavelengths = spectral_wcs.all_pix2world(np.arange(n_slices), 0)[0]
+
+        # astropy converts spectral axes to SI units, so convert back to those of the header
+        header_unit = header.get('CUNIT{}'.format(spectral_axis + 1), None)
+        if header_unit:
+            wcs_unit = u.Unit(spectral_wcs.wcs.cunit[0])
+            wavelengths = (wavelengths * wcs_unit).to_value(u.Unit(header_unit), equivalencies=u.spectral())
+        return wavelengths
+
+    def slices(self, header, shape):
+        """
+        The numpy slices of the region of a cube.
+
+        :param header: Header with the WCS of the cube
+        :param shape: Shape of the cube (spectral, y, x)
+        :return: tuple of slice for the (spectral, y, x) axes
+        """
+        n_slices, ny, nx = shape
+
+        start, stop = 0, n_slices
+        if self.spectral_range is not None:
+            range_start, range_stop = slice(*self.spectral_range).indices(n_slices)[:2]
+            start, stop = max(start, range_start), min(stop, range_stop)
+
+        if self.wavelength_range is not None:
+            low, high = self.wavelength_range
+            wavelengths = self._wavelengths(header, n_slices)
+            inside = np.ones(n_slices, dtype=bool)
+            if low is not None:
+                inside &= wavelengths >= low
+            if high is not None:
+                inside &= wavelengths <= high
+            indices = np.flatnonzero(inside)
+            if len(indices) == 0:
+                raise ValueError('No slices have a wavelength in {}'.format(self.wavelength_range))
+            start, stop = max(start, indices[0]), min(stop, indices[-1] + 1)
+
+        if start >= stop:
+            raise ValueError('The cutout {} does not contain any slices'.format(self))
+
+        y_slice, x_slice = slice(0, ny), slice(0, nx)
+        if self.spatial_bbox is not None:
+            xmin, xmax, ymin, ymax = self.spatial_bbox
+            x_slice = slice(*slice(xmin, xmax).indices(nx)[:2])
+            y_slice = slice(*slice(ymin, ymax).indices(ny)[:2])
+            if x_slice.start >= x_slice.stop or y_slice.start >= y_slice.stop:
+                raise ValueError('The cutout {} does not contain any spaxels'.format(self))
+
+        return slice(int(start), int(stop)), y_slice, x_slice
+
+    @staticmethod
+    def header(header, slices):
+        """
+        Copy of the header of a cube adjusted to a cutout of it: the axis
+        lengths are updated and the reference pixels shifted, so the WCS of the
+        cutout gives the same world coordinates as the full cube.
+
+        :param header: Header of the full cube
+        :param slices: The (spectral, y, x) slices of the cutout
+        :return: Header
+        """
+        header = header.copy()
+
+        # FITS axes are in the reverse order of the numpy axes
+        for axis, axis_slice in zip((3, 2, 1), slices):
+            if 'NAXIS{}'.format(axis) in header:
+                header['NAXIS{}'.format(axis)] = axis_slice.stop - axis_slice.start
+            header['CRPIX{}'.format(axis)] = header.get('CRPIX{}'.format(axis), 0.0) - axis_slice.start
+
+        return header
@@ -0,0 +1,247 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Streaming export of cubeviz data to FITS. HDUs of the original file that are
+exported unchanged are copied byte for byte from the file, and the other
+components are written in chunks of slices, so exporting never needs more
+than a chunk of any cube in memory.
+"""
+import bz2
+import gzip
+import logging
+import os
+
+import numpy as np
+from astropy.io import fits
+
+__all__ = ['ExportDescriptor', 'write_fits']
+
+logger = logging.getLogger('cubeviz_data_configuration')
+
+# FITS files are written in blocks of this many bytes
+FITS_BLOCK_SIZE = 2880
+
+# Number of bytes read or written at a time
+EXPORT_CHUNK_BYTES = 64 * 1024 ** 2
+
+# Data types that can't be written to FITS as they are
+FITS_DTYPES = {
+    np.dtype(bool): np.dtype('uint8'),
+    np.dtype('int8'): np.dtype('int16'),
+    np.dtype('uint16'): np.dtype('int32'),
+    np.dtype('uint32'): np.dtype('int64'),
+    np.dtype('uint64'): np.dtype('float64'),
+    np.dtype('float16'): np.dtype('float32'),
+}
+
+
+class ExportDescriptor:
+    """
+    What the exporter needs to know about the file the data was loaded from:
+    its path and, for each HDU in order, the name, header and the range of
+    bytes the HDU takes up in the file. Unlike the HDUList this holds no data
+    arrays, so keeping it on the Data does not keep the original cubes in memory.
+    """
+
+    def __init__(self, filename, hdus):
+        """
+        :param filename: str: Path of the original file
+        :param hdus: list of (name, header, has_data, start, nbytes), in file order
+        """
+        self.filename = filename
+        self.hdus = hdus
+
+        # The byte offsets are only valid for the file as it was when loaded
+        stat = os.stat(filename)
+        self._mtime = stat.st_mtime_ns
+        self._size = stat.st_size
+
+    def check_unchanged(self):
+        """
+        Make sure the original file has not changed since it was loaded.
+
+        :raises: IOError: if the file was modified or removed
+        """
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            raise IOError('{} no longer exists'.format(self.filename))
+
+        if (stat.st_mtime_ns, stat.st_size) != (self._mtime, self._size):
+            raise IOError('{} has changed since it was loaded'.format(self.filename))
+
+    @classmethod
+    def from_hdulist(cls, hdulist):
+        """
+        Build the descriptor of an open file. Only the headers are read.
+
+        :param hdulist: HDUList
+        :return: ExportDescriptor
+        """
+        hdus = []
+        for hdu in hdulist:
+            info = hdu.fileinfo()
+            hdus.append((hdu.name, hdu.header.copy(), hdu.size > 0, info['hdrLoc'],
+                         info['datLoc'] + info['datSpan'] - info['hdrLoc']))
+        return cls(os.path.abspath(hdulist.filename()), hdus)
+
+
+def _open_source(filename):
+    """
+    Open the original file for reading, decompressing it if needed. The HDU
+    offsets astropy reports are offsets into the decompressed file.
+    """
+    with open(filename, 'rb') as fp:
+        magic = fp.read(3)
+
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.open(filename, 'rb')
+    elif magic == b'BZh':
+        return bz2.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def _write_padding(fp, nbytes):
+    """
+    Pad the data written to a whole number of FITS blocks.
+    """
+    padding = -nbytes % FITS_BLOCK_SIZE
+    if padding:
+        fp.write(b'\0' * padding)
+
+
+def _image_header(label, array, wcs_header):
+    """
+    Header of a new image extension holding a component.
+
+    :param label: str: Name of the extension
+    :param array: The component data
+    :param wcs_header: Header with the WCS of the data
+    :return: (fits.Header, dtype the data is written with)
+    """
+    dtype = array.dtype.newbyteorder('=')
+    dtype = FITS_DTYPES.get(dtype, dtype)
+    if dtype.name not in fits.hdu.base.DTYPE2BITPIX:
+        raise ValueError('Component {} has dtype {}, which can not be written to a FITS image'.format(
+            label, array.dtype))
+
+    header = fits.Header()
+    header['XTENSION'] = 'IMAGE'
+    header['BITPIX'] = fits.hdu.base.DTYPE2BITPIX[dtype.name]
+    header['NAXIS'] = array.ndim
+    for ii, size in enumerate(array.shape[::-1]):
+        header['NAXIS{}'.format(ii + 1)] = size
+    header['PCOUNT'] = 0
+    header['GCOUNT'] = 1
+    header['EXTNAME'] = label
+    header.extend(wcs_header, unique=True)
+
+    return header, dtype.newbyteorder('>')
+
+
+def _write_array(fp, array, dtype, progress):
+    """
+    Write the array as big-endian FITS data, a chunk of slices at a time.
+
+    :return: int: Number of bytes written
+    """
+    n_slices = array.shape[0] if array.ndim else 1
+    slice_bytes = max(1, array.nbytes // max(1, n_slices))
+    step = max(1, EXPORT_CHUNK_BYTES // slice_bytes)
+
+    written = 0
+    for start in range(0, n_slices, step):
+        chunk = np.ascontiguousarray(array[start:start + step] if array.ndim else array, dtype=dtype)
+        fp.write(chunk.data)
+        written += chunk.nbytes
+        progress(chunk.nbytes)
+
+    _write_padding(fp, written)
+    return written
+
+
+def _copy_bytes(fp, source, start, nbytes, progress):
+    """
+    Copy a range of bytes of the original file.
+    """
+    source.seek(start)
+    while nbytes > 0:
+        block = source.read(min(nbytes, EXPORT_CHUNK_BYTES))
+        if not block:
+            raise IOError('Unexpected end of file while copying {}'.format(source.name))
+        fp.write(block)
+        nbytes -= len(block)
+        progress(len(block))
+
+
+def write_fits(filename, data, descriptor, components, progress=None):
+    """
+    Write the components of the data to a FITS file. The HDUs of the original
+    file either have no data or hold one of the components are copied
+    unchanged, in their original order, and the remaining components are
+    appended as image extensions with the WCS of the data.
+
+    :param filename: str: Output filename, overwritten if it exists
+    :param data: Data to export
+    :param descriptor: ExportDescriptor of the file the data was loaded from
+    :param components: list of ComponentIDs to export
+    :param progress: Callable called as progress(bytes_written, total_bytes)
+    """
+    # EXTNAMEs are case insensitive
+    component_labels = set(cid.label.upper() for cid in components)
+
+    # Original HDUs without data or with data that is exported, and the byte range of each
+    kept_hdus = [(name, header, start, nbytes) for name, header, has_data, start, nbytes in descriptor.hdus
+                 if not has_data or name.upper() in component_labels]
+
+    kept_names = set(name.upper() for name, _, _, _ in kept_hdus)
+
+    new_components = []
+    for cid in components:
+        if cid.label.upper() in kept_names:
+            continue
+
+        comp = data.get_component(cid)
+        if comp.categorical:
+            raise NotImplementedError()
+
+        new_components.append((cid.label, comp.data))
+
+    # The headers of the new extensions, before anything is written, so
+    # components that can't be written fail straight away
+    wcs_header = data.coords.wcs.to_header()
+    new_components = [(label, array) + _image_header(label, array, wcs_header) for label, array in new_components]
+
+    total_bytes = (sum(nbytes for _, _, _, nbytes in kept_hdus) +
+                   sum(array.nbytes for _, array, _, _ in new_components))
+    done = [0]
+
+    def update_progress(nbytes):
+        done[0] += nbytes
+        if progress is not None:
+            progress(done[0], total_bytes)
+
+    # Write to a temporary file first, so the original is still readable if it is overwritten
+    tmp_filename = filename + '.part'
+    try:
+        with open(tmp_filename, 'wb') as fp:
+
+            # A FITS file has to start with a primary HDU
+            if not kept_hdus or 'SIMPLE' not in kept_hdus[0][1]:
+                fp.write(fits.PrimaryHDU().header.tostring().encode('ascii'))
+
+            if kept_hdus:
+                descriptor.check_unchanged()
+                with _open_source(descriptor.filename) as source:
+                    for name, _, start, nbytes in kept_hdus:
+                        logger.debug('Copying HDU {} to {}'.format(name, filename))
+                        _copy_bytes(fp, source, start, nbytes, update_progress)
+
+            for label, array, header, dtype in new_components:
+                logger.debug('Writing component {} to {}'.format(label, filename))
+                fp.write(header.tostring().encode('ascii'))
+                _write_array(fp, array, dtype, update_progress)
+
+        os.replace(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
@@ -0,0 +1,80 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import os
+from functools import lru_cache
+
+from astropy.io import fits
+
+from .asdf_cube import is_asdf, open_asdf, asdf_headers
+
+__all__ = ['HeaderScan', 'scan_headers']
+
+# Number of files whose headers are kept around. Identifying a file runs every
+# data configuration against the same scan, so only the most recent files are
+# really needed.
+HEADER_SCAN_CACHE_SIZE = 32
+
+
+class HeaderScan:
+    """
+    The headers and extension names of a FITS file, read in a single pass
+    without reading any of the data. This is what the data configurations
+    match against. For ASDF files the headers are built from the tree, see
+    :func:`~cubeviz.data_factories.asdf_cube.asdf_headers`.
+    """
+
+    def __init__(self, filename, headers):
+        self.filename = filename
+        self.headers = headers
+        self.primary_header = headers[0] if headers else fits.Header()
+        self.extension_names = [str(h['EXTNAME']).strip() for h in headers if 'EXTNAME' in h]
+
+        # Extension names are compared case-insensitively, as HDUList does.
+        self._extension_names_upper = set(name.upper() for name in self.extension_names)
+
+    def has_extension(self, name):
+        """
+        Check whether an extension with the given EXTNAME exists in the file.
+
+        :param name: str: Extension name
+        :return: bool
+        """
+        return str(name).strip().upper() in self._extension_names_upper
+
+
+@lru_cache(maxsize=HEADER_SCAN_CACHE_SIZE)
+def _scan_headers(filename, mtime, size):
+    """
+    Read all headers of the file and close it again. The modification time
+    and size are only part of the signature so a changed file is re-read.
+    """
+    if is_asdf(filename):
+        try:
+            with open_asdf(filename) as asdf_file:
+                return HeaderScan(filename, asdf_headers(asdf_file))
+        except (ImportError, OSError, ValueError):
+            return None
+
+    try:
+        with fits.open(filename, memmap=True, lazy_load_hdus=True) as hdulist:
+            headers = [hdu.header for hdu in hdulist]
+    except (OSError, ValueError):
+        return None
+
+    return HeaderScan(filename, headers)
+
+
+def scan_headers(filename):
+    """
+    Get the headers of a FITS file. The file is opened once and closed again,
+    and the result is shared by every data configuration that asks for the
+    same (unchanged) file.
+
+    :param filename: str: Path to the FITS or ASDF file
+    :return: HeaderScan or None if the file can not be read as FITS or ASDF
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    return _scan_headers(os.path.abspath(filename), stat.st_mtime, stat.st_size)
@@ -0,0 +1,202 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+The ``match`` section of a data configuration YAML file is compiled once into
+a tree of rule objects, which are then evaluated against the
+:class:`~cubeviz.data_factories.header_scan.HeaderScan` of a file.
+"""
+import abc
+import logging
+import weakref
+
+__all__ = ['MatchRule', 'AllRule', 'AnyRule', 'EqualRule', 'StartsWithRule',
+           'ExtensionNamesRule', 'compile_rule', 'ConfigurationIndex']
+
+logger = logging.getLogger('cubeviz_data_configuration')
+
+
+class MatchRule(abc.ABC):
+    """
+    Base class of the compiled match rules.
+    """
+
+    @abc.abstractmethod
+    def __call__(self, header_scan):
+        """
+        Whether the rule matches a file.
+
+        :param header_scan: HeaderScan of the file
+        :return: bool
+        """
+
+    def required_values(self):
+        """
+        Header values that have to be present for this rule to match.
+
+        :return: list of (header_key, value) tuples
+        """
+        return []
+
+
+class AllRule(MatchRule):
+    """
+    All conditions must be met
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __call__(self, header_scan):
+        return all(rule(header_scan) for rule in self.rules)
+
+    def required_values(self):
+        # Every requirement of every sub-rule has to hold
+        return [pair for rule in self.rules for pair in rule.required_values()]
+
+
+class AnyRule(MatchRule):
+    """
+    Any condition can be met
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+
+    def __call__(self, header_scan):
+        return any(rule(header_scan) for rule in self.rules)
+
+
+class EqualRule(MatchRule):
+    """
+    The value at the header_key must equal the value
+    """
+
+    def __init__(self, header_key, value):
+        self.header_key = header_key
+        self.value = value
+
+    def __call__(self, header_scan):
+        header_value = header_scan.primary_header.get(self.header_key, False)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('\tequality: {} = {} ?'.format(header_value, self.value))
+        return header_value == self.value
+
+    def required_values(self):
+        return [(self.header_key, self.value)]
+
+
+class StartsWithRule(MatchRule):
+    """
+    The value at the header_key must start with the value
+    """
+
+    def __init__(self, header_key, value):
+        self.header_key = header_key
+        self.value = value
+
+    def __call__(self, header_scan):
+        header_value = header_scan.primary_header.get(self.header_key, '')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('\tstartswith: {} startswith {} ?'.format(header_value, self.value))
+        return isinstance(header_value, str) and header_value.startswith(self.value)
+
+
+class ExtensionNamesRule(MatchRule):
+    """
+    All extensions must exist in the file
+    """
+
+    def __init__(self, names):
+        if isinstance(names, str):
+            names = [names]
+        self.names = list(names)
+
+    def __call__(self, header_scan):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('\tcontains extension: {} in {} ?'.format(self.names, header_scan.extension_names))
+        return all(header_scan.has_extension(name) for name in self.names)
+
+
+# Map of the keys used in the YAML files to the rule that implements them
+RULE_TYPES = {
+    'all': AllRule,
+    'any': AnyRule,
+    'equal': EqualRule,
+    'startswith': StartsWithRule,
+    'extension_names': ExtensionNamesRule
+}
+
+
+def compile_rule(key, conditional):
+    """
+    Compile one node of the ``match`` section of a YAML file (and everything
+    below it) into a rule.
+
+    :param key: The type of check, one of the keys of RULE_TYPES
+    :param conditional: The value of the node in the YAML file
+    :return: MatchRule
+    """
+    if key not in RULE_TYPES:
+        raise ValueError('Unknown match rule "{}"'.format(key))
+
+    rule_type = RULE_TYPES[key]
+
+    if rule_type in (AllRule, AnyRule):
+        return rule_type([compile_rule(k, v) for k, v in conditional.items()])
+    elif rule_type is ExtensionNamesRule:
+        return rule_type(conditional)
+    else:
+        return rule_type(conditional['header_key'], conditional['value'])
+
+
+class ConfigurationIndex:
+    """
+    Index of data configurations keyed on a header value each of them
+    requires (e.g. TELESCOP, INSTRUME or HDUCLASS), so only the configurations
+    that could possibly match a file have their rules evaluated.
+    """
+
+    def __init__(self):
+        # {header_key: {value: [configurations]}}
+        self._indexed = {}
+        # Configurations that do not require any specific header value
+        self._unindexed = []
+        # Candidates already worked out for a header scan
+        self._candidates = weakref.WeakKeyDictionary()
+
+    def add(self, configuration, rule):
+        """
+        Add a configuration to the index.
+
+        :param configuration: The data configuration
+        :param rule: The compiled MatchRule of the configuration
+        """
+        for header_key, value in rule.required_values():
+            try:
+                self._indexed.setdefault(header_key, {}).setdefault(value, []).append(configuration)
+                break
+            except TypeError:
+                # Unhashable value, try the next requirement
+                continue
+        else:
+            self._unindexed.append(configuration)
+        self._candidates.clear()
+
+    def candidates(self, header_scan):
+        """
+        The configurations that could match the file the headers come from.
+
+        :param header_scan: HeaderScan
+        :return: set of data configurations
+        """
+        if header_scan not in self._candidates:
+            header = header_scan.primary_header
+            candidates = set(self._unindexed)
+            for header_key, by_value in self._indexed.items():
+                value = header.get(header_key, None)
+                try:
+                    candidates.update(by_value.get(value, []))
+                except TypeError:
+                    # Unhashable header value, can't be in the index
+                    pass
+            self._candidates[header_scan] = candidates
+        return self._candidates[header_scan]
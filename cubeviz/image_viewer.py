@@ -25,6 +25,11 @@ from glue.viewers.image.qt.layer_style_editor import ImageLayerStyleEditor
 from glue.viewers.common.qt.tool import Tool
 
 from .utils.contour import ContourSettings
+from .utils.contour_engine import ContourEngine
+from .utils.fast_composite import FastCompositeArray
+from .utils.hover_cache import HoverCache
+from .utils.pyramid import level_factor, level_view
+from .utils.slice_cache import SliceCache, DEFAULT_SLICE_CACHE_BYTES, DEFAULT_PREFETCH_SLICES
 
 CONTOUR_DEFAULT_NUMBER_OF_LEVELS = 8
 CONTOUR_MAX_NUMBER_OF_LEVELS = 1000
@@ -92,11 +97,44 @@ def only_draw_axes_images(ax):
 class CubevizImageLayerState(ImageLayerState):
     """
     Sub-class of ImageLayerState that includes the ability to include smoothing
-    on-the-fly.
+    on-the-fly, and caches the slices it shows.
     """
     preview_function = None
     slice_index_override = None
 
+    # Memory budget of the slice cache of each layer and number of slices
+    # read ahead of the slider, set to 0 to disable
+    slice_cache_bytes = DEFAULT_SLICE_CACHE_BYTES
+    prefetch_slices = DEFAULT_PREFETCH_SLICES
+
+    _slice_cache = None
+
+    # SliceService and ImagePyramids of the layout, set by CubevizImageViewer
+    slice_service = None
+    image_pyramids = None
+
+    @property
+    def slice_cache(self):
+        if self._slice_cache is None:
+            self._slice_cache = SliceCache(self.slice_cache_bytes, self.prefetch_slices)
+        return self._slice_cache
+
+    def _get_cached_slice(self, index, slices, transpose):
+        """
+        Get the full 2D image of a slice of a 3D cube through the slice
+        cache, and read the next slices in the background.
+        """
+        def load(slice_index):
+            full_view = list(slices)
+            full_view[0] = slice_index
+            image = self._get_image(view=full_view)
+            return image.transpose() if transpose else image
+
+        key = (self.attribute, transpose)
+        image = self.slice_cache.get(key, index, load)
+        self.slice_cache.prefetch(key, index, self.layer.shape[0], load)
+        return image
+
     def get_sliced_data(self, view=None):
         """
         Override and modify ImageLayerState.get_sliced_data.
@@ -105,6 +143,10 @@ class CubevizImageLayerState(ImageLayerState):
                 defined, apply the function to data before return.
             2)  If CubevizImageLayerState.slice_index_override is
                 defined, change slice index to that value
+            3)  Slices of 3D cubes are read through the slice cache,
+                and shared with the other viewers of the layout
+            4)  Zoomed-out views of 3D cubes are read from a
+                downsampled cube once the layout has built it
         :param view: image view
         :return: 2D np.ndarray
         """
@@ -112,6 +154,40 @@ class CubevizImageLayerState(ImageLayerState):
         full_view = slices
         if self.slice_index_override is not None:
             full_view[0] = self.slice_index_override
+
+        # The usual cube display: one spectral slice, no aggregation
+        if (len(full_view) == 3 and isinstance(full_view[0], (int, np.integer)) and
+                all(func is None for func in agg_func)):
+            index = int(full_view[0])
+
+            # Zoomed-out views of large images are drawn from a downsampled cube
+            factor = level_factor(view)
+            if factor > 1 and self.image_pyramids is not None and self.preview_function is None:
+                level = self.image_pyramids.get(self.layer, self.attribute, factor)
+                if level is not None:
+                    image = level[index].transpose() if transpose else level[index]
+                    shape = self.layer.shape[:0:-1] if transpose else self.layer.shape[1:]
+                    return image[level_view(view, factor, shape)]
+
+            def extract():
+                if self.slice_cache_bytes > 0:
+                    image = self._get_cached_slice(index, full_view, transpose)
+                else:
+                    full_view[0] = index
+                    image = self._get_image(view=full_view)
+                    image = image.transpose() if transpose else image
+                return image if view is None else image[view]
+
+            # Viewers showing the same slice share it
+            if self.slice_service is not None:
+                image = self.slice_service.get(self.layer, self.attribute, index, view, transpose, extract)
+            else:
+                image = extract()
+
+            if self.preview_function is not None:
+                return self.preview_function(image)
+            return image
+
         if view is not None and len(view) == 2:
             x_axis = self.viewer_state.x_att.axis
             y_axis = self.viewer_state.y_att.axis
@@ -161,6 +237,10 @@ class CubevizImageViewer(ImageViewer):
     def __init__(self,  *args, cubeviz_layout=None, **kwargs):
         super(CubevizImageViewer, self).__init__(*args, **kwargs)
         self.cubeviz_layout = cubeviz_layout
+
+        # Render single colormapped layers (the usual cube display) with a lookup table
+        self.axes._composite = FastCompositeArray()
+        self.axes._composite_image.set_data(self.axes._composite)
         self. _layer_style_widget_cls[CubevizImageLayerArtist] = ImageLayerStyleEditor
         self._synced_checkbox = None
         self._slice_index = None
@@ -173,6 +253,7 @@ class CubevizImageViewer(ImageViewer):
         self._coords_format_function = self._format_to_hex_string  # Function to format ra and dec
         self.x_mouse = None  # x position of mouse in pix
         self.y_mouse = None  # y position of mouse in pix
+        self._hover_cache = HoverCache()  # Slice and coordinates under the mouse
 
         self.is_contour_active = False  # Is contour being displayed
         self.is_contour_preview_active = False # Is contour in preview mode
@@ -180,6 +261,7 @@ class CubevizImageViewer(ImageViewer):
         self.contour_component = None  # component label for contour
         self.contour_settings = ContourSettings(self)  # ContourSettings
         self.contour_preview_settings = None  # Temporary ContourSettings
+        self._contour_engine = ContourEngine()  # Cached contours of cube slices
 
         self.is_smoothing_preview_active = False  # Smoothing preview flag
         self.smoothing_preview_title = ""
@@ -225,7 +307,11 @@ class CubevizImageViewer(ImageViewer):
             cls = self._scatter_artist
         else:
             cls = CubevizImageLayerArtist
-        return self.get_layer_artist(cls, layer=layer, layer_state=layer_state)
+        layer_artist = self.get_layer_artist(cls, layer=layer, layer_state=layer_state)
+        if cls is CubevizImageLayerArtist and self.cubeviz_layout is not None:
+            layer_artist.state.slice_service = self.cubeviz_layout.slice_service
+            layer_artist.state.image_pyramids = self.cubeviz_layout.image_pyramids
+        return layer_artist
 
     def _create_stats_axes(self, subset, mu, sigma):
         rect = 0.01, 0.88, 0.15, 0.12
@@ -246,9 +332,40 @@ class CubevizImageViewer(ImageViewer):
         sigma_text.set_text(r'$\sigma = {:.3}$'.format(sigma))
 
     def _calculate_stats(self, component, subset):
-        mask = subset.to_mask()[self._slice_index]
-        data = self._data[0][component][self._slice_index][mask]
-        return data.mean(), data.std()
+        data = self._data[0]
+        roi_statistics = self.cubeviz_layout.roi_statistics if self.cubeviz_layout is not None else None
+        if roi_statistics is None or data.ndim != 3:
+            mask = subset.to_mask()[self._slice_index]
+            values = data[component][self._slice_index][mask]
+            return values.mean(), values.std()
+
+        # Look up the statistics of all slices once they are computed
+        table = roi_statistics.get(data, component, subset)
+        if table is not None:
+            return table.mean[self._slice_index], table.std[self._slice_index]
+
+        # Until then, only mask the current slice
+        mask = roi_statistics.mask(subset)
+        if mask is None:
+            mask = subset.to_mask(view=(self._slice_index,))
+        values = data[component, (self._slice_index,)][mask]
+        return np.nanmean(values), np.nanstd(values)
+
+    def stats_spectrum(self):
+        """
+        Statistics of the subset shown in the stats overlay at every slice.
+        :return: astropy.table.Table with the wavelength, mean, std and
+                 number of spaxels of each slice, or None if no stats are shown
+        """
+        if self._stats_axes is None or self._stats_hidden or self.cubeviz_layout is None:
+            return None
+
+        data = self._data[0]
+        table = self.cubeviz_layout.roi_statistics.wait(data, self._component, self._subset)
+        wavelengths = self.cubeviz_layout.get_wavelengths()
+        return table.to_table(wavelengths=wavelengths,
+                              wavelength_unit=self.cubeviz_layout.get_wavelengths_units(),
+                              unit=data.get_component(self._component).units)
 
     def draw_stats_axes(self, component, subset):
 
@@ -396,6 +513,19 @@ class CubevizImageViewer(ImageViewer):
         else:
             self.axes.figure.canvas.draw()
 
+    def invalidate_caches(self):
+        """
+        Drop the slices cached by the layers, the contours and the slice
+        under the mouse, e.g. when the values of the data change or a
+        component is removed.
+        """
+        for layer in self.layers:
+            if isinstance(layer, CubevizImageLayerArtist):
+                layer.state.slice_cache.clear()
+        self._contour_engine.clear()
+        self._hover_cache.clear()
+        self.axes._composite_image.invalidate_cache()
+
     def toggle_hidden_axes(self, is_axes_hidden):
         """
         Opertations to execute when axes is hidden/shown.
@@ -428,24 +558,45 @@ class CubevizImageViewer(ImageViewer):
             arr = data[self.contour_component][self.slice_index]
         return arr
 
-    def draw_contour(self, draw=True):
-        self._delete_contour()
-
-        if len(self.visible_layers()) == 0:
-            return
+    def get_contour_limits(self, arr):
+        """
+        NaN-aware minimum and maximum of the contour array. For the slices of
+        a cube they are looked up in the slice statistics of the layout once
+        those are computed, instead of being computed on each draw.
+        :param arr: the contour array, see get_contour_array
+        :return: (vmin, vmax)
+        """
+        table = None
+        if self.cubeviz_layout is not None and not self.has_2d_data and self.slice_index is not None:
+            data = self.state.layers_data[0]
+            if self.contour_component is None:
+                layer_artist = self.first_visible_layer()
+                # The smoothing preview changes the values of the slice
+                if layer_artist.state.preview_function is None:
+                    table = self.cubeviz_layout.slice_statistics.get(data, layer_artist.state.attribute)
+            else:
+                table = self.cubeviz_layout.slice_statistics.get(data, data.id[self.contour_component])
 
-        if self.is_contour_preview_active:
-            settings = self.contour_preview_settings
+        if table is not None:
+            vmin, vmax = table.limits(self.slice_index)
         else:
-            settings = self.contour_settings
+            vmin, vmax = np.nanmin(arr), np.nanmax(arr)
+        return vmin, vmax
 
-        arr = self.get_contour_array()
-
-        vmax = np.nanmax(arr)
+    @staticmethod
+    def _contour_levels(settings, data_min, data_max):
+        """
+        Contour levels of the settings for a slice with the given limits.
+        :param settings: ContourSettings
+        :param data_min: float: minimum of the slice
+        :param data_max: float: maximum of the slice
+        :return: (levels, spacing)
+        """
+        vmax = data_max
         if settings.vmax is not None:
             vmax = settings.vmax
 
-        vmin = np.nanmin(arr)
+        vmin = data_min
         if settings.vmin is not None:
             vmin = settings.vmin
 
@@ -458,6 +609,72 @@ class CubevizImageViewer(ImageViewer):
 
         levels = np.arange(vmin, vmax, spacing)
         levels = np.append(levels, vmax)
+        return levels, spacing
+
+    def _contour_source(self):
+        """
+        What the contours are drawn from, if they can go through the contour
+        engine: a slice of a cube component without a smoothing preview.
+        :return: (data, component_id, transpose) or None
+        """
+        if self.has_2d_data or self.slice_index is None:
+            return None
+
+        data = self.state.layers_data[0]
+        if data.ndim != 3:
+            return None
+
+        if self.contour_component is None:
+            state = self.first_visible_layer().state
+            if state.preview_function is not None:
+                return None
+            slices, agg_func, transpose = self.state.numpy_slice_aggregation_transpose
+            if any(func is not None for func in agg_func):
+                return None
+            return data, state.attribute, transpose
+        return data, data.id[self.contour_component], False
+
+    def _prefetch_contours(self, source, settings):
+        """
+        Compute the contours of the slices next to the shown one in the background.
+        """
+        data, component_id, transpose = source
+        slice_statistics = self.cubeviz_layout.slice_statistics if self.cubeviz_layout is not None else None
+
+        def get_image_levels(index):
+            image = np.asarray(data[component_id, (index,)])
+            if transpose:
+                image = image.transpose()
+
+            table = slice_statistics.get(data, component_id, start=False) if slice_statistics else None
+            if table is not None:
+                data_min, data_max = table.limits(index)
+            else:
+                data_min, data_max = np.nanmin(image), np.nanmax(image)
+
+            levels, _ = self._contour_levels(settings, data_min, data_max)
+            if levels.size > CONTOUR_MAX_NUMBER_OF_LEVELS or not np.all(np.isfinite(levels)):
+                return None
+            return image, levels
+
+        self._contour_engine.prefetch((component_id, transpose), self.slice_index,
+                                      data.shape[0], get_image_levels)
+
+    def draw_contour(self, draw=True):
+        self._delete_contour()
+
+        if len(self.visible_layers()) == 0:
+            return
+
+        if self.is_contour_preview_active:
+            settings = self.contour_preview_settings
+        else:
+            settings = self.contour_settings
+
+        arr = self.get_contour_array()
+        data_min, data_max = self.get_contour_limits(arr)
+
+        levels, spacing = self._contour_levels(settings, data_min, data_max)
 
         if levels.size > CONTOUR_MAX_NUMBER_OF_LEVELS:
             message = "The current contour spacing is too small and " \
@@ -469,17 +686,24 @@ class CubevizImageViewer(ImageViewer):
             settings.data_spacing = spacing
             if settings.dialog is not None:
                 settings.dialog.custom_spacing_checkBox.setChecked(False)
-            spacing = (vmax - vmin)/CONTOUR_DEFAULT_NUMBER_OF_LEVELS
-            levels = np.arange(vmin, vmax, spacing)
-            levels = np.append(levels, vmax)
-
-        self.contour = self.axes.contour(arr, levels=levels, **settings.options)
+            levels, spacing = self._contour_levels(settings, data_min, data_max)
+
+        # Contour labels need a matplotlib ContourSet, the contours of cube
+        # slices are otherwise computed (and cached) by the contour engine
+        source = None if settings.add_contour_label else self._contour_source()
+        if source is not None:
+            data, component_id, transpose = source
+            self.contour = self._contour_engine.draw(self.axes, (component_id, transpose), self.slice_index,
+                                                     arr, levels, settings.options)
+            self._prefetch_contours(source, settings)
+        else:
+            self.contour = self.axes.contour(arr, levels=levels, **settings.options)
 
         if settings.add_contour_label:
             self.axes.clabel(self.contour, fontsize=settings.font_size)
 
-        settings.data_max = arr.max()
-        settings.data_min = arr.min()
+        settings.data_max = data_max
+        settings.data_min = data_min
         settings.data_spacing = spacing
         if settings.dialog is not None:
             settings.update_dialog()
@@ -529,8 +753,7 @@ class CubevizImageViewer(ImageViewer):
         :return: settings UI
         """
         arr = self.get_contour_array()
-        vmax = arr.max()
-        vmin = arr.min()
+        vmin, vmax = self.get_contour_limits(arr)
         spacing = 1
         if vmax != vmin:
             spacing = (vmax - vmin)/CONTOUR_DEFAULT_NUMBER_OF_LEVELS
@@ -819,21 +1042,27 @@ class CubevizImageViewer(ImageViewer):
         # If viewer has a layer.
         if len(self.visible_layers()) > 0:
 
-            arr = self.first_visible_layer().state.get_sliced_data()
+            # The slice is only extracted again when it changes
+            state = self.first_visible_layer().state
+            transpose = self.state.y_att.axis > self.state.x_att.axis
+            key = (id(state), id(state.attribute), self._slice_index, transpose,
+                   state.slice_index_override, id(state.preview_function))
+            arr = self._hover_cache.get_slice(key, state.get_sliced_data)
 
             if 0 <= y < arr.shape[0] and 0 <= x < arr.shape[1]:
                 # if x and y are in bounds. Note: x and y are swapped in array.
                 # get value and check if wcs is obtainable
                 # WCS:
-                if len(self.figure.axes) > 0:
-                    wcs = self.figure.axes[0].wcs.celestial
+                if len(self.figure.axes) > 0 and self.figure.axes[0].wcs is not None:
+                    wcs = self._hover_cache.celestial(self.figure.axes[0].wcs)
                     if wcs is not None:
                         # Check the number of axes in the WCS and add to string
                         ra = dec = None
                         if wcs.naxis == 3 and self.slice_index is not None:
                             ra, dec, wave = wcs.wcs_pix2world([[x, y, self._slice_index]], 0)[0]
                         elif wcs.naxis == 2:
-                            ra, dec = wcs.wcs_pix2world([[x, y]], 0)[0]
+                            # Looked up in tiles of coordinates computed at once
+                            ra, dec = self._hover_cache.world(self.figure.axes[0].wcs, x, y)
 
                         if ra is not None and dec is not None:
                             string = string + " " + self._coords_format_function(ra, dec)
@@ -27,6 +27,17 @@ def move_slider_right(session):
     curr_layout.change_slice_index(1)
 
 
+@keyboard_shortcut(QtCore.Qt.Key_Space, None)
+def toggle_slice_playback(session):
+    """
+    Start or stop playing through the slices
+    :param session:
+    :return:
+    """
+    curr_layout = session.application.current_tab.ui
+    curr_layout.toggle_playback()
+
+
 @keyboard_shortcut(QtCore.Qt.Key_F, None)
 def lock_coordinates(session):
     """
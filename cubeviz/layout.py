@@ -25,9 +25,10 @@ from .image_viewer import CubevizImageViewer
 from .controls.slice import SliceController
 from .controls.overlay import OverlayController
 from .controls.units import UnitController
-from .tools import arithmetic_gui, moment_maps, smoothing
-from .tools import collapse_cube
-from .tools.spectral_operations import SpectralOperationHandler
+from .utils.slice_service import SliceService
+from .utils.slice_stats import SliceStatistics
+from .utils.roi_stats import ROIStatistics
+from .utils.pyramid import ImagePyramids
 
 
 DEFAULT_NUM_SPLIT_VIEWERS = 3
@@ -84,6 +85,17 @@ class CubeVizLayout(QtWidgets.QWidget):
 
         self.cube_views = []
 
+        # Slices extracted by one viewer are shared with the others showing
+        # the same data
+        self.slice_service = SliceService()
+
+        # Per-slice statistics of the components, computed in the background
+        self.slice_statistics = SliceStatistics()
+        self.roi_statistics = ROIStatistics()
+
+        # Downsampled cubes for drawing zoomed-out views of large images
+        self.image_pyramids = ImagePyramids()
+
         # Create the cube viewers and register to the hub.
         for _ in range(DEFAULT_NUM_SPLIT_VIEWERS + 1):
             ww = WidgetWrapper(CubevizImageViewer(
@@ -183,6 +195,8 @@ class CubeVizLayout(QtWidgets.QWidget):
             ('Hide Axes', ['checkable', self._toggle_viewer_axes]),
             ('Hide Toolbars', ['checkable', self._toggle_toolbars]),
             ('Hide Stats', ['checkable', self._toggle_stats_display]),
+            ('Play/Pause Slices', self.toggle_playback),
+            ('Channel Map', lambda: self._open_dialog('Channel Map', None)),
             ('Wavelength Units', lambda: self._open_dialog('Wavelength Units', None))
         ]))
 
@@ -208,7 +222,9 @@ class CubeVizLayout(QtWidgets.QWidget):
             ('Collapse Cube', lambda: self._open_dialog('Collapse Cube', None)),
             ('Spatial Smoothing', lambda: self._open_dialog('Spatial Smoothing', None)),
             ('Moment Maps', lambda: self._open_dialog('Moment Maps', None)),
-            ('Arithmetic Operations', lambda: self._open_dialog('Arithmetic Operations', None))
+            ('Arithmetic Operations', lambda: self._open_dialog('Arithmetic Operations', None)),
+            ('Export Cube', lambda: self._open_dialog('Export Cube', None)),
+            ('Export Movie', lambda: self._open_dialog('Export Movie', None))
         ]))
         self.ui.cube_option_button.setMenu(cube_menu)
 
@@ -283,6 +299,11 @@ class CubeVizLayout(QtWidgets.QWidget):
 
     def _open_dialog(self, name, widget):
 
+        # The tools are imported on first use (or warmed up in the background),
+        # not when cubeviz starts.
+        from .tools import (arithmetic_gui, channel_map, collapse_cube, export_cube, export_movie,
+                            moment_maps, smoothing)
+
         if name == 'Collapse Cube':
             ex = collapse_cube.CollapseCube(self._data, parent=self, allow_preview=True)
 
@@ -297,6 +318,20 @@ class CubeVizLayout(QtWidgets.QWidget):
                 self._data, self.session.data_collection, parent=self)
             mm_gui.display()
 
+        if name == 'Channel Map':
+            cm_gui = channel_map.ChannelMapGUI(self, parent=self)
+            cm_gui.display()
+
+        if name == 'Export Cube':
+            # Keep a reference while the export runs in the background
+            self._export_cube = export_cube.ExportCube(self._data, parent=self)
+            self._export_cube.display()
+
+        if name == 'Export Movie':
+            # Keep a reference while the movie is rendered in the background
+            self._export_movie = export_movie.ExportMovie(self, parent=self)
+            self._export_movie.display()
+
         if name == 'Wavelength Units':
             current_unit = self._units_controller.units_titles.index(self._units_controller._new_units.long_names[0].title())
             wavelength, ok_pressed = QInputDialog.getItem(self, "Pick a wavelength", "Wavelengths:", self._units_controller.units_titles, current_unit, False)
@@ -337,6 +372,8 @@ class CubeVizLayout(QtWidgets.QWidget):
         operations that may be applied to the entire cube.
         """
 
+        from .tools.spectral_operations import SpectralOperationHandler
+
         # Retrieve the current cube data object
         operation_handler = SpectralOperationHandler(self._data,
                                                      stack=stack,
@@ -345,7 +382,26 @@ class CubeVizLayout(QtWidgets.QWidget):
         operation_handler.exec_()
 
     def remove_data_component(self, component_id):
-        pass
+        self.slice_statistics.invalidate(component_id)
+        self.roi_statistics.invalidate(component_id)
+        self.image_pyramids.invalidate(component_id)
+        self._invalidate_viewer_caches()
+
+    def update_data_values(self, data):
+        """
+        The values of the data changed: drop everything computed from them.
+        """
+        if data is not self._data:
+            return
+        self.slice_statistics.invalidate()
+        self.roi_statistics.invalidate()
+        self.image_pyramids.invalidate()
+        self._invalidate_viewer_caches()
+
+    def _invalidate_viewer_caches(self):
+        self.slice_service.clear()
+        for view in self.cube_views:
+            view._widget.invalidate_caches()
 
     def _enable_option_buttons(self):
         for button in self._option_buttons:
@@ -727,6 +783,9 @@ class CubeVizLayout(QtWidgets.QWidget):
     def change_slice_index(self, amount):
         self._slice_controller.change_slider_value(amount)
 
+    def toggle_playback(self):
+        self._slice_controller.toggle_playback()
+
     def get_wavelengths(self):
         return self._wavelengths
 
@@ -3,8 +3,7 @@
 from glue.core import Hub, HubListener, Data, DataCollection
 from glue.core.message import (DataCollectionAddMessage, SettingsChangeMessage,
                                DataRemoveComponentMessage, SubsetMessage,
-                               DataAddComponentMessage)
-from .layout import CubeVizLayout
+                               DataAddComponentMessage, NumericalDataChangedMessage)
 
 
 CUBEVIZ_LAYOUT = 'cubeviz_layout'
@@ -13,6 +12,10 @@ CUBEVIZ_LAYOUT = 'cubeviz_layout'
 class CubevizManager(HubListener):
 
     def __init__(self, session):
+        # The layout (with specviz) is only imported once the application is started,
+        # so the data factories can import this module cheaply.
+        from .layout import CubeVizLayout
+
         self._session = session
         self._hub = session.hub
         self._app = session.application
@@ -32,6 +35,8 @@ class CubevizManager(HubListener):
             self, SettingsChangeMessage, handler=self.handle_settings_change)
         self._hub.subscribe(
             self, DataRemoveComponentMessage, handler=self.handle_remove_component)
+        self._hub.subscribe(
+            self, NumericalDataChangedMessage, handler=self.handle_data_values_change)
         self._hub.subscribe(
             self, SubsetMessage, handler=self.handle_subset_message)
 
@@ -46,6 +51,8 @@ class CubevizManager(HubListener):
             self.configure_layout(data)
 
     def configure_layout(self, data):
+        from .layout import CubeVizLayout
+
         # Assume for now the data is not yet in any tab
         if self._empty_layout is not None:
             cubeviz_layout = self._empty_layout
@@ -63,6 +70,10 @@ class CubevizManager(HubListener):
     def handle_remove_component(self, message):
         self._layout.remove_data_component(message.component_id)
 
+    def handle_data_values_change(self, message):
+        if self._layout is not None:
+            self._layout.update_data_values(message.data)
+
     def handle_settings_change(self, message):
         if self._layout is not None:
             self._layout.handle_settings_change(message)
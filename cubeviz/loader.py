@@ -0,0 +1,132 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Loading of the data files given on the command line in a background thread,
+so the cubeviz window comes up straight away rather than after the cubes
+have been decoded.
+
+Loading is done in two passes. First every file is opened memory-mapped,
+which only reads the headers, so the data (with its WCS and wavelength axis)
+can be added to the data collection and the layout and slice slider can be
+used. Then the memory-mapped components are read into memory in chunks of
+slices, with progress reported, and swapped into the data as each one
+completes. Cancelling the second pass simply leaves the remaining components
+memory-mapped. In lazy mode (--lazy-load) there is no second pass, the
+components stay memory-mapped and slices are read as they are displayed.
+"""
+import logging
+
+import numpy as np
+
+from qtpy.QtCore import QThread, Signal
+
+from glue.core.data_factories import find_factory, load_data
+
+from .data_factories import DataConfiguration
+from .utils.memmap import is_memory_mapped
+
+__all__ = ['DataLoaderThread', 'AbortException']
+
+logger = logging.getLogger('cubeviz_data_configuration')
+
+# Number of slices read from disk at a time when a component is read into memory
+LOAD_CHUNK_SLICES = 64
+
+
+class AbortException(Exception):
+    """
+    Custom exception to indicate the loading was cancelled.
+    """
+    pass
+
+
+class DataLoaderThread(QThread):
+    """
+    Custom QThread that loads the data files for cubeviz.main.
+    """
+
+    data_signal = Signal(object)  # Data (metadata and memory-mapped components) for one file
+    component_signal = Signal(object, object, object)  # data, component id, array read into memory
+    progress_signal = Signal(str, int, int)  # Message, value, maximum
+    error_signal = Signal(Exception)  # Loading failed
+
+    def __init__(self, data_filenames, lazy=False, parent=None):
+        """
+        :param data_filenames: list of str: Files to load, each may be several comma-separated files
+        :param lazy: bool: Keep the components memory-mapped instead of reading them into memory
+        :param parent:
+        """
+        super(DataLoaderThread, self).__init__(parent)
+        self.data_filenames = data_filenames
+        self.lazy = lazy
+        self.abort_flag = False
+
+    def abort(self):
+        """
+        Stop loading. Data already sent on is kept.
+        """
+        self.abort_flag = True
+
+    def _check_abort(self):
+        if self.abort_flag:
+            raise AbortException("Abort Loading")
+
+    def run(self):
+        try:
+            datasets = []
+            for data_filename in self.data_filenames:
+                self._check_abort()
+                for data in self._load_metadata(data_filename):
+                    datasets.append(data)
+                    self.data_signal.emit(data)
+
+            if not self.lazy:
+                for data in datasets:
+                    self._read_components(data)
+        except Exception as e:
+            if not isinstance(e, AbortException):
+                self.error_signal.emit(e)
+
+    def _load_metadata(self, data_filename):
+        """
+        Open the file with the components memory-mapped.
+
+        :param data_filename: str: The file to load
+        :return: list of Data
+        """
+        self.progress_signal.emit('Opening {}'.format(data_filename), 0, 0)
+
+        factory = find_factory(data_filename)
+        configuration = getattr(factory, '__self__', None)
+
+        if isinstance(configuration, DataConfiguration):
+            data = load_data(data_filename, factory=factory, lazy=True,
+                             progress=lambda *args: self._check_abort())
+        else:
+            # Not a cubeviz data configuration, e.g. a user supplied glue loader
+            data = load_data(data_filename, factory=factory)
+
+        return data if isinstance(data, list) else [data]
+
+    def _read_components(self, data):
+        """
+        Read the memory-mapped components of the data into memory.
+
+        :param data: Data
+        """
+        for cid in data.main_components:
+            array = data.get_component(cid).data
+            if not is_memory_mapped(array):
+                continue
+
+            message = 'Reading {} of {}'.format(cid.label, data.label)
+            n_slices = array.shape[0]
+
+            loaded = np.empty(array.shape, dtype=array.dtype.newbyteorder('='))
+            for start in range(0, n_slices, LOAD_CHUNK_SLICES):
+                self._check_abort()
+                self.progress_signal.emit(message, start, n_slices)
+                loaded[start:start + LOAD_CHUNK_SLICES] = array[start:start + LOAD_CHUNK_SLICES]
+
+            logger.debug('Read {} into memory'.format(cid.label))
+            self.component_signal.emit(data, cid, loaded)
+            self.progress_signal.emit(message, n_slices, n_slices)
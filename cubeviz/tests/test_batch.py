@@ -0,0 +1,40 @@
+import os
+import json
+
+from astropy.io import fits
+
+from ..batch import process_file, main
+from ..data_factories import DataFactoryConfiguration
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'data_cube.fits.gz')
+
+
+def test_process_file(tmpdir):
+
+    DataFactoryConfiguration()
+
+    output_dir = tmpdir.strpath
+    summary = process_file(TEST_DATA_PATH, collapse=[('Median', 100, 200)], moments=[0],
+                           smooth=[('box', 'spatial', 3)], output_dir=output_dir)
+
+    assert summary['status'] == 'ok'
+    assert summary['component'] == '018.DATA'
+    assert [product['product'] for product in summary['products']] == [
+        'collapse-Median-100-200', 'moment-0', 'smooth-box-spatial-3']
+
+    assert fits.getdata(os.path.join(output_dir, 'data_cube_moment-0.fits')).shape == (17, 17)
+    assert fits.getdata(os.path.join(output_dir, 'data_cube_collapse-Median-100-200.fits')).shape == (17, 17)
+    assert fits.getdata(os.path.join(output_dir, 'data_cube_smooth-box-spatial-3.fits')).shape == (2048, 17, 17)
+
+
+def test_missing_file_summary(tmpdir):
+
+    summary = tmpdir.join('summary.json').strpath
+    missing = tmpdir.join('missing.fits').strpath
+
+    assert main(['cubeviz-batch', '--moment', '0', '--workers', '1', '--output-dir', tmpdir.strpath,
+                 '--summary', summary, missing]) == 1
+
+    with open(summary) as fp:
+        result = json.load(fp)
+    assert result['failed'] == [missing]
@@ -1,8 +1,19 @@
 import os
 
+import numpy as np
+import pytest
+from astropy.io import fits
+
 from glue.core.data_factories import find_factory
 
-from ..data_factories import DataFactoryConfiguration, cubeviz_fits_exporter
+from ..data_factories import (DataFactoryConfiguration, DataConfiguration, DEFAULT_DATA_CONFIGS,
+                              cubeviz_fits_exporter)
+from ..data_factories.cache import DecodedCubeCache
+from ..data_factories.compressed import CompressedCubeArray
+from ..data_factories.cutout import Cutout
+from ..data_factories.header_scan import scan_headers
+from ..data_factories.match_rules import compile_rule, ConfigurationIndex
+from ..utils.memmap import is_memory_mapped
 
 TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'data_cube.fits.gz')
 
@@ -30,3 +41,291 @@ def test_export_roundtrip(tmpdir):
     # And check that we identify the file correctly again
     factory = find_factory(filename)
     assert factory.__self__.name == 'kmos'
+
+
+def test_lazy_load(tmpdir):
+
+    DataFactoryConfiguration()
+
+    # Gzipped files can't be memory-mapped, so write out an uncompressed copy
+    filename = tmpdir.join('data_cube.fits').strpath
+    with fits.open(TEST_DATA_PATH) as hdulist:
+        hdulist.writeto(filename)
+
+    factory = find_factory(filename)
+    eager_data = factory(filename)
+    lazy_data = factory(filename, lazy=True)
+
+    for label in ['018.DATA', '018.NOISE']:
+        lazy_array = lazy_data.get_component(label).data
+        assert is_memory_mapped(lazy_array)
+        np.testing.assert_array_equal(lazy_array[100], eager_data[label][100])
+
+
+def test_header_scan():
+
+    header_scan = scan_headers(TEST_DATA_PATH)
+    assert header_scan.extension_names == ['018.DATA', '018.NOISE']
+    assert header_scan.has_extension('018.data')
+    assert header_scan.primary_header['INSTRUME'] == 'KMOS'
+
+    # Every data configuration shares the same scan of an unchanged file
+    assert scan_headers(TEST_DATA_PATH) is header_scan
+
+
+def test_configuration_index():
+
+    header_scan = scan_headers(TEST_DATA_PATH)
+
+    kmos = compile_rule('all', {'equal': {'header_key': 'TELESCOP', 'value': 'ESO-VLT-U1'},
+                                'extension_names': ['018.DATA', '018.NOISE']})
+    manga = compile_rule('all', {'equal': {'header_key': 'TELESCOP', 'value': 'SDSS 2.5-M'}})
+    other = compile_rule('all', {'startswith': {'header_key': 'INSTRUME', 'value': 'KMO'}})
+
+    index = ConfigurationIndex()
+    for name, rule in [('kmos', kmos), ('manga', manga), ('other', other)]:
+        index.add(name, rule)
+
+    # MaNGA requires a different telescope so is never evaluated
+    assert index.candidates(header_scan) == {'kmos', 'other'}
+    assert kmos(header_scan) and other(header_scan)
+    assert not manga(header_scan)
+
+
+def test_storage_dtype():
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+    data = factory(TEST_DATA_PATH)
+
+    # The KMOS configuration stores the cube as float32 rather than float64
+    for label in ['018.DATA', '018.NOISE']:
+        assert data[label].dtype == np.float32
+
+
+def test_parallel_load(tmpdir):
+
+    # Write a second copy of the cube with different extension names
+    filename = tmpdir.join('other.fits').strpath
+    with fits.open(TEST_DATA_PATH) as hdulist:
+        for hdu in hdulist[1:]:
+            hdu.header['EXTNAME'] = 'OTHER.' + hdu.header['EXTNAME']
+        hdulist.writeto(filename)
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+
+    progress = []
+    data = factory(','.join([TEST_DATA_PATH, filename]),
+                   progress=lambda *args: progress.append(args), max_workers=2)
+
+    # The components are added in file order, whichever file is read first
+    labels = [cid.label for cid in data.main_components]
+    assert labels == ['018.DATA', '018.NOISE', 'OTHER.018.DATA', 'OTHER.018.NOISE']
+    np.testing.assert_array_equal(data['018.DATA'], data['OTHER.018.DATA'])
+
+    assert sorted(progress) == [(TEST_DATA_PATH, 1, 2), (TEST_DATA_PATH, 2, 2),
+                                (filename, 1, 2), (filename, 2, 2)]
+
+
+def test_decoded_cube_cache(tmpdir):
+
+    cache_dir = tmpdir.join('cache').strpath
+
+    config_file = os.path.join(DEFAULT_DATA_CONFIGS, 'kmos.yaml')
+    cache = DecodedCubeCache(cache_dir)
+    dc = DataConfiguration(config_file, cache=cache)
+    data = dc.load_data(TEST_DATA_PATH)
+
+    # The first load fills the cache in the background, the second reads the decoded cube from it
+    cache.wait()
+    assert len(os.listdir(cache_dir)) == 1
+    cached = dc.load_data(TEST_DATA_PATH, lazy=True)
+
+    for label in ['018.DATA', '018.NOISE']:
+        assert is_memory_mapped(cached.get_component(label).data)
+        assert cached[label].dtype == np.float32
+        np.testing.assert_array_equal(cached[label], data[label])
+    assert cached.coords.wcs.to_header() == data.coords.wcs.to_header()
+
+    # Another storage dtype policy has its own entry
+    dc._dtypes = {'018.DATA': np.dtype(np.float64)}
+    assert cache.get(TEST_DATA_PATH, dc.name, dtypes=dc._dtypes) is None
+    converted = dc.load_data(TEST_DATA_PATH)
+    assert converted['018.DATA'].dtype == np.float64
+    cache.wait()
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_decoded_cube_cache_streams(tmpdir, monkeypatch):
+
+    from ..data_factories import cache as cache_module
+
+    # Write a few slices at a time
+    monkeypatch.setattr(cache_module, 'WRITE_CHUNK_BYTES', 3 * 4 * 5 * 4)
+
+    source = tmpdir.join('cube.fits').strpath
+    cube = np.random.random((10, 4, 5)).astype('>f4')
+    fits.writeto(source, cube)
+
+    cache = DecodedCubeCache(tmpdir.join('cache').strpath)
+    with fits.open(source, memmap=True) as hdulist:
+        future = cache.put(source, 'test', [('FLUX', hdulist[0].data, hdulist[0].header)])
+        future.result()
+
+    (name, array, header), = cache.get(source, 'test')
+    assert isinstance(array, np.memmap)
+    assert array.dtype == np.dtype('=f4')
+    np.testing.assert_array_equal(array, cube)
+
+
+def test_export_copies_original_hdus(tmpdir):
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+    data = factory(TEST_DATA_PATH)
+    data.add_component(data['018.DATA'] * 2, label='DOUBLED')
+
+    filename = tmpdir.join('test.fits').strpath
+    progress = []
+    cubeviz_fits_exporter(filename, data, progress=lambda *args: progress.append(args))
+
+    assert progress[-1][0] == progress[-1][1]
+
+    with fits.open(TEST_DATA_PATH) as original, fits.open(filename) as exported:
+        exported.verify('exception')
+        assert [hdu.name for hdu in exported] == ['PRIMARY', '018.DATA', '018.NOISE', 'DOUBLED']
+
+        # Unchanged HDUs are copied as they were in the original file
+        for name in ['PRIMARY', '018.DATA', '018.NOISE']:
+            assert exported[name].header == original[name].header
+        np.testing.assert_array_equal(exported['018.DATA'].data, original['018.DATA'].data)
+
+        np.testing.assert_array_equal(exported['DOUBLED'].data, data['DOUBLED'])
+
+
+def test_export_case_insensitive_extname(tmpdir):
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+    data = factory(TEST_DATA_PATH)
+
+    # EXTNAMEs that only differ in case from the component labels are still copied, once
+    descriptor = data._cubeviz_export
+    descriptor.hdus = [(name.lower(),) + tuple(rest) for name, *rest in descriptor.hdus]
+
+    filename = tmpdir.join('test.fits').strpath
+    cubeviz_fits_exporter(filename, data)
+
+    with fits.open(TEST_DATA_PATH) as original, fits.open(filename) as exported:
+        assert [hdu.name for hdu in exported] == ['PRIMARY', '018.DATA', '018.NOISE']
+        assert exported['018.DATA'].header == original['018.DATA'].header
+
+
+def test_export_unsupported_dtype(tmpdir):
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+    data = factory(TEST_DATA_PATH)
+    data.add_component(data['018.DATA'] * 1j, label='COMPLEX')
+
+    with pytest.raises(ValueError) as exc:
+        cubeviz_fits_exporter(tmpdir.join('test.fits').strpath, data)
+    assert 'COMPLEX' in str(exc.value)
+
+
+def test_export_descriptor():
+
+    DataFactoryConfiguration()
+
+    factory = find_factory(TEST_DATA_PATH)
+    data = factory(TEST_DATA_PATH)
+
+    # Only the headers and byte ranges of the original file are kept for export
+    assert not hasattr(data, '_cubeviz_hdulist')
+    descriptor = data._cubeviz_export
+    assert descriptor.filename == os.path.abspath(TEST_DATA_PATH)
+    assert [name for name, _, _, _, _ in descriptor.hdus] == ['PRIMARY', '018.DATA', '018.NOISE']
+    assert [has_data for _, _, has_data, _, _ in descriptor.hdus] == [False, True, True]
+
+
+def test_compressed_cube(tmpdir):
+
+    # Write a losslessly tile-compressed copy of the cube, one tile per slice
+    filename = tmpdir.join('compressed.fits').strpath
+    with fits.open(TEST_DATA_PATH) as hdulist:
+        hdus = [hdulist[0].copy()]
+        for hdu in hdulist[1:]:
+            hdus.append(fits.CompImageHDU(hdu.data, hdu.header, compression_type='GZIP_2',
+                                          quantize_level=0, tile_shape=(1,) + hdu.data.shape[1:]))
+        fits.HDUList(hdus).writeto(filename)
+
+    config_file = os.path.join(DEFAULT_DATA_CONFIGS, 'kmos.yaml')
+    dc = DataConfiguration(config_file)
+    original = dc.load_data(TEST_DATA_PATH)
+    data = dc.load_data(filename)
+
+    # The compressed cube is only decompressed a slice or spectrum at a time
+    array = data.get_component('018.DATA').data
+    assert isinstance(array, CompressedCubeArray)
+    assert data.shape == original.shape
+
+    np.testing.assert_array_equal(data['018.DATA', 100], original['018.DATA', 100])
+    np.testing.assert_array_equal(data['018.NOISE', :, 5, 7], original['018.NOISE', :, 5, 7])
+    assert list(array._cache) == [100]
+
+
+def test_asdf_cube(tmpdir):
+
+    asdf = pytest.importorskip('asdf')
+
+    flux = np.random.random((30, 5, 6)).astype(np.float32)
+    wcsinfo = {'wcsaxes': 3, 'ctype1': 'RA---TAN', 'ctype2': 'DEC--TAN', 'ctype3': 'WAVE',
+               'cunit1': 'deg', 'cunit2': 'deg', 'cunit3': 'um', 'crpix1': 3.0, 'crpix2': 3.0,
+               'crpix3': 1.0, 'crval1': 10.0, 'crval2': -5.0, 'crval3': 1.5, 'cdelt1': -1e-5,
+               'cdelt2': 1e-5, 'cdelt3': 0.001}
+    tree = {'meta': {'telescope': 'JWST', 'model_type': 'IFUCubeModel', 'wcsinfo': wcsinfo,
+                     'bunit_data': 'MJy/sr'},
+            'data': flux, 'err': flux / 10, 'dq': np.zeros(flux.shape, dtype=np.uint32)}
+    filename = tmpdir.join('cube.asdf').strpath
+    asdf.AsdfFile(tree).write_to(filename)
+
+    header_scan = scan_headers(filename)
+    assert header_scan.primary_header['TELESCOP'] == 'JWST'
+    assert header_scan.extension_names == ['data', 'err', 'dq']
+
+    config_file = os.path.join(DEFAULT_DATA_CONFIGS, 'jwst-asdf.yaml')
+    dc = DataConfiguration(config_file)
+    assert dc.matches(filename)
+
+    data = dc.load_data(filename, lazy=True)
+    assert [cid.label for cid in data.main_components] == ['data', 'err', 'dq']
+    assert data['dq'].dtype == np.uint32
+    np.testing.assert_array_equal(data['data'], flux)
+    assert data.coords.wcs.wcs.ctype[2] == 'WAVE'
+
+
+def test_cutout(tmpdir):
+
+    config_file = os.path.join(DEFAULT_DATA_CONFIGS, 'kmos.yaml')
+    dc = DataConfiguration(config_file)
+    full = dc.load_data(TEST_DATA_PATH)
+
+    data = dc.load_data(TEST_DATA_PATH, wavelength_range=(2.0, 2.1), spatial_bbox=(2, 10, 3, 12))
+    slices = Cutout(wavelength_range=(2.0, 2.1)).slices(
+        fits.getheader(TEST_DATA_PATH, 1), full.shape)
+
+    assert data.shape == (slices[0].stop - slices[0].start, 9, 8)
+    np.testing.assert_array_equal(data['018.NOISE'], full['018.NOISE'][slices[0], 3:12, 2:10])
+
+    # The WCS of the cutout gives the same world coordinates as the full cube
+    np.testing.assert_allclose(data.coords.pixel2world(0, 0, 0),
+                               full.coords.pixel2world(2, 3, slices[0].start))
+
+    # Only the cutout was loaded, so it is exported with glue's FITS writer
+    assert not hasattr(data, '_cubeviz_export')
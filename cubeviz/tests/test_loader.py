@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+
+from ..data_factories import DataFactoryConfiguration
+from ..loader import DataLoaderThread
+from ..utils.memmap import is_memory_mapped
+
+TEST_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'data_cube.fits.gz')
+
+
+def test_loader_thread(tmpdir):
+
+    # Gzipped files can't be memory-mapped, so use an uncompressed copy
+    filename = tmpdir.join('data_cube.fits').strpath
+    with fits.open(TEST_DATA_PATH) as hdulist:
+        hdulist.writeto(filename)
+
+    DataFactoryConfiguration()
+
+    loader = DataLoaderThread([filename])
+
+    datasets = []
+    components = []
+    loader.data_signal.connect(datasets.append)
+    loader.component_signal.connect(lambda *args: components.append(args))
+    loader.error_signal.connect(lambda e: datasets.append(e))
+
+    # Run in this thread so the signals are delivered straight away
+    loader.run()
+
+    assert len(datasets) == 1
+    data = datasets[0]
+    assert data.shape == (2048, 17, 17)
+    assert is_memory_mapped(data.get_component('018.DATA').data)
+
+    assert [cid.label for _, cid, _ in components] == ['018.DATA', '018.NOISE']
+    for _, cid, array in components:
+        assert not is_memory_mapped(array)
+        np.testing.assert_array_equal(array, data[cid])
+
+
+def test_loader_thread_lazy(tmpdir):
+
+    filename = tmpdir.join('data_cube.fits').strpath
+    with fits.open(TEST_DATA_PATH) as hdulist:
+        hdulist.writeto(filename)
+
+    DataFactoryConfiguration()
+
+    loader = DataLoaderThread([filename], lazy=True)
+
+    datasets = []
+    components = []
+    loader.data_signal.connect(datasets.append)
+    loader.component_signal.connect(lambda *args: components.append(args))
+
+    loader.run()
+
+    # The components stay memory-mapped
+    assert len(datasets) == 1
+    assert is_memory_mapped(datasets[0].get_component('018.DATA').data)
+    assert components == []
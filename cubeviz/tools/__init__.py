@@ -1 +1,50 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger('cubeviz_tools')
+
+# The tool modules and the heavy dependencies they need. These are not
+# imported at startup but when a tool is first used, or by warm_up once the
+# cubeviz window is up.
+WARM_UP_MODULES = [
+    'scipy.ndimage',
+    'astropy.convolution',
+    'spectral_cube',
+    'cubeviz.tools.smoothing',
+    'cubeviz.tools.collapse_cube',
+    'cubeviz.tools.moment_maps',
+    'cubeviz.tools.arithmetic_gui',
+    'cubeviz.tools.spectral_operations',
+    'cubeviz.tools.export_cube',
+    'cubeviz.tools.export_movie',
+    'cubeviz.tools.channel_map',
+]
+
+# Milliseconds between the window being up, or the data being loaded, and the
+# start of warm_up, so the imports don't compete with the first draw
+WARM_UP_DELAY = 2000
+
+
+def _import_modules(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            # The error will show up again when the tool is used
+            logger.debug('Could not import {}: {}'.format(name, e))
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    """
+    Import the tool modules in a background thread, so the first use of a
+    tool does not have to wait for them.
+
+    :param modules: list of str: Modules to import
+    :return: threading.Thread
+    """
+    thread = threading.Thread(target=_import_modules, args=(modules,),
+                              name='cubeviz-warm-up', daemon=True)
+    thread.start()
+    return thread
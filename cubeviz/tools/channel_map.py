@@ -0,0 +1,212 @@
+from __future__ import absolute_import, division, print_function
+
+import math
+
+import numpy as np
+
+from qtpy.QtCore import Qt
+from qtpy import QtGui
+from qtpy.QtWidgets import (QDialog, QComboBox, QPushButton, QSpinBox,
+                            QLabel, QHBoxLayout, QVBoxLayout, QMessageBox)
+
+from ..utils.channel_map import REDUCTIONS, bin_channels, shared_limits
+
+# Default number of maps shown around the current slice
+DEFAULT_NUMBER_OF_MAPS = 9
+
+# Size in inches of each map of the grid
+MAP_SIZE = 2.5
+
+
+class ChannelMapGUI(QDialog):
+    """
+    Ask for a component, a spectral range and a binning, and show the channel
+    maps of the range in a ChannelMapWindow.
+    """
+
+    def __init__(self, cubeviz_layout, parent=None):
+        super(ChannelMapGUI, self).__init__(parent)
+
+        self.cubeviz_layout = cubeviz_layout
+        self.data = cubeviz_layout._data
+        self.parent = parent
+        self.window = None
+
+    def _row(self, text, widget):
+        boldFont = QtGui.QFont()
+        boldFont.setBold(True)
+
+        label = QLabel(text)
+        label.setFixedWidth(100)
+        label.setAlignment((Qt.AlignRight | Qt.AlignTop))
+        label.setFont(boldFont)
+
+        widget.setMinimumWidth(200)
+
+        hbl = QHBoxLayout()
+        hbl.addWidget(label)
+        hbl.addWidget(widget)
+        return hbl
+
+    def _spin_box(self, minimum, maximum, value):
+        box = QSpinBox()
+        box.setRange(minimum, maximum)
+        box.setValue(value)
+        return box
+
+    def display(self):
+        """
+        Create the popup box with the channel map inputs and buttons.
+
+        :return:
+        """
+        self.setWindowFlags(self.windowFlags() | Qt.Tool)
+        self.setWindowTitle("Channel Map")
+
+        n_slices = self.data.shape[0]
+        index = self.cubeviz_layout.synced_index or 0
+        start = max(0, min(index - DEFAULT_NUMBER_OF_MAPS // 2, n_slices - DEFAULT_NUMBER_OF_MAPS))
+
+        self.component_combobox = QComboBox()
+        self.component_combobox.addItems(self.cubeviz_layout.component_labels)
+
+        self.start_spinbox = self._spin_box(0, n_slices - 1, start)
+        self.stop_spinbox = self._spin_box(0, n_slices - 1, min(n_slices, start + DEFAULT_NUMBER_OF_MAPS) - 1)
+        self.binning_spinbox = self._spin_box(1, n_slices, 1)
+
+        self.reduction_combobox = QComboBox()
+        self.reduction_combobox.addItems(list(REDUCTIONS))
+
+        # Create Show and Cancel buttons
+        self.showButton = QPushButton("Show")
+        self.showButton.clicked.connect(self.show_callback)
+        self.showButton.setDefault(True)
+
+        self.cancelButton = QPushButton("Cancel")
+        self.cancelButton.clicked.connect(self.cancel_callback)
+
+        hbl = QHBoxLayout()
+        hbl.addStretch(1)
+        hbl.addWidget(self.cancelButton)
+        hbl.addWidget(self.showButton)
+
+        vbl = QVBoxLayout()
+        vbl.addLayout(self._row("Data:", self.component_combobox))
+        vbl.addLayout(self._row("First slice:", self.start_spinbox))
+        vbl.addLayout(self._row("Last slice:", self.stop_spinbox))
+        vbl.addLayout(self._row("Binning:", self.binning_spinbox))
+        vbl.addLayout(self._row("Reduction:", self.reduction_combobox))
+        vbl.addLayout(hbl)
+
+        self.setLayout(vbl)
+        self.setMaximumWidth(700)
+        self.show()
+
+    def show_callback(self):
+        """
+        Callback for when they hit show
+        :return:
+        """
+        component_index = self.component_combobox.currentIndex()
+        component = self.cubeviz_layout.data_components[component_index]
+        start = min(self.start_spinbox.value(), self.stop_spinbox.value())
+        stop = max(self.start_spinbox.value(), self.stop_spinbox.value()) + 1
+
+        try:
+            maps, bins = bin_channels(self.data, component, start, stop, self.binning_spinbox.value(),
+                                      self.reduction_combobox.currentText())
+        except Exception as e:
+            QMessageBox.critical(self, "Channel Map", "Could not compute the channel maps: {}".format(e))
+            return
+
+        # Keep a reference, the window is not modal
+        self.window = ChannelMapWindow(self.cubeviz_layout, component, maps, bins, parent=self.parent)
+        self.window.show()
+        self.close()
+
+    def cancel_callback(self, caller=0):
+        """
+        Cancel callback when the person hits the cancel button
+
+        :param caller:
+        :return:
+        """
+        self.close()
+
+    def keyPressEvent(self, e):
+        if e.key() == Qt.Key_Escape:
+            self.cancel_callback()
+
+
+class ChannelMapWindow(QDialog):
+    """
+    Grid of channel maps with a shared normalisation and the celestial axes
+    of the cube.
+    """
+
+    def __init__(self, cubeviz_layout, component, maps, bins, parent=None):
+        """
+        :param cubeviz_layout: CubeVizLayout the maps are of
+        :param component: ComponentID of the maps
+        :param maps: 3D np.ndarray: One map per bin
+        :param bins: list of (start, stop) channels of each map
+        :param parent:
+        """
+        super(ChannelMapWindow, self).__init__(parent)
+
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+
+        self.setWindowFlags(self.windowFlags() | Qt.Tool)
+        self.setWindowTitle("Channel Map: {}".format(component))
+
+        n_maps = len(maps)
+        columns = int(math.ceil(math.sqrt(n_maps)))
+        rows = int(math.ceil(n_maps / columns))
+
+        self.figure = Figure(figsize=(columns * MAP_SIZE, rows * MAP_SIZE))
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.draw_maps(cubeviz_layout, component, maps, bins, rows, columns)
+
+        vbl = QVBoxLayout()
+        vbl.addWidget(self.canvas)
+        self.setLayout(vbl)
+
+    def draw_maps(self, cubeviz_layout, component, maps, bins, rows, columns):
+        data = cubeviz_layout._data
+        wcs = data.coords.wcs.celestial
+        wavelengths = cubeviz_layout.get_wavelengths()
+        units = cubeviz_layout.get_wavelengths_units()
+
+        cmap = 'gray'
+        viewer = cubeviz_layout._active_cube._widget if cubeviz_layout._active_cube is not None else None
+        if viewer is not None and viewer.visible_layers() and viewer.state.color_mode == 'Colormaps':
+            cmap = viewer.first_visible_layer().state.cmap
+
+        # The same limits for all maps, so they can be compared by eye
+        vmin, vmax = shared_limits(maps)
+
+        image = None
+        for map_index, (channel_map, (start, stop)) in enumerate(zip(maps, bins)):
+            column = map_index % columns
+            axes = self.figure.add_subplot(rows, columns, map_index + 1, projection=wcs)
+            image = axes.imshow(channel_map, origin='lower', cmap=cmap, vmin=vmin, vmax=vmax,
+                                interpolation='nearest')
+
+            # Only the outer maps have tick labels
+            ra, dec = axes.coords[0], axes.coords[1]
+            ra.set_ticklabel_visible(map_index + columns >= len(maps))
+            dec.set_ticklabel_visible(column == 0)
+            ra.set_axislabel('')
+            dec.set_axislabel('')
+
+            if wavelengths is not None:
+                title = '{:.4g} {}'.format(np.mean(wavelengths[start:stop]), units.short_names[0])
+            else:
+                title = '{}-{}'.format(start, stop - 1)
+            axes.set_title(title, fontsize=8)
+
+        if image is not None:
+            colorbar = self.figure.colorbar(image, ax=self.figure.axes, shrink=0.8)
+            colorbar.set_label(str(component))
+        self.canvas.draw()
@@ -11,7 +11,7 @@ from qtpy.QtWidgets import (QDialog, QApplication, QPushButton, QLabel, QWidget,
 
 from astropy.stats import sigma_clip
 
-from .common import add_to_2d_container
+from .common import add_to_2d_container, as_float_array
 
 # The operations we understand
 operations = {
@@ -580,7 +580,7 @@ def collapse_cube(data_component, data_name, wcs, operation, start_index, end_in
     import spectral_cube
 
     # Create a spectral cube instance
-    cube = spectral_cube.SpectralCube(data_component, wcs=wcs)
+    cube = spectral_cube.SpectralCube(as_float_array(data_component), wcs=wcs)
 
     # Do collapsing of the cube
     sub_cube = cube[start_index:end_index]
@@ -1,5 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
+import numpy as np
+
 from glue.core import Data
 from glue.core.link_helpers import LinkSame
 from glue.core.coordinates import WCSCoordinates
@@ -45,3 +47,16 @@ def add_to_2d_container(cubeviz_layout, data, component_data, label):
     else:
 
         data.container_2d.add_component(component_data, label)
+
+
+def as_float_array(array):
+    """
+    Cube components are stored with the dtype declared in the data
+    configuration, so they may be integer (e.g. DQ planes). Upcast these to the
+    smallest floating point type that holds their values for calculations that
+    need floating point data, and return floating point data unchanged.
+    """
+    array = np.asanyarray(array)
+    if array.dtype.kind == 'f':
+        return array
+    return array.astype(np.result_type(array.dtype, np.float32))
@@ -0,0 +1,67 @@
+from __future__ import absolute_import, division, print_function
+
+from qtpy.QtCore import QThread, Signal, Qt
+from qtpy.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
+
+from ..data_factories import cubeviz_fits_exporter
+
+
+class ExportThread(QThread):
+    """
+    Custom QThread that exports data to a FITS file
+    """
+
+    progress_signal = Signal(int)  # Percentage written
+    success_signal = Signal()  # Export is done
+    error_signal = Signal(Exception)  # Export failed
+
+    def __init__(self, filename, data, components=None, parent=None):
+        super(ExportThread, self).__init__(parent)
+        self.filename = filename
+        self.data = data
+        self.components = components
+
+    def _progress(self, bytes_written, total_bytes):
+        self.progress_signal.emit(int(100 * bytes_written / max(1, total_bytes)))
+
+    def run(self):
+        try:
+            cubeviz_fits_exporter(self.filename, self.data, components=self.components,
+                                  progress=self._progress)
+            self.success_signal.emit()
+        except Exception as e:
+            self.error_signal.emit(e)
+
+
+class ExportCube(object):
+    """
+    Ask for a filename and export the data to it in the background,
+    showing the progress.
+    """
+
+    def __init__(self, data, parent=None):
+        self.data = data
+        self.parent = parent
+        self.thread = None
+        self.progress = None
+
+    def display(self):
+        filename, _ = QFileDialog.getSaveFileName(self.parent, "Export Cube", "",
+                                                  "FITS files (*.fits *.fit)")
+        if not filename:
+            return
+
+        self.progress = QProgressDialog("Exporting {}...".format(self.data.label), None, 0, 100, self.parent)
+        self.progress.setWindowTitle("Export Cube")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(500)
+
+        self.thread = ExportThread(filename, self.data, parent=self.parent)
+        self.thread.progress_signal.connect(self.progress.setValue)
+        self.thread.success_signal.connect(self.progress.close)
+        self.thread.error_signal.connect(self.thread_error_handler)
+        self.thread.start()
+
+    def thread_error_handler(self, exception):
+        self.progress.close()
+        QMessageBox.critical(self.parent, "Export Cube", "Export failed: {}".format(exception))
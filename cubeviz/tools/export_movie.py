@@ -0,0 +1,174 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+
+import numpy as np
+
+from qtpy.QtCore import QThread, Signal, Qt
+from qtpy.QtWidgets import (QDialog, QDialogButtonBox, QFileDialog, QFormLayout, QMessageBox,
+                            QProgressDialog, QSpinBox)
+
+from ..utils.movie import MOVIE_EXTENSIONS, DEFAULT_MOVIE_FPS, export_movie
+
+
+def viewer_movie_settings(viewer, layout):
+    """
+    What an image viewer shows, as arguments of export_movie: the settings of
+    its first visible layer, its contours and the overlay of the layout.
+
+    :param viewer: CubevizImageViewer
+    :param layout: CubeVizLayout
+    :return: dict
+    """
+    from ..image_viewer import CONTOUR_MAX_NUMBER_OF_LEVELS
+
+    layer_artist = viewer.first_visible_layer()
+    data = viewer.state.layers_data[0]
+    _, _, transpose = viewer.state.numpy_slice_aggregation_transpose
+
+    # The layer as drawn by the viewer's composite array
+    layer = {key: value for key, value in viewer.axes._composite.layers[layer_artist.uuid].items()
+             if key not in ('array', 'shape', 'zorder', 'visible')}
+
+    settings = dict(data=data, component=layer_artist.state.attribute, layer=layer, transpose=transpose)
+
+    if viewer.is_contour_active:
+        contour_settings = viewer.contour_settings
+
+        def contour_levels(image):
+            levels, _ = viewer._contour_levels(contour_settings, np.nanmin(image), np.nanmax(image))
+            if levels.size > CONTOUR_MAX_NUMBER_OF_LEVELS or not np.all(np.isfinite(levels)):
+                return None
+            return levels
+
+        if viewer.contour_component is None:
+            settings['contour_component'] = layer_artist.state.attribute
+        else:
+            settings['contour_component'] = data.id[viewer.contour_component]
+        settings['contour_levels'] = contour_levels
+        settings['contour_options'] = dict(contour_settings.options)
+        if contour_settings.add_contour_label:
+            settings['contour_label_size'] = contour_settings.font_size
+
+    overlays = layout._overlay_controller._active_overlays
+    if overlays and layout._active_cube in layout.cube_views:
+        overlay = overlays[layout.cube_views.index(layout._active_cube)]
+        settings['overlay'] = (np.asarray(overlay.get_array()), overlay.get_cmap(), overlay.get_alpha())
+
+    wavelengths = layout.get_wavelengths()
+    if wavelengths is not None:
+        units = layout._slice_controller._wavelength_units or ''
+
+        def titles(index):
+            return '{} {:.4g} {}'.format(index, wavelengths[index], units).strip()
+
+        settings['titles'] = titles
+
+    return settings
+
+
+class MovieThread(QThread):
+    """
+    Custom QThread that renders a movie, the frames are drawn in a process pool
+    """
+
+    progress_signal = Signal(int)  # Percentage of the frames rendered
+    success_signal = Signal()  # Export is done
+    error_signal = Signal(Exception)  # Export failed
+
+    def __init__(self, filename, settings, parent=None):
+        super(MovieThread, self).__init__(parent)
+        self.filename = filename
+        self.settings = settings
+
+    def _progress(self, frames, total_frames):
+        self.progress_signal.emit(int(100 * frames / max(1, total_frames)))
+
+    def run(self):
+        try:
+            export_movie(self.filename, progress=self._progress, **self.settings)
+            self.success_signal.emit()
+        except Exception as e:
+            self.error_signal.emit(e)
+
+
+class ExportMovie(object):
+    """
+    Ask for a slice range and a filename and render what the active viewer
+    shows at each slice to a movie or an image sequence in the background,
+    showing the progress.
+    """
+
+    def __init__(self, layout, parent=None):
+        self.layout = layout
+        self.parent = parent
+        self.thread = None
+        self.progress = None
+
+    def _ask_range(self, n_slices):
+        dialog = QDialog(self.parent)
+        dialog.setWindowTitle("Export Movie")
+        form = QFormLayout(dialog)
+
+        def spin_box(minimum, maximum, value):
+            box = QSpinBox(dialog)
+            box.setRange(minimum, maximum)
+            box.setValue(value)
+            return box
+
+        start = spin_box(0, n_slices - 1, 0)
+        stop = spin_box(0, n_slices - 1, n_slices - 1)
+        fps = spin_box(1, 120, DEFAULT_MOVIE_FPS)
+        scale = spin_box(1, 16, 1)
+        form.addRow("First slice", start)
+        form.addRow("Last slice", stop)
+        form.addRow("Frames per second", fps)
+        form.addRow("Pixel scale", scale)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, parent=dialog)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        form.addRow(buttons)
+
+        if dialog.exec_() != QDialog.Accepted:
+            return None
+        return min(start.value(), stop.value()), max(start.value(), stop.value()) + 1, fps.value(), scale.value()
+
+    def display(self):
+        viewer = self.layout._active_cube._widget
+        if viewer.has_2d_data or len(viewer.visible_layers()) == 0:
+            QMessageBox.critical(self.parent, "Export Movie", "The active viewer does not show a cube")
+            return
+
+        settings = viewer_movie_settings(viewer, self.layout)
+        n_slices = settings['data'].shape[0]
+
+        movie_range = self._ask_range(n_slices)
+        if movie_range is None:
+            return
+        start, stop, fps, scale = movie_range
+
+        movie_filter = "Movies ({})".format(' '.join('*' + extension for extension in MOVIE_EXTENSIONS))
+        filename, _ = QFileDialog.getSaveFileName(self.parent, "Export Movie", "",
+                                                  movie_filter + ";;PNG image sequence (*.png)")
+        if not filename:
+            return
+        if not os.path.splitext(filename)[1]:
+            filename += MOVIE_EXTENSIONS[0]
+
+        settings.update(start=start, stop=stop, fps=fps, scale=scale)
+
+        self.progress = QProgressDialog("Rendering {} frames...".format(stop - start), None, 0, 100, self.parent)
+        self.progress.setWindowTitle("Export Movie")
+        self.progress.setWindowModality(Qt.WindowModal)
+        self.progress.setMinimumDuration(500)
+
+        self.thread = MovieThread(filename, settings, parent=self.parent)
+        self.thread.progress_signal.connect(self.progress.setValue)
+        self.thread.success_signal.connect(self.progress.close)
+        self.thread.error_signal.connect(self.thread_error_handler)
+        self.thread.start()
+
+    def thread_error_handler(self, exception):
+        self.progress.close()
+        QMessageBox.critical(self.parent, "Export Movie", "Export failed: {}".format(exception))
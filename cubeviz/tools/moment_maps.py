@@ -5,7 +5,7 @@ from qtpy import QtGui
 from qtpy.QtWidgets import (QDialog, QComboBox, QPushButton,
                             QLabel, QWidget, QHBoxLayout, QVBoxLayout)
 
-from .common import add_to_2d_container
+from .common import add_to_2d_container, as_float_array
 
 
 # TODO: In the future, it might be nice to be able to work across data_collection elements
@@ -88,20 +88,16 @@ class MomentMapsGUI(QDialog):
         self.show()
 
     def do_calculation(self, order, data_name):
-        # Grab spectral-cube
-        import spectral_cube
-        cube = spectral_cube.SpectralCube(self.data[data_name], wcs=self.data.coords.wcs)
-
         try:
-            cube_moment = cube.moment(order=order, axis=0)
+            moment = moment_map(self.data[data_name], self.data.coords.wcs, order)
 
             self.label = '{}-moment-{}'.format(data_name, order)
 
             # Add new overlay/component to cubeviz. We add this both to the 2D
             # container Data object and also as an overlay. In future we might be
             # able to use the 2D container Data object for the overlays directly.
-            add_to_2d_container(self.parent, self.data, cube_moment.value, self.label)
-            self.parent.add_overlay(cube_moment.value, self.label, display_now=False)
+            add_to_2d_container(self.parent, self.data, moment, self.label)
+            self.parent.add_overlay(moment, self.label, display_now=False)
 
         except Exception as e:
             print('Error {}'.format(e))
@@ -132,3 +128,20 @@ class MomentMapsGUI(QDialog):
     def keyPressEvent(self, e):
         if e.key() == Qt.Key_Escape:
             self.cancel_callback()
+
+
+def moment_map(data_component, wcs, order):
+    """
+    Calculate a moment map of a cube along the spectral axis.
+
+    :param data_component: The cube data
+    :param wcs: WCS of the cube
+    :param order: int: Order of the moment
+    :return: 2D np.ndarray
+    """
+
+    # Grab spectral-cube
+    import spectral_cube
+
+    cube = spectral_cube.SpectralCube(as_float_array(data_component), wcs=wcs)
+    return cube.moment(order=order, axis=0).value
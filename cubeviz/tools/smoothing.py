@@ -12,6 +12,8 @@ from glue.utils.qt import update_combobox
 
 from spectral_cube import SpectralCube, BooleanArrayMask
 
+from .common import as_float_array
+
 from qtpy.QtCore import Qt, Signal, QThread
 from qtpy.QtWidgets import (
     QDialog, QApplication, QPushButton, QProgressBar,
@@ -222,17 +224,14 @@ class SmoothCube(object):
             except IncompatibleAttribute:
                 pass
         d = self.data[self.component_id]
-        mask = np.empty_like(d)
-        mask.fill(True)
-        mask = mask.astype(bool)
-        return mask
+        return np.ones(d.shape, dtype=bool)
 
     def data_to_cube(self):
         """Glue Data -> SpectralCube"""
         if self.component_id is None:
             raise Exception("component_id was not provided.")
         wcs = self.get_glue_wcs()
-        data_array = self.data[self.component_id]
+        data_array = as_float_array(self.data[self.component_id])
         mask = BooleanArrayMask(
             mask=self.get_glue_mask(),
             wcs=wcs)
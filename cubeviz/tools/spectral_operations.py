@@ -7,6 +7,8 @@ from qtpy.QtWidgets import QDialog, QDialogButtonBox
 from qtpy.uic import loadUi
 from spectral_cube import BooleanArrayMask, SpectralCube
 
+from .common import as_float_array
+
 __all__ = ['SpectralOperationHandler']
 
 UI_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__),
@@ -96,11 +98,11 @@ class SpectralOperationHandler(QDialog):
         else:
             wcs = self.data.coords.wcs
             data = self.data
-            mask = np.ones(data.shape).astype(bool)
+            mask = np.ones(data.shape, dtype=bool)
 
         mask = BooleanArrayMask(mask=mask, wcs=wcs)
 
-        return SpectralCube(data[self.component_id], wcs=wcs, mask=mask)
+        return SpectralCube(as_float_array(data[self.component_id]), wcs=wcs, mask=mask)
 
     def on_operation_index_changed(self, index):
         """Called when the index of the operation combo box has changed."""
@@ -0,0 +1,99 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Channel maps: images of adjacent channels, or of bins of adjacent channels,
+of a cube. The channels of the whole spectral range are read at once and
+binned with a single reduction over a (bins, binning, y, x) view, instead of
+extracting each plane separately.
+"""
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ['REDUCTIONS', 'channel_bins', 'bin_channels', 'shared_limits']
+
+# Reductions of the channels of a bin, all ignoring NaNs
+REDUCTIONS = OrderedDict([
+    ('Mean', np.nanmean),
+    ('Sum', np.nansum),
+    ('Maximum', np.nanmax),
+    ('Median', np.nanmedian),
+])
+
+# Percentile of the values of all maps used for the shared color limits
+DEFAULT_PERCENTILE = 99.5
+
+
+def channel_bins(start, stop, binning=1):
+    """
+    The channel ranges of the bins of a spectral range. The last bin is
+    shorter if the number of channels is not a multiple of the binning.
+
+    :param start: int: First channel
+    :param stop: int: Channel after the last one
+    :param binning: int: Number of channels per bin
+    :return: list of (start, stop) of each bin
+    """
+    if binning < 1:
+        raise ValueError('The binning must be at least 1, got {}'.format(binning))
+    return [(bin_start, min(bin_start + binning, stop)) for bin_start in range(start, stop, binning)]
+
+
+def bin_channels(data, component, start, stop, binning=1, reduction='Mean'):
+    """
+    Read a spectral range of a cube and reduce each bin of channels to one map.
+
+    :param data: glue Data holding the cube
+    :param component: ComponentID of the cube
+    :param start: int: First channel
+    :param stop: int: Channel after the last one
+    :param binning: int: Number of channels per bin
+    :param reduction: str: Name of the reduction of the channels of a bin, see REDUCTIONS
+    :return: (maps, bins): 3D float32 np.ndarray of one map per bin, and the
+             channel ranges of the bins, see channel_bins
+    """
+    stop = min(stop, data.shape[0])
+    start = max(start, 0)
+    if start >= stop:
+        raise ValueError('Empty range of channels: {} to {}'.format(start, stop))
+
+    bins = channel_bins(start, stop, binning)
+
+    # One contiguous read of the whole range
+    channels = np.asarray(data[component, (slice(start, stop),)], dtype=np.float32)
+    if binning == 1:
+        return channels, bins
+
+    n_channels, ny, nx = channels.shape
+    n_bins = len(bins)
+    if n_bins * binning != n_channels:
+        # The missing channels of the last bin are ignored by the reductions
+        padded = np.full((n_bins * binning, ny, nx), np.nan, dtype=np.float32)
+        padded[:n_channels] = channels
+        channels = padded
+
+    # All-NaN spaxels warn and give NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        maps = REDUCTIONS[reduction](channels.reshape(n_bins, binning, ny, nx), axis=1)
+    return maps.astype(np.float32, copy=False), bins
+
+
+def shared_limits(maps, percentile=DEFAULT_PERCENTILE):
+    """
+    Color limits shared by all maps, so they can be compared by eye: the
+    central percentile of the values of all maps.
+
+    :param maps: np.ndarray of the maps
+    :param percentile: float: Percentage of the values within the limits
+    :return: (vmin, vmax)
+    """
+    values = np.asarray(maps)
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return 0., 1.
+
+    vmin, vmax = np.percentile(values, [(100 - percentile) / 2, (100 + percentile) / 2])
+    if vmin == vmax:
+        vmax = vmin + 1
+    return float(vmin), float(vmax)
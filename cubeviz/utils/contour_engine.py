@@ -0,0 +1,253 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Contour lines computed with a vectorized marching squares, and a cache of
+the lines of recently shown slices. The lines of the slices next to the
+shown one are computed in the background, so the contours keep up with the
+slice slider instead of matplotlib's contour being run on every step.
+"""
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Normalize
+from matplotlib import cm
+
+__all__ = ['marching_squares', 'ContourLines', 'ContourEngine']
+
+# Number of (component, slice, levels) entries kept
+DEFAULT_MAX_ENTRIES = 64
+
+# Number of slices on each side of the shown one computed in the background
+DEFAULT_NEIGHBOURS = 2
+
+# The segments crossing the cells of each marching squares case, as pairs of
+# cell edges: 0 bottom, 1 right, 2 top, 3 left. The saddles (5 and 10) are
+# resolved with the value at the center of the cell, see marching_squares.
+_CASE_SEGMENTS = {
+    1: [(3, 0)], 2: [(0, 1)], 3: [(3, 1)], 4: [(1, 2)], 6: [(0, 2)], 7: [(3, 2)],
+    8: [(2, 3)], 9: [(0, 2)], 11: [(1, 2)], 12: [(3, 1)], 13: [(0, 1)], 14: [(3, 0)],
+}
+_SADDLE_SEGMENTS = {
+    # (case, center above the level) -> segments
+    (5, True): [(0, 1), (2, 3)], (5, False): [(3, 0), (1, 2)],
+    (10, True): [(3, 0), (1, 2)], (10, False): [(0, 1), (2, 3)],
+}
+
+
+def marching_squares(image, level):
+    """
+    Iso-line of a 2D image at a level, as straight segments between the
+    crossings of the level on the edges of the cells between pixel centers.
+    Cells with a NaN corner are skipped.
+
+    :param image: 2D np.ndarray
+    :param level: float
+    :return: np.ndarray of shape (n, 2, 2): the (x, y) pixel coordinates of
+             the two ends of each segment, x being the column
+    """
+    z = np.asarray(image, dtype=np.float64)
+    # Corners of each cell: a (x, y), b (x + 1, y), c (x + 1, y + 1), d (x, y + 1)
+    a, b, c, d = z[:-1, :-1], z[:-1, 1:], z[1:, 1:], z[1:, :-1]
+
+    with np.errstate(invalid='ignore'):
+        case = ((a > level) * 1 + (b > level) * 2 + (c > level) * 4 + (d > level) * 8).astype(np.uint8)
+    valid = np.isfinite(a) & np.isfinite(b) & np.isfinite(c) & np.isfinite(d)
+    case[~valid] = 0
+
+    if not np.any((case != 0) & (case != 15)):
+        return np.empty((0, 2, 2))
+
+    y, x = np.mgrid[0:z.shape[0] - 1, 0:z.shape[1] - 1]
+
+    def crossing(low, high):
+        # Fraction along an edge where the level is crossed; the ends of an
+        # edge that is crossed always differ
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (level - low) / (high - low)
+
+    def edge_points(cells, edge):
+        cx, cy = x[cells], y[cells]
+        if edge == 0:
+            return np.stack([cx + crossing(a[cells], b[cells]), cy], axis=-1)
+        if edge == 1:
+            return np.stack([cx + 1, cy + crossing(b[cells], c[cells])], axis=-1)
+        if edge == 2:
+            return np.stack([cx + crossing(d[cells], c[cells]), cy + 1], axis=-1)
+        return np.stack([cx, cy + crossing(a[cells], d[cells])], axis=-1)
+
+    segments = []
+
+    def add(cells, pairs):
+        if not np.any(cells):
+            return
+        for start_edge, end_edge in pairs:
+            segments.append(np.stack([edge_points(cells, start_edge), edge_points(cells, end_edge)], axis=1))
+
+    for case_index, pairs in _CASE_SEGMENTS.items():
+        add(case == case_index, pairs)
+
+    center_above = (a + b + c + d) / 4 > level
+    for (case_index, above), pairs in _SADDLE_SEGMENTS.items():
+        add((case == case_index) & (center_above == above), pairs)
+
+    return np.concatenate(segments, axis=0)
+
+
+class ContourLines:
+    """
+    The contour lines of a slice, drawn as one LineCollection. Like a
+    matplotlib ContourSet it has the collections and labelTexts the image
+    viewer draws and removes.
+    """
+
+    def __init__(self, axes, segments, segment_levels, levels, options):
+        """
+        :param axes: matplotlib Axes to draw on
+        :param segments: np.ndarray (n, 2, 2) of all segments
+        :param segment_levels: np.ndarray (n,) of the level of each segment
+        :param levels: np.ndarray of the contour levels
+        :param options: dict of the contour settings, cmap, vmin and vmax are used
+        """
+        cmap = options.get('cmap', None)
+        if isinstance(cmap, str) or cmap is None:
+            cmap = cm.get_cmap(cmap)
+        vmin = options.get('vmin', None)
+        vmax = options.get('vmax', None)
+        norm = Normalize(vmin=levels.min() if vmin is None else vmin,
+                         vmax=levels.max() if vmax is None else vmax)
+
+        collection = LineCollection(segments, colors=cmap(norm(segment_levels)))
+        axes.add_collection(collection, autolim=False)
+
+        self.levels = levels
+        self.collections = [collection]
+        self.labelTexts = []
+
+
+class ContourEngine:
+    """
+    Contour segments of slices keyed on (component, slice index, levels),
+    with LRU eviction, and computation of the neighbouring slices in the
+    background.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, neighbours=DEFAULT_NEIGHBOURS):
+        """
+        :param max_entries: int: Number of slices kept
+        :param neighbours: int: Number of slices on each side computed in the background
+        """
+        self.max_entries = max_entries
+        self.neighbours = neighbours
+        self._entries = OrderedDict()
+        self._pending = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+        # Incremented by clear, so segments computed before are not stored
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(component, index, levels):
+        return component, index, tuple(np.round(levels, 12))
+
+    def _compute(self, key, image, levels, generation):
+        segments = [marching_squares(image, level) for level in levels]
+        entry = (np.concatenate(segments, axis=0),
+                 np.repeat(levels, [len(level_segments) for level_segments in segments]))
+
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def segments(self, component, index, image, levels):
+        """
+        Get the contour segments of a slice, computing them if they are not
+        in the cache.
+
+        :param component: Hashable identifying what the slice is of
+        :param index: int: Slice index
+        :param image: 2D np.ndarray: The slice
+        :param levels: np.ndarray of the contour levels
+        :return: (segments, level of each segment)
+        """
+        return self._segments(component, index, image, levels, self._generation)
+
+    def _segments(self, component, index, image, levels, generation):
+        levels = np.asarray(levels, dtype=np.float64)
+        key = self._key(component, index, levels)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        return self._compute(key, image, levels, generation)
+
+    def draw(self, axes, component, index, image, levels, options):
+        """
+        Draw the contour lines of a slice.
+
+        :param axes: matplotlib Axes to draw on
+        :param component: Hashable identifying what the slice is of
+        :param index: int: Slice index
+        :param image: 2D np.ndarray: The slice
+        :param levels: np.ndarray of the contour levels
+        :param options: dict of the contour settings, see ContourLines
+        :return: ContourLines
+        """
+        levels = np.asarray(levels, dtype=np.float64)
+        segments, segment_levels = self.segments(component, index, image, levels)
+        return ContourLines(axes, segments, segment_levels, levels, options)
+
+    def prefetch(self, component, index, n_slices, get_image_levels):
+        """
+        Compute the segments of the slices next to index in the background.
+
+        :param component: Hashable identifying what the slices are of
+        :param index: int: The slice index that is shown
+        :param n_slices: int: Number of slices
+        :param get_image_levels: function: get_image_levels(index) returns the
+                                 (image, levels) of a slice, or None to skip it
+        """
+        def compute(neighbour, generation):
+            try:
+                image_levels = get_image_levels(neighbour)
+                if image_levels is not None:
+                    image, levels = image_levels
+                    levels = np.asarray(levels, dtype=np.float64)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore', RuntimeWarning)
+                        self._segments(component, neighbour, image, levels, generation)
+            finally:
+                with self._lock:
+                    self._pending.discard((component, neighbour))
+
+        for offset in range(1, self.neighbours + 1):
+            for neighbour in (index + offset, index - offset):
+                if not 0 <= neighbour < n_slices:
+                    continue
+                with self._lock:
+                    if (component, neighbour) in self._pending:
+                        continue
+                    self._pending.add((component, neighbour))
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cubeviz-contour')
+                self._executor.submit(compute, neighbour, self._generation)
+
+    def clear(self):
+        """
+        Drop all cached segments, e.g. when the values of the data change.
+        Segments being computed in the background are not stored.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
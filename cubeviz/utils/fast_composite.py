@@ -0,0 +1,131 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Faster rendering of the image viewers for the common case of a single
+colormapped layer with a linear stretch, which is redrawn on every step of
+the slice slider. Glue's CompositeArray normalises, stretches and
+colormaps the slice in float64 with several temporary arrays; here the slice
+is normalised in place into colormap indices and converted to RGBA with a
+cached lookup table, reusing the same buffers from frame to frame.
+"""
+import numpy as np
+from matplotlib.colors import Colormap
+
+from glue.viewers.image.composite_array import CompositeArray
+
+__all__ = ['colormap_lut', 'FastCompositeArray']
+
+
+def colormap_lut(cmap, alpha=1.0):
+    """
+    RGBA lookup table of a colormap, as drawn by glue: the colors are blended
+    with alpha over a white background.
+
+    :param cmap: matplotlib Colormap
+    :param alpha: float: Opacity of the layer
+    :return: (cmap.N + 1, 4) uint8 array, the last entry is for NaNs
+    """
+    colors = np.vstack([cmap(np.arange(cmap.N)), cmap(np.nan)])
+    opacity = alpha * colors[:, 3:4]
+    rgb = (1 - opacity) + colors[:, :3] * opacity
+
+    lut = np.empty((cmap.N + 1, 4), dtype=np.uint8)
+    lut[:, :3] = np.round(np.clip(rgb, 0, 1) * 255)
+    lut[:, 3] = 255
+    return lut
+
+
+class FastCompositeArray(CompositeArray):
+    """
+    CompositeArray that renders a single visible colormapped layer with a
+    linear stretch directly to uint8 RGBA. Anything else is rendered by glue.
+    """
+
+    def __init__(self, **kwargs):
+        super(FastCompositeArray, self).__init__(**kwargs)
+        self._luts = {}
+        self._buffers = {}
+        self._frame = 0
+
+    def _fast_layer(self):
+        """
+        The layer that can be rendered by the fast path, or None.
+        """
+        visible = [layer for layer in self.layers.values() if layer['visible']]
+        if len(visible) != 1:
+            return None
+
+        layer = visible[0]
+        if (not callable(layer['array']) or not isinstance(layer['color'], Colormap) or
+                layer['stretch'] != 'linear' or layer['clim'][0] == layer['clim'][1]):
+            return None
+        return layer
+
+    def _get_lut(self, cmap, alpha):
+        key = (id(cmap), cmap.N, alpha)
+        lut = self._luts.get(key, None)
+        if lut is None:
+            # Colormaps are few and long-lived, but do not keep stale ones around
+            if len(self._luts) > 16:
+                self._luts.clear()
+            lut = self._luts[key] = colormap_lut(cmap, alpha)
+        return lut
+
+    def _get_buffers(self, shape):
+        """
+        Work buffers for an image shape. There are two RGBA outputs, used in
+        turn, so the previous frame is not overwritten while matplotlib may
+        still hold it.
+        """
+        buffers = self._buffers.get(shape, None)
+        if buffers is None:
+            self._buffers.clear()
+            buffers = self._buffers[shape] = {
+                'values': np.empty(shape, dtype=np.float32),
+                'nan': np.empty(shape, dtype=bool),
+                'index': np.empty(shape, dtype=np.intp),
+                'rgba': [np.empty(shape + (4,), dtype=np.uint8) for _ in range(2)],
+            }
+        return buffers
+
+    def render(self, layer, array):
+        """
+        Colormap an image with the settings of a layer.
+
+        :param layer: dict of the layer settings (clim, contrast, bias, color, alpha)
+        :param array: 2D np.ndarray
+        :return: (ny, nx, 4) uint8 np.ndarray, valid until the next but one call
+        """
+        cmap = layer['color']
+        lut = self._get_lut(cmap, layer['alpha'])
+        buffers = self._get_buffers(array.shape)
+        values, nan, index = buffers['values'], buffers['nan'], buffers['index']
+
+        # Same as glue: ManualInterval then ContrastBiasStretch, both clipping to [0, 1]
+        vmin, vmax = layer['clim']
+        np.subtract(array, vmin, out=values, casting='unsafe')
+        values *= 1. / (vmax - vmin)
+        np.clip(values, 0, 1, out=values)
+        values -= layer['bias']
+        values *= layer['contrast'] * cmap.N
+        values += 0.5 * cmap.N
+        np.clip(values, 0, cmap.N - 1, out=values)
+
+        np.isnan(values, out=nan)
+        np.copyto(values, cmap.N, where=nan)
+        np.copyto(index, values, casting='unsafe')
+
+        rgba = buffers['rgba'][self._frame % 2]
+        self._frame += 1
+        np.take(lut, index, axis=0, out=rgba)
+        return rgba
+
+    def __getitem__(self, view):
+        layer = self._fast_layer()
+        if layer is None:
+            return super(FastCompositeArray, self).__getitem__(view)
+
+        array = layer['array'](view=view)
+        if array is None or np.isscalar(array) or np.ndim(array) != 2:
+            return super(FastCompositeArray, self).__getitem__(view)
+
+        return self.render(layer, array)
@@ -0,0 +1,104 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Cache for the coordinate display of the image viewers, which is updated on
+every mouse move: the displayed slice is kept until the slice or component
+changes, and the celestial coordinates are computed for a whole tile of
+pixels at a time, so sweeping the cursor over an image rarely runs the WCS.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ['HoverCache']
+
+# Width and height in pixels of the tiles of celestial coordinates
+DEFAULT_TILE_SIZE = 128
+
+# Number of tiles kept, 16 MB with the default tile size
+MAX_TILES = 64
+
+
+class HoverCache:
+    """
+    The slice under the cursor and tiles of the celestial coordinates of its
+    pixels.
+    """
+
+    def __init__(self, tile_size=DEFAULT_TILE_SIZE, max_tiles=MAX_TILES):
+        """
+        :param tile_size: int: Width and height in pixels of the coordinate tiles
+        :param max_tiles: int: Number of coordinate tiles kept
+        """
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+
+        self._slice_key = None
+        self._slice = None
+
+        self._wcs = None
+        self._celestial = None
+        self._tiles = OrderedDict()
+
+    def get_slice(self, key, loader):
+        """
+        Get the displayed slice, calling the loader only if the key changed.
+
+        :param key: Hashable identifying the slice, e.g. (component, slice index)
+        :param loader: function: loader() returns the slice
+        :return: 2D np.ndarray
+        """
+        if self._slice is None or key != self._slice_key:
+            self._slice = loader()
+            self._slice_key = key
+        return self._slice
+
+    def celestial(self, wcs):
+        """
+        The celestial part of a WCS, which astropy computes on each access of
+        WCS.celestial, kept until the WCS changes.
+
+        :param wcs: astropy.wcs.WCS, e.g. of the axes of a viewer
+        :return: astropy.wcs.WCS
+        """
+        # A new WCS, e.g. another data set
+        if wcs is not self._wcs:
+            self._wcs = wcs
+            self._celestial = wcs.celestial
+            self._tiles.clear()
+        return self._celestial
+
+    def world(self, wcs, x, y):
+        """
+        Celestial coordinates of a pixel.
+
+        :param wcs: astropy.wcs.WCS with a 2D celestial part
+        :param x: int: Pixel x (first axis of the WCS)
+        :param y: int: Pixel y
+        :return: (ra, dec) in degrees
+        """
+        celestial = self.celestial(wcs)
+
+        tile_key = (x // self.tile_size, y // self.tile_size)
+        tile = self._tiles.get(tile_key, None)
+        if tile is None:
+            x0, y0 = tile_key[0] * self.tile_size, tile_key[1] * self.tile_size
+            tile_y, tile_x = np.mgrid[y0:y0 + self.tile_size, x0:x0 + self.tile_size]
+            tile = celestial.wcs_pix2world(tile_x, tile_y, 0)
+            self._tiles[tile_key] = tile
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(tile_key)
+
+        ra, dec = tile
+        return ra[y % self.tile_size, x % self.tile_size], dec[y % self.tile_size, x % self.tile_size]
+
+    def clear(self):
+        """
+        Drop the slice and the coordinate tiles.
+        """
+        self._slice_key = None
+        self._slice = None
+        self._wcs = None
+        self._celestial = None
+        self._tiles.clear()
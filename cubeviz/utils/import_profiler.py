@@ -0,0 +1,93 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Timing of module imports, used by ``cubeviz --profile-startup``.
+"""
+import sys
+import time
+import importlib.abc
+
+__all__ = ['ImportProfiler']
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """
+    Wraps the loader of a module to time executing the module.
+    """
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._start(module.__name__)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._stop(module.__name__)
+
+    def __getattr__(self, name):
+        # e.g. get_resource_reader, is_package, get_source
+        return getattr(self._loader, name)
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder that records how long each module takes to import. The
+    cumulative time includes the modules it imports, the self time does not.
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.timings = {}  # module name -> (cumulative seconds, self seconds)
+        self._stack = []  # [module name, start time, time spent in nested imports]
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path, target=None):
+        # Find the module with the other finders and time its loader
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+    def _start(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _stop(self, name):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.timings[name] = (elapsed, elapsed - nested)
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def report(self, limit=40, file=None):
+        """
+        Print the modules that took longest to import.
+
+        :param limit: int: Number of modules to list
+        :param file: File to print to, defaults to sys.stderr
+        """
+        file = file or sys.stderr
+
+        total = sum(self_time for _, self_time in self.timings.values())
+        print('Startup took {:.3f}s, of which {:.3f}s importing {} modules'.format(
+            time.perf_counter() - self.start_time, total, len(self.timings)), file=file)
+        print('{:>10} {:>10}  module'.format('self [s]', 'cumul [s]'), file=file)
+
+        by_self_time = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (cumulative, self_time) in by_self_time[:limit]:
+            print('{:10.4f} {:10.4f}  {}'.format(self_time, cumulative, name), file=file)
@@ -0,0 +1,26 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Detection of memory-mapped arrays. Neither astropy nor glue keep the
+np.memmap subclass: astropy returns the data of memory-mapped HDUs as plain
+arrays over the mmap buffer, and glue's components convert their data with
+np.asarray. Whether an array is backed by a file is found by following its
+bases down to the mmap.
+"""
+import mmap
+
+import numpy as np
+
+__all__ = ['is_memory_mapped']
+
+
+def is_memory_mapped(array):
+    """
+    Whether an array reads its values from a memory-mapped file.
+
+    :param array: np.ndarray, or any other array-like
+    :return: bool
+    """
+    base = array
+    while isinstance(base, np.ndarray):
+        base = base.base
+    return isinstance(base, mmap.mmap)
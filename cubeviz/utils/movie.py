@@ -0,0 +1,242 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Offscreen rendering of a range of slices of a cube to an image sequence or a
+movie. The cube is read a chunk of slices at a time and the frames are drawn
+(with the overlay and contours shown in the viewer) by a pool of processes,
+so long spectral ranges use all cores. Movies are assembled from the frames
+with ffmpeg.
+"""
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+__all__ = ['MOVIE_EXTENSIONS', 'render_frame', 'render_frames', 'export_movie']
+
+# Output extensions that are assembled into a movie, others are written as
+# one image per frame
+MOVIE_EXTENSIONS = ('.mp4', '.mov', '.avi', '.gif')
+
+# Default number of frames per second of the movies
+DEFAULT_MOVIE_FPS = 10
+
+# Number of slices sent to a worker at a time
+DEFAULT_CHUNK_FRAMES = 16
+
+# Resolution of the frames, only used to convert the image size to inches
+FRAME_DPI = 100
+
+
+def render_frame(image, layer, contour=None, overlay=None, title=None, scale=1, contour_label_size=None):
+    """
+    Draw one slice as the image viewers do, without Qt.
+
+    :param image: 2D np.ndarray: The slice, as displayed (y, x)
+    :param layer: dict: Settings of the image layer in the format of glue's
+                  CompositeArray: color (Colormap), clim, contrast, bias, stretch, alpha
+    :param contour: (contour image, levels, options) or None, see ContourLines
+    :param overlay: (2D np.ndarray, cmap, alpha) or None
+    :param title: str: Text drawn in the top left corner
+    :param scale: int: Number of screen pixels per image pixel
+    :param contour_label_size: int: Font size of the contour labels, None for no labels
+    :return: matplotlib Figure, with an Agg canvas
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    from .contour_engine import ContourLines, marching_squares
+    from .fast_composite import FastCompositeArray
+
+    ny, nx = image.shape
+    figure = Figure(figsize=(nx * scale / FRAME_DPI, ny * scale / FRAME_DPI), dpi=FRAME_DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_axes([0, 0, 1, 1])
+    axes.set_axis_off()
+
+    composite = FastCompositeArray()
+    composite.allocate('image')
+    composite.set('image', array=lambda view=None: image if view is None else image[view],
+                  shape=image.shape, **layer)
+    axes.imshow(composite[(slice(None), slice(None))], origin='lower', interpolation='nearest',
+                extent=(-0.5, nx - 0.5, -0.5, ny - 0.5))
+
+    if overlay is not None:
+        overlay_image, cmap, alpha = overlay
+        axes.imshow(overlay_image, origin='lower', cmap=cmap, alpha=alpha, interpolation='none',
+                    extent=(-0.5, nx - 0.5, -0.5, ny - 0.5))
+
+    if contour is not None:
+        contour_image, levels, options = contour
+        levels = np.asarray(levels, dtype=np.float64)
+        if contour_label_size is not None:
+            # Labels need a matplotlib ContourSet, as in the viewers
+            contours = axes.contour(contour_image, levels=levels, **options)
+            axes.clabel(contours, fontsize=contour_label_size)
+        else:
+            segments = [marching_squares(contour_image, level) for level in levels]
+            ContourLines(axes, np.concatenate(segments, axis=0),
+                         np.repeat(levels, [len(level_segments) for level_segments in segments]),
+                         levels, options)
+
+    if title:
+        axes.text(0.02, 0.98, title, transform=axes.transAxes, va='top', ha='left', color='white',
+                  fontsize=8, bbox=dict(facecolor='black', alpha=0.5, linewidth=0))
+
+    axes.set_xlim(-0.5, nx - 0.5)
+    axes.set_ylim(-0.5, ny - 0.5)
+    return figure
+
+
+def render_frames(filenames, images, layer, contour_images=None, contour_levels=None,
+                  contour_options=None, contour_label_size=None, overlay=None, titles=None, scale=1):
+    """
+    Render a chunk of slices to image files. Runs in a worker process.
+
+    :param filenames: list of str: Output file of each frame
+    :param images: 3D np.ndarray: The slices
+    :param layer: dict: Image layer settings, see render_frame
+    :param contour_images: 3D np.ndarray: The slices the contours are drawn from, or None
+    :param contour_levels: list of np.ndarray: Contour levels of each slice
+    :param contour_options: dict: Contour settings, see ContourLines
+    :param contour_label_size: int: Font size of the contour labels, None for no labels
+    :param overlay: (2D np.ndarray, cmap, alpha) or None
+    :param titles: list of str: Title of each frame
+    :param scale: int: Number of screen pixels per image pixel
+    :return: int: Number of frames written
+    """
+    for frame, filename in enumerate(filenames):
+        contour = None
+        if contour_images is not None and contour_levels[frame] is not None:
+            contour = (contour_images[frame], contour_levels[frame], contour_options or {})
+
+        figure = render_frame(images[frame], layer, contour=contour, overlay=overlay,
+                              title=titles[frame] if titles else None, scale=scale,
+                              contour_label_size=contour_label_size)
+        figure.savefig(filename, dpi=FRAME_DPI)
+    return len(filenames)
+
+
+def _ffmpeg_path():
+    import matplotlib
+
+    path = matplotlib.rcParams['animation.ffmpeg_path']
+    return shutil.which(path) or shutil.which('ffmpeg')
+
+
+def _assemble_movie(filename, frame_pattern, fps):
+    ffmpeg = _ffmpeg_path()
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg is needed to write {}, only image sequences can be '
+                           'exported without it'.format(os.path.basename(filename)))
+
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', frame_pattern]
+    if not filename.lower().endswith('.gif'):
+        # Most players need an even frame size in yuv420p
+        command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']
+    subprocess.run(command + [filename], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def export_movie(filename, data, component, layer, start=0, stop=None, transpose=False,
+                 contour_component=None, contour_levels=None, contour_options=None,
+                 contour_label_size=None, overlay=None, titles=None, fps=DEFAULT_MOVIE_FPS, scale=1, workers=None,
+                 chunk_frames=DEFAULT_CHUNK_FRAMES, progress=None):
+    """
+    Render the slices start to stop of a cube to a movie or an image sequence.
+
+    :param filename: str: Output file. Movies (see MOVIE_EXTENSIONS) are
+                     assembled with ffmpeg; otherwise a file is written per
+                     frame, named with the slice index before the extension,
+                     e.g. frames.png -> frames_00042.png
+    :param data: glue Data holding the cube
+    :param component: ComponentID of the cube
+    :param layer: dict: Image layer settings, see render_frame
+    :param start: int: First slice
+    :param stop: int: Slice after the last one, defaults to the number of slices
+    :param transpose: bool: Transpose the slices, as the viewer does
+    :param contour_component: ComponentID the contours are drawn from, None for no contours
+    :param contour_levels: function: contour_levels(image) returns the levels
+                           of a contour slice, or None to skip its contours
+    :param contour_options: dict: Contour settings, see ContourLines
+    :param contour_label_size: int: Font size of the contour labels, None for no labels
+    :param overlay: (2D np.ndarray, cmap, alpha) or None
+    :param titles: function: titles(index) returns the title of a frame, or None
+    :param fps: float: Frames per second of movies
+    :param scale: int: Number of screen pixels per image pixel
+    :param workers: int: Number of processes, defaults to the number of CPUs
+    :param chunk_frames: int: Number of slices sent to a worker at a time
+    :param progress: function: progress(frames written, total frames)
+    :return: list of str: The files written
+    """
+    stop = data.shape[0] if stop is None else min(stop, data.shape[0])
+    if not 0 <= start < stop:
+        raise ValueError('Empty range of slices: {} to {}'.format(start, stop))
+
+    base, extension = os.path.splitext(filename)
+    movie = extension.lower() in MOVIE_EXTENSIONS
+    if movie:
+        frame_dir = tempfile.mkdtemp(prefix='cubeviz-movie-')
+        frame_name = os.path.join(frame_dir, 'frame_{:05d}.png')
+    else:
+        frame_dir = None
+        frame_name = base + '_{:05d}' + (extension or '.png')
+
+    def read(component_id, view):
+        chunk = np.asarray(data[component_id, view])
+        return chunk.transpose(0, 2, 1) if transpose else chunk
+
+    n_frames = stop - start
+    written = []
+    workers = workers or os.cpu_count() or 1
+
+    try:
+        # Forking a process with Qt and the loader threads running is unsafe
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = set()
+            done_frames = 0
+            for chunk_start in range(start, stop, chunk_frames):
+                chunk_stop = min(chunk_start + chunk_frames, stop)
+                indices = range(chunk_start, chunk_stop)
+                filenames = [frame_name.format(index - start if movie else index) for index in indices]
+
+                # One contiguous read per chunk
+                view = (slice(chunk_start, chunk_stop),)
+                images = read(component, view)
+                contour_images = levels = None
+                if contour_component is not None:
+                    contour_images = images if contour_component is component else read(contour_component, view)
+                    levels = [contour_levels(image) for image in contour_images]
+
+                pending.add(executor.submit(
+                    render_frames, filenames, images, layer, contour_images=contour_images,
+                    contour_levels=levels, contour_options=contour_options,
+                    contour_label_size=contour_label_size, overlay=overlay,
+                    titles=[titles(index) for index in indices] if titles else None, scale=scale))
+                written.extend(filenames)
+
+                # Only keep a few chunks in flight, so the cube is not read
+                # into memory faster than it is rendered
+                while len(pending) >= 2 * workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done_frames += future.result()
+                    if progress is not None:
+                        progress(done_frames, n_frames)
+
+            for future in pending:
+                done_frames += future.result()
+            if progress is not None:
+                progress(done_frames, n_frames)
+
+        if movie:
+            _assemble_movie(filename, os.path.join(frame_dir, 'frame_%05d.png'), fps)
+            written = [filename]
+    finally:
+        if frame_dir is not None:
+            shutil.rmtree(frame_dir, ignore_errors=True)
+
+    return written
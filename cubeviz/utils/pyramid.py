@@ -0,0 +1,162 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Downsampled copies of cubes for drawing zoomed-out views of large spatial
+fields. Glue only draws every n-th pixel of an image that is larger than the
+screen, but still reads the full slice for it; the levels of the pyramid are
+block means of the cube by powers of 2, computed in the background, so the
+slices of a zoomed-out view are read from a cube about the size of the
+screen instead.
+"""
+import math
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['block_mean', 'level_factor', 'level_view', 'ImagePyramids']
+
+# Maximum number of bytes of all the downsampled cubes of a layout
+DEFAULT_PYRAMID_BYTES = 512 * 1024 ** 2
+
+# Number of bytes of the cube read at a time when building a level
+CHUNK_BYTES = 256 * 1024 ** 2
+
+
+def block_mean(array, factor):
+    """
+    Downsample the last two axes of an array by averaging blocks of
+    factor x factor pixels, ignoring NaNs. Partial blocks at the edges are
+    averaged over the pixels they have.
+
+    :param array: np.ndarray with at least two dimensions
+    :param factor: int: Block size
+    :return: np.ndarray of float32
+    """
+    array = np.asarray(array, dtype=np.float32)
+    *leading, ny, nx = array.shape
+    out_ny, out_nx = -(-ny // factor), -(-nx // factor)
+
+    if out_ny * factor != ny or out_nx * factor != nx:
+        padded = np.full(tuple(leading) + (out_ny * factor, out_nx * factor), np.nan, dtype=np.float32)
+        padded[..., :ny, :nx] = array
+        array = padded
+
+    blocks = array.reshape(tuple(leading) + (out_ny, factor, out_nx, factor))
+    # All-NaN blocks warn and give NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmean(blocks, axis=(-3, -1))
+
+
+def level_factor(view):
+    """
+    The downsampling factor of the pyramid level that matches a view: the
+    largest power of 2 that is not larger than the steps of the view. Each
+    pixel of the view is then in a different block of the level.
+
+    :param view: (y slice, x slice) as passed by glue to get_sliced_data
+    :return: int: The factor, 1 for full resolution
+    """
+    if view is None or len(view) != 2 or not all(isinstance(item, slice) for item in view):
+        return 1
+
+    step = min(item.step or 1 for item in view)
+    if step < 2:
+        return 1
+    return 2 ** int(math.log2(step))
+
+
+def level_view(view, factor, shape):
+    """
+    The index of a pyramid level equivalent to a view of the full resolution
+    image: each pixel of the view is replaced by the block of the level it is
+    in, so the image has the same shape and origin whatever the starts and
+    steps of the view are.
+
+    :param view: (y slice, x slice) of the full resolution image
+    :param factor: int: The downsampling factor of the level
+    :param shape: (ny, nx) of the full resolution image
+    :return: Index of the level, as returned by np.ix_
+    """
+    return np.ix_(*(np.arange(*item.indices(size)) // factor for item, size in zip(view, shape)))
+
+
+class ImagePyramids:
+    """
+    Pyramid levels of the components of the data shown in a layout. A level
+    is built in the background the first time it is asked for, if it fits in
+    the memory budget.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_PYRAMID_BYTES):
+        """
+        :param max_bytes: int: Maximum number of bytes of all levels
+        """
+        self.max_bytes = max_bytes
+        self._executor = None
+        self._futures = {}  # (id(data), component, factor) -> Future of the level
+        self._sizes = {}  # (id(data), component, factor) -> bytes of the level
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def level_nbytes(shape, factor):
+        n_slices, ny, nx = shape
+        return n_slices * -(-ny // factor) * -(-nx // factor) * np.dtype(np.float32).itemsize
+
+    def _build(self, data, component, factor):
+        n_slices, ny, nx = data.shape
+        level = np.empty((n_slices, -(-ny // factor), -(-nx // factor)), dtype=np.float32)
+
+        chunk_slices = max(1, CHUNK_BYTES // max(1, ny * nx * np.dtype(np.float32).itemsize))
+        for start in range(0, n_slices, chunk_slices):
+            stop = min(start + chunk_slices, n_slices)
+            level[start:stop] = block_mean(data[component, (slice(start, stop),)], factor)
+
+        level.flags.writeable = False
+        return level
+
+    def get(self, data, component, factor, start=True):
+        """
+        Get a level of the pyramid of a component.
+
+        :param data: glue Data holding the cube
+        :param component: ComponentID of the cube
+        :param factor: int: Downsampling factor, a power of 2
+        :param start: bool: Start building the level if it has not been
+        :return: 3D np.ndarray, or None if it is not built (yet) or does not fit
+        """
+        if factor < 2 or data is None or len(data.shape) != 3:
+            return None
+
+        key = (id(data), component, factor)
+        with self._lock:
+            future = self._futures.get(key, None)
+            if future is None:
+                nbytes = self.level_nbytes(data.shape, factor)
+                if not start or self._nbytes + nbytes > self.max_bytes:
+                    return None
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cubeviz-pyramid')
+                # The key holds on to the component, so the id of its data is not reused
+                future = self._executor.submit(self._build, data, component, factor)
+                self._futures[key] = future
+                self._sizes[key] = nbytes
+                self._nbytes += nbytes
+
+        if not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def invalidate(self, component=None):
+        """
+        Drop the levels of a component, e.g. when it is removed.
+
+        :param component: ComponentID, or None to drop all levels
+        """
+        with self._lock:
+            for key in list(self._futures):
+                if component is None or key[1] is component:
+                    self._futures.pop(key).cancel()
+                    self._nbytes -= self._sizes.pop(key)
@@ -0,0 +1,242 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Statistics of the spaxels of a subset (ROI) at every slice of a cube. The
+mean and standard deviation of all slices are computed in one chunked pass in
+the background, so the stats overlay of the image viewers only looks them up
+when the slice changes, and they can be exported as a statistics spectrum.
+"""
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['ROIStatisticsTable', 'spatial_mask', 'roi_statistics', 'ROIStatistics']
+
+# Number of slices read at a time
+DEFAULT_CHUNK_SLICES = 64
+
+# Number of (component, subset) tables kept
+MAX_TABLES = 32
+
+
+def spatial_mask(subset):
+    """
+    The mask of a subset that only depends on the position on the sky, such
+    as a ROI drawn in an image viewer: it is the same for every slice.
+
+    :param subset: glue Subset of a cube
+    :return: 2D boolean np.ndarray, or None if the subset is not spatial
+    """
+    from glue.core.subset import RoiSubsetState
+
+    state = subset.subset_state
+    data = subset.data
+    if not isinstance(state, RoiSubsetState) or data.ndim != 3:
+        return None
+
+    # The first pixel component is the spectral axis
+    spatial_ids = data.pixel_component_ids[1:]
+    if state.xatt not in spatial_ids or state.yatt not in spatial_ids:
+        return None
+
+    return subset.to_mask(view=(0,))
+
+
+class ROIStatisticsTable:
+    """
+    Mean, standard deviation and number of valid spaxels of a subset at every
+    slice, ignoring NaNs.
+    """
+
+    def __init__(self, n_slices):
+        """
+        :param n_slices: int: Number of slices
+        """
+        self.mean = np.full(n_slices, np.nan)
+        self.std = np.full(n_slices, np.nan)
+        self.count = np.zeros(n_slices, dtype=int)
+
+    def __len__(self):
+        return len(self.mean)
+
+    def to_table(self, wavelengths=None, wavelength_unit=None, unit=None):
+        """
+        The statistics as a spectrum.
+
+        :param wavelengths: np.ndarray: Wavelength of each slice, defaults to the slice index
+        :param wavelength_unit: Unit of the wavelengths
+        :param unit: Unit of the data values
+        :return: astropy.table.Table
+        """
+        from astropy.table import Table
+
+        table = Table()
+        if wavelengths is None:
+            table['slice'] = np.arange(len(self))
+        else:
+            table['wavelength'] = wavelengths
+            table['wavelength'].unit = wavelength_unit or None
+        table['mean'] = self.mean
+        table['std'] = self.std
+        table['mean'].unit = table['std'].unit = unit or None
+        table['count'] = self.count
+        return table
+
+
+def roi_statistics(get_chunk, n_slices, mask=None, get_mask=None, chunk_slices=DEFAULT_CHUNK_SLICES):
+    """
+    Compute the statistics of a subset at every slice of a cube.
+
+    :param get_chunk: function: get_chunk(view) returns the data in the (slices, y, x) view
+    :param n_slices: int: Number of slices
+    :param mask: 2D boolean np.ndarray: Spatial mask of the subset, used for every slice
+    :param get_mask: function: get_mask(view) returns the 3D mask in the view,
+                     used if the mask is not spatial
+    :param chunk_slices: int: Number of slices read at a time
+    :return: ROIStatisticsTable
+    """
+    table = ROIStatisticsTable(n_slices)
+
+    # Only read the bounding box of a spatial mask
+    if mask is not None:
+        y, x = np.nonzero(mask)
+        if len(y) == 0:
+            return table
+        box = (slice(y.min(), y.max() + 1), slice(x.min(), x.max() + 1))
+        box_mask = mask[box]
+
+    for start in range(0, n_slices, chunk_slices):
+        stop = min(start + chunk_slices, n_slices)
+
+        if mask is not None:
+            view = (slice(start, stop),) + box
+            values = np.asarray(get_chunk(view))[:, box_mask]
+        else:
+            view = (slice(start, stop),)
+            chunk = np.asarray(get_chunk(view))
+            chunk_mask = np.asarray(get_mask(view))
+            values = np.where(chunk_mask, chunk, np.nan).reshape(stop - start, -1)
+
+        if not np.issubdtype(values.dtype, np.floating):
+            values = values.astype(np.float64)
+
+        # Slices without valid spaxels warn and give NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            table.mean[start:stop] = np.nanmean(values, axis=1)
+            table.std[start:stop] = np.nanstd(values, axis=1)
+        table.count[start:stop] = np.count_nonzero(~np.isnan(values), axis=1)
+
+    return table
+
+
+class ROIStatistics:
+    """
+    Statistics tables of the subsets shown in a layout. The spatial mask of a
+    subset is computed once, and a table is computed in the background the
+    first time it is asked for. Tables are keyed on the subset state, so
+    editing a subset starts a new table.
+    """
+
+    def __init__(self, chunk_slices=DEFAULT_CHUNK_SLICES, max_tables=MAX_TABLES):
+        """
+        :param chunk_slices: int: Number of slices read at a time
+        :param max_tables: int: Number of tables kept
+        """
+        self.chunk_slices = chunk_slices
+        self.max_tables = max_tables
+        self._executor = None
+        self._masks = OrderedDict()  # subset state -> spatial mask or None
+        self._futures = OrderedDict()  # (component, subset state) -> Future of the table
+        self._lock = threading.Lock()
+
+    def mask(self, subset):
+        """
+        The spatial mask of a subset, see spatial_mask, computed once per subset state.
+
+        :param subset: glue Subset
+        :return: 2D boolean np.ndarray, or None if the subset is not spatial
+        """
+        state = subset.subset_state
+        with self._lock:
+            if state in self._masks:
+                return self._masks[state]
+
+        mask = spatial_mask(subset)
+
+        with self._lock:
+            self._masks[state] = mask
+            while len(self._masks) > self.max_tables:
+                self._masks.popitem(last=False)
+        return mask
+
+    def _compute(self, data, component, subset):
+        def get_chunk(view):
+            return data[component, view]
+
+        mask = self.mask(subset)
+        return roi_statistics(get_chunk, data.shape[0], mask=mask,
+                              get_mask=None if mask is not None else subset.to_mask,
+                              chunk_slices=self.chunk_slices)
+
+    def get(self, data, component, subset, start=True):
+        """
+        Get the statistics table of a subset.
+
+        :param data: glue Data holding the cube
+        :param component: ComponentID of the cube
+        :param subset: glue Subset of the data
+        :param start: bool: Start computing the table if it has not been
+        :return: ROIStatisticsTable, or None if it is not computed yet
+        """
+        if data is None or len(data.shape) != 3:
+            return None
+
+        key = (component, subset.subset_state)
+        with self._lock:
+            future = self._futures.get(key, None)
+            if future is None:
+                if not start:
+                    return None
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cubeviz-roi-stats')
+                future = self._executor.submit(self._compute, data, component, subset)
+                self._futures[key] = future
+                while len(self._futures) > self.max_tables:
+                    self._futures.popitem(last=False)[1].cancel()
+            else:
+                self._futures.move_to_end(key)
+
+        if not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def wait(self, data, component, subset):
+        """
+        Compute the statistics table of a subset, or wait for it.
+
+        :param data: glue Data holding the cube
+        :param component: ComponentID of the cube
+        :param subset: glue Subset of the data
+        :return: ROIStatisticsTable
+        """
+        self.get(data, component, subset)
+        with self._lock:
+            future = self._futures[(component, subset.subset_state)]
+        return future.result()
+
+    def invalidate(self, component=None):
+        """
+        Drop the tables of a component, e.g. when it is removed or its values
+        change.
+
+        :param component: ComponentID, or None to drop all tables and masks
+        """
+        with self._lock:
+            for key in list(self._futures):
+                if component is None or key[0] is component:
+                    self._futures.pop(key).cancel()
+            if component is None:
+                self._masks.clear()
@@ -0,0 +1,161 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Cache of the 2D slices shown by the image viewers. Recently shown slices are
+kept in memory up to a byte budget, and the slices ahead of the direction the
+slider is moving in are read in the background, so scrubbing through a
+memory-mapped or compressed cube is served from RAM.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['SliceCache']
+
+# Maximum number of bytes of slices kept per cache
+DEFAULT_SLICE_CACHE_BYTES = 128 * 1024 ** 2
+
+# Number of slices read ahead of the slider
+DEFAULT_PREFETCH_SLICES = 4
+
+# Shared by all caches, so the number of threads does not grow with the
+# number of viewers and layers
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cubeviz-prefetch')
+        return _executor
+
+
+class SliceCache:
+    """
+    LRU cache of slices keyed on (key, index), where the key identifies what
+    is sliced (e.g. the component) and index is the slice index. The cached
+    arrays are read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SLICE_CACHE_BYTES, prefetch_slices=DEFAULT_PREFETCH_SLICES):
+        """
+        :param max_bytes: int: Maximum number of bytes of slices kept
+        :param prefetch_slices: int: Number of slices read ahead, 0 disables prefetching
+        """
+        self.max_bytes = max_bytes
+        self.prefetch_slices = prefetch_slices
+
+        self._slices = OrderedDict()
+        self._nbytes = 0
+        self._pending = {}  # (key, index) -> Future of slices being prefetched
+        self._lock = threading.Lock()
+
+        # Incremented by clear, so slices read before are not stored
+        self._generation = 0
+
+        self._last_index = None
+        self._direction = 1
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, key_index):
+        return key_index in self._slices
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def _store(self, key_index, array, generation):
+        """
+        Add a slice, evicting the least recently used ones over the budget.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return array
+            if key_index in self._slices:
+                return self._slices[key_index]
+            if array.nbytes > self.max_bytes:
+                return array
+            self._slices[key_index] = array
+            self._nbytes += array.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._slices.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return array
+
+    def _load(self, key, index, loader):
+        generation = self._generation
+        # Copy, so memory-mapped slices are read now and not on every draw
+        array = np.array(loader(index))
+        array.flags.writeable = False
+        return self._store((key, index), array, generation)
+
+    def get(self, key, index, loader):
+        """
+        Get a slice, loading it if it is not in the cache.
+
+        :param key: Hashable identifying what is sliced
+        :param index: int: Slice index
+        :param loader: function: loader(index) returns the slice
+        :return: np.ndarray, which must not be modified
+        """
+        with self._lock:
+            if (key, index) in self._slices:
+                self._slices.move_to_end((key, index))
+                return self._slices[(key, index)]
+            future = self._pending.get((key, index), None)
+
+        # The slice is already being read in the background
+        if future is not None:
+            try:
+                return future.result()
+            except Exception:
+                pass
+
+        return self._load(key, index, loader)
+
+    def prefetch(self, key, index, n_slices, loader):
+        """
+        Read the slices after index, in the direction the index last moved
+        in, in the background.
+
+        :param key: Hashable identifying what is sliced
+        :param index: int: Slice index that was just shown
+        :param n_slices: int: Number of slices
+        :param loader: function: loader(index) returns the slice
+        """
+        if self._last_index is not None and index != self._last_index:
+            self._direction = 1 if index > self._last_index else -1
+        self._last_index = index
+
+        for step in range(1, self.prefetch_slices + 1):
+            next_index = index + step * self._direction
+            if not 0 <= next_index < n_slices:
+                break
+            with self._lock:
+                if (key, next_index) in self._slices or (key, next_index) in self._pending:
+                    continue
+                future = _get_executor().submit(self._load, key, next_index, loader)
+                self._pending[(key, next_index)] = future
+            future.add_done_callback(lambda future, key_index=(key, next_index): self._done(key_index, future))
+
+    def _done(self, key_index, future):
+        with self._lock:
+            if self._pending.get(key_index, None) is future:
+                del self._pending[key_index]
+
+    def clear(self):
+        """
+        Remove all slices from the cache, e.g. when the values of the data
+        change. Slices being read in the background are not stored.
+        """
+        with self._lock:
+            self._slices.clear()
+            self._nbytes = 0
+            self._pending.clear()
+            self._generation += 1
+        self._last_index = None
@@ -0,0 +1,95 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Sharing of extracted slices between the image viewers of a layout. In split
+mode the same data is shown in several viewers, and when the slider moves
+each of them asks for its slice; viewers showing the same component at the
+same slice and view window get the same array instead of extracting it again.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+__all__ = ['SliceService']
+
+# Number of slices kept between two sync updates, e.g. while panning one viewer
+MAX_SHARED_SLICES = 16
+
+
+def _view_key(view):
+    """
+    Hashable version of a view, which can hold slices.
+    """
+    if view is None:
+        return None
+    return tuple((item.start, item.stop, item.step) if isinstance(item, slice) else item
+                 for item in view)
+
+
+class SliceService:
+    """
+    Slices extracted for the viewers of a layout, keyed on (data, component,
+    slice index, view window). The arrays are read-only, since they are
+    shared. The slices are kept until the next sync update, so the viewers
+    that draw after the update (e.g. on an idle redraw) share them too.
+    """
+
+    def __init__(self, max_slices=MAX_SHARED_SLICES):
+        """
+        :param max_slices: int: Maximum number of slices kept
+        """
+        self.max_slices = max_slices
+        self._slices = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._slices)
+
+    @contextmanager
+    def sync_update(self):
+        """
+        Context of an update of the slice index of several viewers: the slices
+        of the previous update are dropped first.
+        """
+        self.clear()
+        yield self
+
+    def get(self, data, component, index, view, transpose, loader):
+        """
+        Get a slice, extracting it if no other viewer did since the last sync
+        update.
+
+        :param data: glue Data the slice is from
+        :param component: ComponentID of the slice
+        :param index: int: Slice index
+        :param view: The view window, or None
+        :param transpose: bool: Whether the slice is transposed
+        :param loader: function: loader() extracts the slice
+        :return: np.ndarray, which must not be modified
+        """
+        # The key holds on to the component, so the id of its data is not reused
+        key = (id(data), component, index, _view_key(view), transpose)
+
+        with self._lock:
+            if key in self._slices:
+                self._slices.move_to_end(key)
+                self.hits += 1
+                return self._slices[key]
+
+        array = loader()
+        array.flags.writeable = False
+
+        with self._lock:
+            self.misses += 1
+            self._slices[key] = array
+            while len(self._slices) > self.max_slices:
+                self._slices.popitem(last=False)
+        return array
+
+    def clear(self):
+        """
+        Drop all slices.
+        """
+        with self._lock:
+            self._slices.clear()
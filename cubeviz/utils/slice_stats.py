@@ -0,0 +1,184 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Per-slice statistics of cube components. The minimum, maximum, mean,
+standard deviation and a few percentiles of every slice are computed in one
+chunked pass over the cube, in the background, so the viewers can look up
+e.g. the contour levels of a slice while the slider is moved instead of
+computing them from the slice on each draw.
+"""
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+__all__ = ['SliceStatisticsTable', 'slice_statistics', 'SliceStatistics']
+
+# Percentiles computed for every slice
+PERCENTILES = (0.5, 1, 5, 25, 50, 75, 95, 99, 99.5)
+
+# Number of slices read at a time
+DEFAULT_CHUNK_SLICES = 64
+
+
+class SliceStatisticsTable:
+    """
+    Statistics of each slice of a cube, ignoring NaNs. Slices that are all
+    NaN have NaN statistics.
+    """
+
+    def __init__(self, n_slices, percentiles=PERCENTILES):
+        """
+        :param n_slices: int: Number of slices
+        :param percentiles: tuple of float: The percentiles computed
+        """
+        self.percentiles = tuple(percentiles)
+        self.minimum = np.full(n_slices, np.nan)
+        self.maximum = np.full(n_slices, np.nan)
+        self.mean = np.full(n_slices, np.nan)
+        self.std = np.full(n_slices, np.nan)
+        self.percentile_values = np.full((n_slices, len(self.percentiles)), np.nan)
+
+    def __len__(self):
+        return len(self.minimum)
+
+    def limits(self, index):
+        """
+        :param index: int: Slice index
+        :return: (minimum, maximum) of the slice
+        """
+        return self.minimum[index], self.maximum[index]
+
+    def percentile(self, index, q):
+        """
+        :param index: int: Slice index
+        :param q: float: One of the percentiles of the table
+        :return: float
+        """
+        try:
+            column = self.percentiles.index(q)
+        except ValueError:
+            raise ValueError('Percentile {} is not in the table, which has {}'.format(q, self.percentiles))
+        return self.percentile_values[index, column]
+
+    def as_dict(self):
+        """
+        :return: dict of column name -> array, with a "p<q>" column per percentile
+        """
+        columns = {'minimum': self.minimum, 'maximum': self.maximum, 'mean': self.mean, 'std': self.std}
+        for column, q in enumerate(self.percentiles):
+            columns['p{:g}'.format(q)] = self.percentile_values[:, column]
+        return columns
+
+
+def slice_statistics(get_chunk, n_slices, percentiles=PERCENTILES, chunk_slices=DEFAULT_CHUNK_SLICES,
+                     abort=None):
+    """
+    Compute the statistics of every slice of a cube.
+
+    :param get_chunk: function: get_chunk(start, stop) returns the slices start:stop
+    :param n_slices: int: Number of slices
+    :param percentiles: tuple of float: Percentiles to compute
+    :param chunk_slices: int: Number of slices read at a time
+    :param abort: threading.Event: Stops the computation when set
+    :return: SliceStatisticsTable, or None if aborted
+    """
+    table = SliceStatisticsTable(n_slices, percentiles)
+
+    for start in range(0, n_slices, chunk_slices):
+        if abort is not None and abort.is_set():
+            return None
+
+        stop = min(start + chunk_slices, n_slices)
+        chunk = np.asarray(get_chunk(start, stop))
+        chunk = chunk.reshape(stop - start, -1)
+        if not np.issubdtype(chunk.dtype, np.floating):
+            chunk = chunk.astype(np.float64)
+
+        # All-NaN slices warn and give NaN, which is what the table holds for them
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            table.minimum[start:stop] = np.nanmin(chunk, axis=1)
+            table.maximum[start:stop] = np.nanmax(chunk, axis=1)
+            table.mean[start:stop] = np.nanmean(chunk, axis=1)
+            table.std[start:stop] = np.nanstd(chunk, axis=1)
+            if table.percentiles:
+                table.percentile_values[start:stop] = np.nanpercentile(chunk, table.percentiles, axis=1).T
+
+    return table
+
+
+class SliceStatistics:
+    """
+    Statistics tables of the components of the data shown in a layout. A
+    table is computed in the background the first time it is asked for.
+    """
+
+    def __init__(self, percentiles=PERCENTILES, chunk_slices=DEFAULT_CHUNK_SLICES):
+        """
+        :param percentiles: tuple of float: Percentiles to compute
+        :param chunk_slices: int: Number of slices read at a time
+        """
+        self.percentiles = percentiles
+        self.chunk_slices = chunk_slices
+        self._executor = None
+        self._futures = {}  # (id(data), component) -> Future of the table
+        self._lock = threading.Lock()
+
+    def _compute(self, data, component):
+        def get_chunk(start, stop):
+            return data[component, (slice(start, stop),)]
+
+        return slice_statistics(get_chunk, data.shape[0], self.percentiles, self.chunk_slices)
+
+    def get(self, data, component, start=True):
+        """
+        Get the statistics table of a component.
+
+        :param data: glue Data holding the cube
+        :param component: ComponentID of the cube
+        :param start: bool: Start computing the table if it has not been
+        :return: SliceStatisticsTable, or None if it is not computed yet
+        """
+        if data is None or len(data.shape) != 3:
+            return None
+
+        key = (id(data), component)
+        with self._lock:
+            future = self._futures.get(key, None)
+            if future is None:
+                if not start:
+                    return None
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cubeviz-stats')
+                future = self._executor.submit(self._compute, data, component)
+                # The key holds on to the component, so the id of its data is not reused
+                self._futures[key] = future
+
+        if not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def wait(self, data, component):
+        """
+        Compute the statistics table of a component, or wait for it.
+
+        :param data: glue Data holding the cube
+        :param component: ComponentID of the cube
+        :return: SliceStatisticsTable
+        """
+        self.get(data, component)
+        with self._lock:
+            future = self._futures[(id(data), component)]
+        return future.result()
+
+    def invalidate(self, component=None):
+        """
+        Drop the tables of a component, e.g. when it is removed.
+
+        :param component: ComponentID, or None to drop all tables
+        """
+        with self._lock:
+            for key in list(self._futures):
+                if component is None or key[1] is component:
+                    self._futures.pop(key).cancel()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ..channel_map import channel_bins, bin_channels, shared_limits
+
+
+class FakeData:
+    # The part of the glue Data interface used by bin_channels
+
+    def __init__(self, **components):
+        self._components = components
+        self.shape = next(iter(components.values())).shape
+        self.reads = []
+
+    def __getitem__(self, key):
+        component, view = key
+        self.reads.append(view)
+        return self._components[component][view]
+
+
+def test_channel_bins():
+
+    assert channel_bins(2, 9, 3) == [(2, 5), (5, 8), (8, 9)]
+    assert channel_bins(0, 3) == [(0, 1), (1, 2), (2, 3)]
+    with pytest.raises(ValueError):
+        channel_bins(0, 3, 0)
+
+
+def test_bin_channels():
+
+    cube = np.random.random((20, 5, 6))
+    cube[4, 1, 1] = np.nan
+    data = FakeData(flux=cube)
+
+    maps, bins = bin_channels(data, 'flux', 3, 11, binning=3)
+
+    # The range is read at once
+    assert data.reads == [(slice(3, 11),)]
+    assert bins == [(3, 6), (6, 9), (9, 11)]
+    assert maps.shape == (3, 5, 6) and maps.dtype == np.float32
+    for channel_map, (start, stop) in zip(maps, bins):
+        np.testing.assert_allclose(channel_map, np.nanmean(cube[start:stop], axis=0), rtol=1e-6)
+
+    maps, _ = bin_channels(data, 'flux', 0, 4, binning=2, reduction='Sum')
+    np.testing.assert_allclose(maps[1], cube[2:4].sum(axis=0), rtol=1e-6)
+
+    # Without binning the channels are returned as they are
+    maps, bins = bin_channels(data, 'flux', 18, 30)
+    np.testing.assert_allclose(maps, cube[18:])
+    assert bins == [(18, 19), (19, 20)]
+
+    with pytest.raises(ValueError):
+        bin_channels(data, 'flux', 20, 30)
+
+
+def test_shared_limits():
+
+    maps = np.arange(1000.).reshape(10, 10, 10)
+    maps[0, 0, 0] = np.nan
+    vmin, vmax = shared_limits(maps, percentile=90)
+    assert 40 < vmin < 60 and 940 < vmax < 960
+
+    assert shared_limits(np.full((2, 3, 3), np.nan)) == (0, 1)
+    assert shared_limits(np.ones((2, 3, 3))) == (1, 2)
@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+
+from ..contour_engine import marching_squares, ContourEngine
+
+
+def _interpolate(image, points):
+    # Linear interpolation along the cell edges the points are on
+    values = []
+    for x, y in points:
+        x0, y0 = int(np.floor(x)), int(np.floor(y))
+        if x == x0:
+            y1 = min(y0 + 1, image.shape[0] - 1)
+            values.append(image[y0, x0] + (y - y0) * (image[y1, x0] - image[y0, x0]))
+        else:
+            x1 = min(x0 + 1, image.shape[1] - 1)
+            values.append(image[y0, x0] + (x - x0) * (image[y0, x1] - image[y0, x0]))
+    return np.array(values)
+
+
+def test_marching_squares():
+
+    y, x = np.mgrid[0:40, 0:50]
+    image = np.hypot(x - 20.3, y - 18.7)
+
+    segments = marching_squares(image, 10)
+    assert segments.ndim == 3 and segments.shape[1:] == (2, 2)
+
+    # Every end is on the circle, where the level is crossed
+    points = segments.reshape(-1, 2)
+    np.testing.assert_allclose(_interpolate(image, points), 10, atol=1e-9)
+    np.testing.assert_allclose(np.hypot(points[:, 0] - 20.3, points[:, 1] - 18.7), 10, atol=0.1)
+
+    # A closed line: every end is shared by two segments
+    _, counts = np.unique(np.round(points, 9), axis=0, return_counts=True)
+    assert np.all(counts == 2)
+
+    # Cells with NaN corners are skipped
+    image[18, :] = np.nan
+    points = marching_squares(image, 10).reshape(-1, 2)
+    assert not np.any((points[:, 1] > 17) & (points[:, 1] < 19))
+
+    assert len(marching_squares(image, 1000)) == 0
+
+
+def test_contour_engine_cache():
+
+    cube = np.random.random((5, 20, 20))
+    engine = ContourEngine(max_entries=2, neighbours=1)
+    levels = np.array([0.25, 0.5, 0.75])
+
+    segments, segment_levels = engine.segments('flux', 0, cube[0], levels)
+    assert len(segments) == len(segment_levels)
+    assert set(segment_levels) <= set(levels)
+    assert engine.segments('flux', 0, None, levels)[0] is segments
+
+    engine.segments('flux', 1, cube[1], levels)
+    engine.segments('flux', 2, cube[2], levels)
+    assert len(engine) == 2
+
+    # The neighbours are computed in the background
+    engine.clear()
+    engine.prefetch('flux', 3, len(cube), lambda index: (cube[index], levels))
+    engine._executor.shutdown(wait=True)
+    assert len(engine) == 2
+    for index in (2, 4):
+        np.testing.assert_array_equal(engine.segments('flux', index, None, levels)[0],
+                                      ContourEngine().segments('flux', index, cube[index], levels)[0])
+
+    # Segments of the old values computed after a clear are not kept
+    engine.clear()
+    reading = threading.Event()
+    release = threading.Event()
+
+    def slow_image_levels(index):
+        reading.set()
+        release.wait(5)
+        return cube[index], levels
+
+    engine = ContourEngine(neighbours=1)
+    engine.prefetch('flux', 3, len(cube), slow_image_levels)
+    assert reading.wait(5)
+    engine.clear()
+    release.set()
+    engine._executor.shutdown(wait=True)
+    assert len(engine) == 0
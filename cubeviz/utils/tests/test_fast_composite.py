@@ -0,0 +1,55 @@
+import numpy as np
+from matplotlib import cm
+
+from glue.viewers.image.composite_array import CompositeArray
+
+from ..fast_composite import FastCompositeArray
+
+
+def _layer(composite, image, **settings):
+    composite.allocate('layer')
+    composite.set('layer', array=lambda view=None: image if view is None else image[view],
+                  shape=image.shape, **settings)
+
+
+def test_fast_composite_matches_glue():
+
+    image = np.random.normal(size=(30, 40))
+    image[3, 4] = np.nan
+
+    settings = dict(color=cm.viridis, clim=(-1.5, 2), contrast=1.3, bias=0.4, alpha=0.8)
+
+    glue_composite = CompositeArray()
+    _layer(glue_composite, image, **settings)
+    fast_composite = FastCompositeArray()
+    _layer(fast_composite, image, **settings)
+
+    view = (slice(0, 30, 2), slice(5, 40, 3))
+    expected = np.round(glue_composite[view] * 255)
+    rendered = fast_composite[view]
+
+    assert rendered.dtype == np.uint8
+    assert rendered.shape == expected.shape
+    np.testing.assert_allclose(rendered, expected, atol=1)
+
+    # The two output buffers are reused in turn
+    first = fast_composite[view]
+    second = fast_composite[view]
+    assert fast_composite[view] is first and first is not second
+
+
+def test_fast_composite_fallback():
+
+    image = np.random.random((10, 10))
+
+    # Stretches other than linear are rendered by glue
+    composite = FastCompositeArray()
+    _layer(composite, image, color=cm.viridis, stretch='sqrt')
+    assert composite[...].dtype != np.uint8
+
+    # As are several layers
+    composite = FastCompositeArray()
+    _layer(composite, image, color=cm.viridis)
+    composite.allocate('other')
+    composite.set('other', array=lambda view=None: image, shape=image.shape, color='red')
+    assert composite[(slice(None), slice(None))].dtype != np.uint8
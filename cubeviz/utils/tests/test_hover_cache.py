@@ -0,0 +1,36 @@
+import numpy as np
+from astropy.wcs import WCS
+
+from ..hover_cache import HoverCache
+
+
+def test_hover_cache():
+
+    wcs = WCS(naxis=3)
+    wcs.wcs.ctype = ['RA---TAN', 'DEC--TAN', 'WAVE']
+    wcs.wcs.crval = [150, 2, 1e-6]
+    wcs.wcs.cdelt = [-1e-4, 1e-4, 1e-9]
+    wcs.wcs.crpix = [10, 20, 1]
+
+    cache = HoverCache(tile_size=16)
+    celestial = cache.celestial(wcs)
+    assert celestial.naxis == 2
+    assert cache.celestial(wcs) is celestial
+
+    for x, y in [(0, 0), (15, 16), (40, 3), (300, 200)]:
+        ra, dec = cache.world(wcs, x, y)
+        np.testing.assert_allclose((ra, dec), celestial.wcs_pix2world([[x, y]], 0)[0])
+    assert len(cache._tiles) == 4
+
+    loads = []
+    image = np.zeros((4, 5))
+
+    def loader():
+        loads.append(1)
+        return image
+
+    assert cache.get_slice(('flux', 1), loader) is image
+    cache.get_slice(('flux', 1), loader)
+    assert len(loads) == 1
+    cache.get_slice(('flux', 2), loader)
+    assert len(loads) == 2
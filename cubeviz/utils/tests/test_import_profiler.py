@@ -0,0 +1,41 @@
+import io
+import os
+import subprocess
+import sys
+
+from ..import_profiler import ImportProfiler
+
+
+def test_import_profiler():
+
+    profiler = ImportProfiler().install()
+    try:
+        # A module that has not been imported yet
+        sys.modules.pop('colorsys', None)
+        import colorsys  # noqa
+    finally:
+        profiler.uninstall()
+
+    assert 'colorsys' in profiler.timings
+    cumulative, self_time = profiler.timings['colorsys']
+    assert 0 <= self_time <= cumulative
+
+    output = io.StringIO()
+    profiler.report(file=output)
+    assert 'colorsys' in output.getvalue()
+
+
+def test_tools_not_imported_with_layout():
+
+    # The tool dialogs are imported on first use, not with the layout
+    code = "import sys, cubeviz.layout; assert 'cubeviz.tools.smoothing' not in sys.modules"
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    subprocess.check_call([sys.executable, '-c', code], env=env)
+
+
+def test_glue_not_imported_with_main_module():
+
+    # main installs the profiler before glue, Qt and pyplot are imported
+    code = ("import sys, cubeviz.cubeviz; "
+            "assert not {'glue', 'qtpy', 'matplotlib.pyplot'} & set(sys.modules), sorted(sys.modules)")
+    subprocess.check_call([sys.executable, '-c', code])
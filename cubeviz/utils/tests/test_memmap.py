@@ -0,0 +1,20 @@
+import numpy as np
+
+from ..memmap import is_memory_mapped
+
+
+def test_is_memory_mapped(tmpdir):
+
+    filename = tmpdir.join('cube.npy').strpath
+    np.save(filename, np.arange(24, dtype=np.float32).reshape(2, 3, 4))
+
+    array = np.load(filename, mmap_mode='r')
+    assert is_memory_mapped(array)
+
+    # glue converts component data with np.asarray, which drops np.memmap
+    assert is_memory_mapped(np.asarray(array))
+    assert is_memory_mapped(np.asarray(array)[1, :, ::2])
+
+    assert not is_memory_mapped(np.array(array))
+    assert not is_memory_mapped(np.zeros(3))
+    assert not is_memory_mapped([1, 2, 3])
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pytest
+from matplotlib import cm
+
+from ..movie import render_frame, export_movie
+
+
+class FakeData:
+    # The part of the glue Data interface used by export_movie
+
+    def __init__(self, **components):
+        self._components = components
+        self.shape = next(iter(components.values())).shape
+
+    def __getitem__(self, key):
+        component, view = key
+        return self._components[component][view]
+
+
+LAYER = dict(color=cm.viridis, clim=(0, 1), contrast=1, bias=0.5, stretch='linear', alpha=1)
+
+
+def test_render_frame():
+
+    image = np.random.random((20, 30))
+    figure = render_frame(image, LAYER, contour=(image, [0.25, 0.5], {'cmap': 'gray'}),
+                          overlay=(np.ones((20, 30)), cm.gray, 0.25), title='42', scale=2)
+
+    figure.canvas.draw()
+    width, height = figure.canvas.get_width_height()
+    assert (width, height) == (60, 40)
+    assert len(figure.axes[0].collections) == 1
+
+    # Contour labels, as the viewers draw them
+    image = np.add.outer(np.arange(20), np.arange(30)) / 50.
+    frames = []
+    for contour_label_size in (None, 8):
+        figure = render_frame(image, LAYER, contour=(image, [0.25, 0.5], {'cmap': 'gray'}), scale=4,
+                              contour_label_size=contour_label_size)
+        figure.canvas.draw()
+        frames.append(np.asarray(figure.canvas.buffer_rgba()))
+    assert np.any(frames[0] != frames[1])
+
+
+def test_export_image_sequence(tmpdir):
+
+    cube = np.random.random((12, 8, 10))
+    data = FakeData(flux=cube)
+
+    progress = []
+    written = export_movie(str(tmpdir.join('frames.png')), data, 'flux', LAYER, start=2, stop=9,
+                           contour_component='flux', contour_levels=lambda image: [0.5],
+                           titles=str, workers=2, chunk_frames=3,
+                           progress=lambda frames, total: progress.append((frames, total)))
+
+    assert [os.path.basename(filename) for filename in written] == \
+        ['frames_{:05d}.png'.format(index) for index in range(2, 9)]
+    assert all(os.path.exists(filename) for filename in written)
+    assert progress[-1] == (7, 7)
+
+
+def test_export_empty_range(tmpdir):
+
+    data = FakeData(flux=np.zeros((4, 3, 3)))
+    with pytest.raises(ValueError):
+        export_movie(str(tmpdir.join('frames.png')), data, 'flux', LAYER, start=4)
@@ -0,0 +1,87 @@
+import numpy as np
+
+from ..pyramid import block_mean, level_factor, level_view, ImagePyramids
+
+
+class FakeData:
+    # The part of the glue Data interface used by ImagePyramids
+
+    def __init__(self, **components):
+        self._components = components
+        self.shape = next(iter(components.values())).shape
+
+    def __getitem__(self, key):
+        component, view = key
+        return self._components[component][view]
+
+
+def test_block_mean():
+
+    image = np.arange(5 * 7, dtype=float).reshape(5, 7)
+    image[0, 0] = np.nan
+
+    binned = block_mean(image, 2)
+    assert binned.shape == (3, 4)
+    assert binned.dtype == np.float32
+    np.testing.assert_allclose(binned[0, 0], np.mean([1, 7, 8]))
+    np.testing.assert_allclose(binned[1, 1], image[2:4, 2:4].mean())
+    # Partial blocks at the edges
+    np.testing.assert_allclose(binned[2, 3], image[4, 6])
+
+    cube = np.random.random((3, 8, 8))
+    np.testing.assert_allclose(block_mean(cube, 4)[1], block_mean(cube[1], 4), rtol=1e-6)
+
+
+def test_level_view():
+
+    assert level_factor(None) == 1
+    assert level_factor((slice(0, 100, 1), slice(0, 100, 1))) == 1
+    assert level_factor((slice(0, 100, 8), slice(0, 100, 4))) == 4
+    assert level_factor((slice(0, 100, 12), slice(8, 100, 12))) == 8
+    assert level_factor((slice(0, 100, 5), slice(0, 100, 7))) == 4
+    assert level_factor((slice(0, 100, 3), slice(0, 120, 3))) == 2
+    assert level_factor((slice(5, 21, 4), slice(5, 21, 4))) == 4
+
+    image = np.random.random((100, 120))
+    view = (slice(8, 96, 8), slice(0, 120, 8))
+    level = block_mean(image, 4)
+    # The same region, at the remaining step
+    np.testing.assert_allclose(level[level_view(view, 4, image.shape)],
+                               block_mean(image[8:96, 0:120], 4)[::2, ::2], rtol=1e-6)
+
+    # Odd starts and a step that is not a power of 2: each pixel of the
+    # view is replaced by the block it is in
+    view = (slice(7, 95, 6), slice(13, 117, 6))
+    factor = level_factor(view)
+    assert factor == 4
+    level = block_mean(image, factor)
+    y, x = np.arange(7, 95, 6), np.arange(13, 117, 6)
+    np.testing.assert_allclose(level[level_view(view, factor, image.shape)], level[np.ix_(y // 4, x // 4)])
+
+    # The level image has the shape of the full resolution one
+    for view in [(slice(0, 100, 3),) * 2, (slice(5, 21, 4),) * 2, (slice(2, 99, 4), slice(0, 117, 6)),
+                 (slice(16, 97, 16), slice(8, None, 24)), (slice(None, None, 2), slice(4, 119, 4)),
+                 (slice(7, 95, 6), slice(13, 117, 6)), (slice(3, None, 5), slice(None, 101, 7))]:
+        factor = level_factor(view)
+        level = block_mean(image, factor) if factor > 1 else image
+        assert level[level_view(view, factor, image.shape)].shape == image[view].shape
+
+
+def test_image_pyramids():
+
+    cube = np.random.random((4, 16, 16))
+    data = FakeData(flux=cube)
+
+    pyramids = ImagePyramids(max_bytes=4 * 8 * 8 * 4)
+    assert pyramids.get(data, 'flux', 1) is None
+
+    level = pyramids.get(data, 'flux', 2)
+    while level is None:
+        level = pyramids.get(data, 'flux', 2)
+    assert level.shape == (4, 8, 8)
+    np.testing.assert_allclose(level, block_mean(cube, 2), rtol=1e-6)
+
+    # Over the memory budget
+    assert pyramids.get(data, 'flux', 4) is None
+    pyramids.invalidate('flux')
+    assert pyramids._nbytes == 0
@@ -0,0 +1,82 @@
+import numpy as np
+
+from ..roi_stats import roi_statistics, ROIStatistics
+
+
+def test_roi_statistics():
+
+    cube = np.random.random((10, 6, 7))
+    cube[4, 2, 3] = np.nan
+    mask = np.zeros((6, 7), dtype=bool)
+    mask[1:4, 2:5] = True
+    mask[5, 6] = True
+
+    views = []
+
+    def get_chunk(view):
+        views.append(view)
+        return cube[view]
+
+    table = roi_statistics(get_chunk, len(cube), mask=mask, chunk_slices=4)
+
+    for index in range(len(cube)):
+        values = cube[index][mask]
+        np.testing.assert_allclose(table.mean[index], np.nanmean(values))
+        np.testing.assert_allclose(table.std[index], np.nanstd(values))
+    assert table.count[4] == mask.sum() - 1
+    assert table.count[0] == mask.sum()
+
+    # Only the bounding box of the mask is read, a chunk of slices at a time
+    assert len(views) == 3
+    assert views[0] == (slice(0, 4), slice(1, 6), slice(2, 7))
+
+    # A mask that is not the same for every slice
+    cube_mask = cube > 0.5
+    table = roi_statistics(lambda view: cube[view], len(cube),
+                           get_mask=lambda view: cube_mask[view], chunk_slices=4)
+    np.testing.assert_allclose(table.mean[7], cube[7][cube_mask[7]].mean())
+
+    spectrum = table.to_table(wavelengths=np.linspace(1, 2, 10), wavelength_unit='um', unit='Jy')
+    assert spectrum.colnames == ['wavelength', 'mean', 'std', 'count']
+    assert str(spectrum['mean'].unit) == 'Jy'
+
+
+class FakeData:
+
+    def __init__(self, **components):
+        self.components = components
+        self.shape = next(iter(components.values())).shape
+
+    def __getitem__(self, key):
+        component, view = key
+        return self.components[component][view]
+
+
+class FakeSubset:
+
+    def __init__(self, mask):
+        self.subset_state = object()
+        self.mask = mask
+
+
+def test_roi_statistics_invalidate():
+
+    cube = np.random.random((10, 6, 7))
+    data = FakeData(flux=cube, noise=cube / 10)
+    subset = FakeSubset(np.ones((6, 7), dtype=bool))
+
+    stats = ROIStatistics(chunk_slices=4)
+    stats._masks[subset.subset_state] = subset.mask
+    np.testing.assert_allclose(stats.wait(data, 'flux', subset).mean, cube.mean(axis=(1, 2)))
+    stats.wait(data, 'noise', subset)
+
+    # The values change, the tables of the component are computed again
+    cube *= 2
+    stats.invalidate('flux')
+    assert stats.get(data, 'noise', subset, start=False) is not None
+    assert stats.get(data, 'flux', subset, start=False) is None
+    np.testing.assert_allclose(stats.wait(data, 'flux', subset).mean, cube.mean(axis=(1, 2)))
+
+    stats.invalidate()
+    assert stats.get(data, 'noise', subset, start=False) is None
+    assert subset.subset_state not in stats._masks
@@ -0,0 +1,94 @@
+import threading
+import time
+
+import numpy as np
+
+from ..slice_cache import SliceCache
+
+
+def test_slice_cache_lru():
+
+    cube = np.arange(10 * 4 * 5, dtype=np.float64).reshape(10, 4, 5)
+    reads = []
+
+    def load(index):
+        reads.append(index)
+        return cube[index]
+
+    # Room for two slices
+    cache = SliceCache(max_bytes=2 * cube[0].nbytes, prefetch_slices=0)
+
+    first = cache.get('flux', 0, load)
+    np.testing.assert_array_equal(first, cube[0])
+    assert not first.flags.writeable
+
+    assert cache.get('flux', 0, load) is first
+    assert reads == [0]
+
+    cache.get('flux', 1, load)
+    cache.get('flux', 0, load)
+    # Evicts slice 1, the least recently used
+    cache.get('flux', 2, load)
+    assert ('flux', 0) in cache
+    assert ('flux', 1) not in cache
+    assert cache.nbytes == 2 * cube[0].nbytes
+
+    # Slices of other components are cached separately
+    cache.clear()
+    cache.get('flux', 3, load)
+    cache.get('error', 3, load)
+    assert reads[-2:] == [3, 3]
+
+
+def test_slice_cache_prefetch():
+
+    cube = np.random.random((10, 4, 5))
+    cache = SliceCache(prefetch_slices=3)
+
+    def wait():
+        for _ in range(100):
+            if not cache._pending:
+                return
+            time.sleep(0.01)
+
+    # Forward
+    cache.get('flux', 2, lambda index: cube[index])
+    cache.prefetch('flux', 2, len(cube), lambda index: cube[index])
+    wait()
+    assert all(('flux', index) in cache for index in (3, 4, 5))
+
+    # Backward, stopping at the first slice
+    cache.clear()
+    cache.prefetch('flux', 3, len(cube), lambda index: cube[index])
+    cache.prefetch('flux', 1, len(cube), lambda index: cube[index])
+    wait()
+    assert ('flux', 0) in cache
+    assert ('flux', 2) not in cache
+    np.testing.assert_array_equal(cache.get('flux', 0, None), cube[0])
+
+
+def test_slice_cache_clear():
+
+    cube = np.zeros((10, 4, 5))
+    cache = SliceCache(prefetch_slices=1)
+    reading = threading.Event()
+    release = threading.Event()
+
+    def slow_load(index):
+        reading.set()
+        release.wait(5)
+        return cube[index].copy()
+
+    cache.get('flux', 2, lambda index: cube[index])
+    cache.prefetch('flux', 2, len(cube), slow_load)
+    assert reading.wait(5)
+    future = cache._pending[('flux', 3)]
+
+    # The values change while the next slice is being read
+    cube += 1
+    cache.clear()
+    release.set()
+    future.result(5)
+
+    assert len(cache) == 0
+    np.testing.assert_array_equal(cache.get('flux', 3, lambda index: cube[index]), cube[3])
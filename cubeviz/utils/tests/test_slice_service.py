@@ -0,0 +1,43 @@
+import numpy as np
+
+from ..slice_service import SliceService
+
+
+def test_slice_service_shares_slices():
+
+    cube = np.arange(3 * 4 * 5, dtype=np.float32).reshape(3, 4, 5)
+    data, other_data = object(), object()
+    service = SliceService()
+
+    extracted = []
+
+    def loader(index, view=None):
+        def extract():
+            extracted.append(index)
+            return cube[index] if view is None else cube[index][view]
+        return extract
+
+    view = (slice(0, 2), slice(1, 4))
+    with service.sync_update():
+        # Four viewers, three showing the same slice
+        first = service.get(data, 'flux', 1, None, False, loader(1))
+        assert service.get(data, 'flux', 1, None, False, loader(1)) is first
+        assert service.get(data, 'flux', 1, None, False, loader(1)) is first
+        windowed = service.get(data, 'flux', 1, view, False, loader(1, view))
+
+    assert extracted == [1, 1]
+    assert not first.flags.writeable
+    np.testing.assert_array_equal(windowed, cube[1][view])
+
+    # Other data, components, indices and transposition are not shared
+    service.get(other_data, 'flux', 1, None, False, loader(1))
+    service.get(data, 'error', 1, None, False, loader(1))
+    service.get(data, 'flux', 2, None, False, loader(2))
+    service.get(data, 'flux', 1, None, True, loader(1))
+    assert extracted == [1, 1, 1, 1, 2, 1]
+
+    # A new sync update starts from scratch
+    with service.sync_update():
+        assert len(service) == 0
+        service.get(data, 'flux', 1, None, False, loader(1))
+    assert extracted[-1] == 1 and len(extracted) == 7
@@ -0,0 +1,53 @@
+import numpy as np
+
+from ..slice_stats import slice_statistics, SliceStatistics
+
+
+class FakeData:
+    # The part of the glue Data interface used by SliceStatistics
+
+    def __init__(self, **components):
+        self._components = components
+        self.shape = next(iter(components.values())).shape
+
+    def __getitem__(self, key):
+        component, view = key
+        return self._components[component][view]
+
+
+def test_slice_statistics():
+
+    cube = np.random.random((10, 6, 7))
+    cube[3, 2, 2] = np.nan
+    cube[5] = np.nan
+
+    table = slice_statistics(lambda start, stop: cube[start:stop], len(cube), chunk_slices=4)
+
+    assert len(table) == 10
+    for index in (0, 3, 9):
+        np.testing.assert_allclose(table.limits(index), (np.nanmin(cube[index]), np.nanmax(cube[index])))
+        np.testing.assert_allclose(table.mean[index], np.nanmean(cube[index]))
+        np.testing.assert_allclose(table.std[index], np.nanstd(cube[index]))
+        np.testing.assert_allclose(table.percentile(index, 99), np.nanpercentile(cube[index], 99))
+
+    # All-NaN slice
+    assert np.isnan(table.minimum[5]) and np.isnan(table.percentile(5, 50))
+    assert set(table.as_dict()) >= {'minimum', 'maximum', 'mean', 'std', 'p50', 'p99.5'}
+
+
+def test_slice_statistics_in_background():
+
+    data = FakeData(flux=np.arange(60.).reshape(3, 4, 5), mask=np.zeros((3, 4, 5), dtype=int))
+    statistics = SliceStatistics(chunk_slices=2)
+
+    assert statistics.get(data, 'flux', start=False) is None
+    table = statistics.wait(data, 'flux')
+    assert statistics.get(data, 'flux') is table
+    np.testing.assert_array_equal(table.minimum, [0, 20, 40])
+    np.testing.assert_array_equal(table.maximum, [19, 39, 59])
+
+    # Integer components
+    np.testing.assert_array_equal(statistics.wait(data, 'mask').maximum, [0, 0, 0])
+
+    statistics.invalidate('flux')
+    assert statistics.get(data, 'flux', start=False) is None
@@ -101,6 +101,7 @@ package_info['package_data'][PACKAGENAME].append('data/resources/*')
 
 # Define entry points for command-line scripts
 entry_points = {
+    'console_scripts': ['cubeviz-batch=cubeviz.batch:main'],
     'gui_scripts': ['cubeviz=cubeviz.cubeviz:main'],
     'glue.plugins': ['cubeviz=cubeviz.cubeviz:setup']
 }